@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Block audio engine vs the equivalent FFmpeg amix filter graph
+
+Builds a two-layer soundtrack: looped music with gain and fades, plus
+looped ambience under it. It is rendered for --minutes of output both ways
+and each result is AAC-encoded the same way the mux would encode it. Each
+mode runs in its own process, so the reported peak memory belongs to that
+mode alone. A short render of both as raw PCM checks that they agree.
+Needs ffmpeg on PATH.
+
+Usage: python3 bench_audio.py [--minutes M] [--track-seconds S] [--block-seconds B]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from merge_worker import audiomix
+from merge_worker.ffmpeg import run_ffmpeg
+from merge_worker.logs import configure_logging
+
+MUSIC_GAIN, AMBIENCE_GAIN = 0.7, 0.3
+FADE_IN, FADE_OUT = 3.0, 5.0
+
+def make_tracks(directory, seconds):
+    """A tonal music track and a noise ambience track, MP3 like typical uploads"""
+    tracks = {}
+    for name, source in (("music", f"sine=frequency=440:duration={seconds}"),
+                         ("ambience", f"anoisesrc=color=pink:amplitude=0.5:duration={seconds}")):
+        path = os.path.join(directory, f"{name}.mp3")
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+                        "-ac", "2", "-ar", "48000", "-c:a", "libmp3lame", "-b:a", "192k", path], check=True)
+        tracks[name] = path
+    return tracks
+
+def layers(tracks, duration):
+    return [audiomix.make_layer(tracks["music"], gain=MUSIC_GAIN, loop=True, fade_in=FADE_IN,
+                                fade_out=FADE_OUT),
+            audiomix.make_layer(tracks["ambience"], gain=AMBIENCE_GAIN, loop=True)]
+
+def amix_command(tracks, duration, output_args):
+    graph = (f"[0:a]volume={MUSIC_GAIN},afade=t=in:curve=qsin:d={FADE_IN},"
+             f"afade=t=out:curve=qsin:st={duration - FADE_OUT}:d={FADE_OUT}[m];"
+             f"[1:a]volume={AMBIENCE_GAIN}[b];[m][b]amix=inputs=2:normalize=0:duration=longest")
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    for name in ("music", "ambience"):
+        cmd += ["-stream_loop", "-1", "-t", f"{duration:.3f}", "-i", tracks[name]]
+    return cmd + ["-filter_complex", graph, "-ac", "2", "-ar", "48000"] + output_args
+
+def pcm_input_args():
+    return ["-f", audiomix.PCM_FORMAT, "-ar", str(audiomix.SAMPLE_RATE), "-ac", str(audiomix.CHANNELS), "-i", "pipe:0"]
+
+def run_mode(mode, tracks, duration, output, block_seconds):
+    """One render, in this process - wall time, CPU time and peak memory as JSON"""
+    configure_logging(level="WARNING")
+    start = time.perf_counter()
+    if mode == "amix":
+        run_ffmpeg(amix_command(tracks, duration, ["-c:a", "aac", "-b:a", "256k", output]))
+    else:
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"] + pcm_input_args() + \
+            ["-c:a", "aac", "-b:a", "256k", output]
+        run_ffmpeg(cmd, feed=lambda stdin: audiomix.render_mix(layers(tracks, duration), duration, stdin,
+                                                               block_seconds=block_seconds))
+    elapsed = time.perf_counter() - start
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(json.dumps({
+        "wall_s": elapsed,
+        "cpu_s": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "python_peak_mb": own.ru_maxrss / 1024,
+        "ffmpeg_peak_mb": children.ru_maxrss / 1024
+    }))
+
+def compare(tracks, directory, seconds=20.0):
+    """Largest sample difference between the two engines over a short raw render"""
+    import numpy as np
+
+    raw_amix = os.path.join(directory, "amix.f32")
+    subprocess.run(amix_command(tracks, seconds, ["-f", "f32le", raw_amix]), check=True)
+    with open(os.path.join(directory, "blocks.f32"), "wb") as sink:
+        audiomix.render_mix(layers(tracks, seconds), seconds, sink)
+    a = np.fromfile(raw_amix, dtype="<f4")
+    b = np.fromfile(os.path.join(directory, "blocks.f32"), dtype="<f4")
+    frames = min(len(a), len(b))
+    return float(np.abs(a[:frames] - b[:frames]).max()), len(a), len(b)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--track-seconds", type=float, default=180)
+    parser.add_argument("--block-seconds", type=float, default=audiomix.AUDIO_BLOCK_SECONDS)
+    parser.add_argument("--mode", choices=("amix", "blocks"), help=argparse.SUPPRESS)
+    parser.add_argument("--tracks", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    duration = args.minutes * 60
+
+    if args.mode:
+        run_mode(args.mode, json.loads(args.tracks), duration, args.output, args.block_seconds)
+        return
+
+    print("📊 Block audio engine benchmark")
+    print("=" * 40)
+    with tempfile.TemporaryDirectory() as directory:
+        tracks = make_tracks(directory, args.track_seconds)
+        difference, amix_samples, block_samples = compare(tracks, directory)
+        print(f"{args.minutes:g} min output, 2 layers of {args.track_seconds:g}s MP3, "
+              f"{args.block_seconds:g}s blocks")
+        print(f"Max sample difference vs amix: {difference:.2e} "
+              f"({amix_samples} vs {block_samples} samples over 20s)")
+        for mode in ("amix", "blocks"):
+            result = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--tracks", json.dumps(tracks),
+                 "--minutes", str(args.minutes), "--block-seconds", str(args.block_seconds),
+                 "--output", os.path.join(directory, f"{mode}.m4a")],
+                check=True, capture_output=True, text=True)
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            size = os.path.getsize(os.path.join(directory, f"{mode}.m4a")) >> 20
+            print(f"{mode:>7}: {stats['wall_s']:6.1f} s wall, {stats['cpu_s']:6.1f} s CPU, "
+                  f"{stats['python_peak_mb']:6.1f} MB Python peak, {stats['ffmpeg_peak_mb']:6.1f} MB FFmpeg peak, "
+                  f"{size} MB output")
+
+if __name__ == "__main__":
+    main()
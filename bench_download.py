@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark the adaptive downloader against the previous iter_content writer
+
+Serves a generated file from a local HTTP server and downloads it with both,
+reporting wall time, CPU seconds per GB, peak RSS, page-cache growth and the
+read size / connection count the adaptive downloader settled on. The adaptive
+downloader always computes SHA-256, so the old loop also runs a second time
+hashing each chunk as it's written (legacy+sha), and the cost of SHA-256 on
+its own is reported too. With
+--throttle-mb-s and --latency-ms the server limits every connection and
+delays every response, like a CDN or object store far away.
+
+Usage: python3 bench_download.py [size_mb] [--direct-io] [--throttle-mb-s N] [--latency-ms N]
+"""
+
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+def legacy_download(url, local_path, chunk_size=1024 * 1024, hasher=None):
+    """The download loop as it was before the preallocated-buffer writer, hashing into hasher if given"""
+    import requests
+
+    with requests.get(url, stream=True, timeout=(60, 1200)) as response:
+        response.raise_for_status()
+        total_size = int(response.headers.get('content-length', 0))
+        with open(local_path, 'wb') as file:
+            downloaded = 0
+            last_percent = 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    file.write(chunk)
+                    if hasher:
+                        hasher.update(chunk)
+                    downloaded += len(chunk)
+                    if total_size > 0:
+                        percent = (downloaded / total_size) * 100
+                        if percent - last_percent >= 5:
+                            last_percent = percent
+
+def read_meminfo():
+    """Page cache and dirty page totals in MB from /proc/meminfo"""
+    values = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            if key in ("Cached", "Dirty"):
+                values[key] = int(value.split()[0]) / 1024
+    return values
+
+def run_one(mode, url, target, direct_io):
+    """Run a single download in this process and print a JSON result line"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    # Both modes import requests on first use, so that cost lands in each equally
+    from merge_worker import download
+
+    before = read_meminfo()
+    cpu_start = time.process_time()
+    wall_start = time.time()
+
+    transfer = None
+    if mode == "legacy":
+        legacy_download(url, target)
+    elif mode == "legacy+sha":
+        legacy_download(url, target, hasher=hashlib.sha256())
+    else:
+        transfer = download.download_file(url, target, direct_io=direct_io)["transfer"]
+
+    wall = time.time() - wall_start
+    cpu = time.process_time() - cpu_start
+    after = read_meminfo()
+    size_gb = os.path.getsize(target) / (1024 ** 3)
+
+    print(json.dumps({
+        "mode": mode,
+        "wall_s": round(wall, 2),
+        "cpu_s_per_gb": round(cpu / size_gb, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "cache_growth_mb": round(after["Cached"] - before["Cached"], 1),
+        "dirty_mb": round(after["Dirty"], 1),
+        "transfer": transfer,
+    }))
+
+class ThrottledRangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves files with Range support, a per-connection rate limit and a response delay"""
+    protocol_version = "HTTP/1.1"  # keep-alive, so ranged requests reuse connections
+    directory = "."
+    rate = 0  # bytes per second per connection, 0 for unlimited
+    latency = 0.0  # seconds before each response
+
+    def do_GET(self):
+        path = os.path.join(self.directory, self.path.lstrip("/"))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size
+        ranged = self.headers.get("Range", "").startswith("bytes=")
+        if ranged:
+            first, _, last = self.headers["Range"][len("bytes="):].partition("-")
+            start, end = int(first), min(int(last) + 1 if last else size, size)
+
+        time.sleep(self.latency)
+        self.send_response(206 if ranged else 200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        if ranged:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+
+        sent = 0
+        begin = time.monotonic()
+        with open(path, "rb") as f:
+            f.seek(start)
+            try:
+                while start + sent < end:
+                    block = f.read(min(256 * 1024, end - start - sent))
+                    self.wfile.write(block)
+                    sent += len(block)
+                    if self.rate:
+                        ahead = sent / self.rate - (time.monotonic() - begin)
+                        if ahead > 0:
+                            time.sleep(ahead)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # client closed the probe response unread
+
+    def log_message(self, *args):
+        pass
+
+def serve_directory(directory, rate=0, latency=0.0):
+    """Start a quiet threaded HTTP server on a free port"""
+    handler = type("Handler", (ThrottledRangeHandler,), {"directory": directory, "rate": rate, "latency": latency})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_one(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5] == "1")
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("size_mb", nargs="?", type=int, default=2048)
+    parser.add_argument("--direct-io", action="store_true")
+    parser.add_argument("--throttle-mb-s", type=float, default=0, help="per-connection limit")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    print("📊 Download benchmark")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "source.bin")
+        with open(source, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        server = serve_directory(work_dir, int(args.throttle_mb_s * 1024 * 1024), args.latency_ms / 1000)
+        url = f"http://127.0.0.1:{server.server_address[1]}/source.bin"
+        limit = f"{args.throttle_mb_s:g} MB/s per connection" if args.throttle_mb_s else "unthrottled"
+        print(f"Serving {args.size_mb} MB from {url} ({limit}, {args.latency_ms:g} ms latency)")
+
+        from merge_worker.download import hash_file
+
+        cpu_start = time.process_time()
+        hash_file(source, ["sha256"])
+        print(f"SHA-256 alone: {(time.process_time() - cpu_start) / (args.size_mb / 1024):.3f} CPU s/GB")
+
+        for mode in ("legacy", "legacy+sha", "adaptive"):
+            target = os.path.join(work_dir, f"download_{mode}.bin")
+            # Separate process per run so peak RSS isn't shared between writers
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, url, target, "1" if args.direct_io else "0"],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>10}: {result['wall_s']}s wall, {result['cpu_s_per_gb']} CPU s/GB, "
+                  f"peak RSS {result['peak_rss_mb']} MB, page cache +{result['cache_growth_mb']} MB, "
+                  f"dirty {result['dirty_mb']} MB")
+            if result["transfer"]:
+                transfer = result["transfer"]
+                print(f"{'':>12}{transfer['connections']} connections, {transfer['read_size'] >> 10} KB reads, "
+                      f"{(transfer['segment_size'] or 0) >> 20} MB segments, {transfer['throughput_mb_s']} MB/s, "
+                      f"TTFB {transfer['ttfb_ms']} ms")
+            os.unlink(target)
+
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
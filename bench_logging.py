@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Handler logging overhead per job - DEBUG, INFO, off, and the old full-payload print
+
+Runs the real handle_job() on a large DigitalOcean payload whose input
+doesn't exist, so each job parses, logs and fails straight after parsing
+without touching the network or FFmpeg. Log output goes to a counting sink
+instead of a terminal, and the benchmark reports microseconds and bytes of
+log output per job.
+
+Usage: python3 bench_logging.py [--jobs N] [--payload-kb KB]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import tempfile
+import time
+
+from merge_worker import handler, logs
+
+class CountingSink:
+    """Stands in for stdout - counts what would have been written"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+def make_event(payload_kb):
+    """DigitalOcean-format job padded with metadata to the requested size"""
+    return {
+        "id": "bench-job",
+        "input": {
+            "inputs": [
+                {"file_path": "/workspace/__bench_missing__/video.mp4"},
+                {"file_url": "https://example.com/audio.mp3"}
+            ],
+            "filters": [{"filter": "[1:0]volume=1[audio]"}],
+            "outputs": [{"options": [{"option": "-c:v", "argument": "copy"}]}],
+            "id": "audio-layering",
+            "metadata": {f"key_{i}": "x" * 100 for i in range(payload_kb * 1024 // 110)}
+        }
+    }
+
+def legacy_handle(event, config):
+    """What the handler logged per job before leveled logging"""
+    print(f"Received event: {json.dumps(event, indent=2)}")
+    return handler.handle_job(event, config)
+
+def run_mode(mode, event, config, jobs):
+    sink = CountingSink()
+    # Legacy mode keeps today's records but adds the old full-payload print
+    level = {"debug": logging.DEBUG, "info": logging.INFO, "off": logging.CRITICAL + 1}.get(mode, logging.INFO)
+    logs.configure_logging(level=level, stream=sink)
+    run = legacy_handle if mode == "legacy" else handler.handle_job
+
+    with contextlib.redirect_stdout(sink):
+        start = time.perf_counter()
+        for _ in range(jobs):
+            result = run(event, config)
+        elapsed = time.perf_counter() - start
+    assert "error" in result, result
+    return elapsed / jobs * 1e6, sink.bytes / jobs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--payload-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    event = make_event(args.payload_kb)
+    print("📊 Handler logging benchmark")
+    print("=" * 40)
+    print(f"{args.jobs} jobs, {len(json.dumps(event)) >> 10} KB payload")
+
+    with tempfile.TemporaryDirectory() as workspace:
+        config = {**handler.DEFAULT_CONFIG, "workspace_dir": workspace}
+        run_mode("info", event, config, 5)  # warm imports and caches
+        results = {mode: run_mode(mode, event, config, args.jobs) for mode in ("legacy", "debug", "info", "off")}
+    logs.configure_logging()
+
+    for mode, (micros, size) in results.items():
+        print(f"{mode:>7}: {micros:9.1f} µs/job, {size / 1024:9.1f} KB log output/job")
+
+if __name__ == "__main__":
+    main()
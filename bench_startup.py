@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark - fails if the worker's own startup cost regresses
+
+Measures, in fresh interpreters:
+  * time for `import worker` (handler built) on top of an already imported runpod
+  * total time from interpreter start to handler ready
+  * whether building the handler imports requests (it must not)
+and prints the slowest merge_worker modules from `python -X importtime`.
+
+Usage: python3 bench_startup.py [--runs N] [--budget-ms MS] [--max-total-ms MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Import cost of merge_worker + worker.py on top of runpod itself
+DEFAULT_BUDGET_MS = 30
+
+OVERHEAD_SNIPPET = """
+import time
+import runpod
+start = time.perf_counter()
+import worker
+print((time.perf_counter() - start) * 1000)
+"""
+
+TOTAL_SNIPPET = """
+import time
+start = time.perf_counter()
+import worker
+print((time.perf_counter() - start) * 1000)
+"""
+
+LAZY_SNIPPET = """
+import sys
+import merge_worker
+merge_worker.make_handler({})
+print(",".join(name for name in ("requests", "urllib3", "merge_worker.download") if name in sys.modules))
+"""
+
+def run_python(snippet, *flags):
+    result = subprocess.run([sys.executable, *flags, "-c", snippet], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    lines = result.stdout.strip().splitlines()
+    return (lines[-1] if lines else ""), result.stderr
+
+def median_ms(snippet, runs):
+    return statistics.median(float(run_python(snippet)[0]) for _ in range(runs))
+
+def slowest_modules(limit=8):
+    """merge_worker modules from -X importtime, slowest first"""
+    _, stderr = run_python("import worker", "-X", "importtime")  # lazily loaded modules won't show
+    rows = []
+    for line in stderr.splitlines():
+        if "merge_worker" in line or line.rstrip().endswith("| worker"):
+            _, self_us, cumulative_us, name = [part.strip() for part in line.replace(":", "|", 1).split("|")]
+            rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--max-total-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    print("⏱️  Cold start benchmark")
+    print("=" * 40)
+
+    failures = []
+
+    overhead = median_ms(OVERHEAD_SNIPPET, args.runs)
+    print(f"Worker import on top of runpod: {overhead:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if overhead > args.budget_ms:
+        failures.append(f"worker import took {overhead:.1f} ms, budget is {args.budget_ms:.0f} ms")
+
+    total = median_ms(TOTAL_SNIPPET, args.runs)
+    print(f"Interpreter start to handler ready: {total:.1f} ms")
+    if args.max_total_ms and total > args.max_total_ms:
+        failures.append(f"handler ready after {total:.1f} ms, limit is {args.max_total_ms:.0f} ms")
+
+    eager, _ = run_python(LAZY_SNIPPET)
+    print(f"Modules loaded just to build the handler: {eager or 'none of requests/urllib3/download'}")
+    if "requests" in eager or "urllib3" in eager:
+        failures.append(f"building the handler imported {eager}")
+
+    print("\nSlowest worker modules (-X importtime, cumulative):")
+    for cumulative_us, name in slowest_modules():
+        print(f"  {cumulative_us / 1000:7.1f} ms  {name}")
+
+    if failures:
+        print("\n❌ Startup regression:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n✅ Startup within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Aggregate encode throughput of concurrent FFmpeg processes, -threads 0 vs CPU leases
+
+Runs 1 to --max-processes libx264 merges at the same time on a synthetic
+clip. In "threads0" mode each process gets -threads 0 and no affinity, the
+old behaviour. In "leased" mode each gets a lease from a CpuAllocator
+(thread budget, -filter_threads and a pinned CPU set). The aggregate
+throughput is output seconds encoded per wall-clock second, summed over the
+processes. Needs ffmpeg on PATH.
+
+Usage: python3 bench_threads.py [--max-processes N] [--seconds S] [--height H]
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from merge_worker.cpus import CpuAllocator
+from merge_worker.ffmpeg import run_ffmpeg
+from merge_worker.logs import configure_logging
+from merge_worker.planner import build_merge_command
+
+ENCODER = {"codec": "libx264", "preset": "veryfast", "bitrate": "5M"}
+
+def make_inputs(directory, seconds, height):
+    video, music = os.path.join(directory, "clip.mp4"), os.path.join(directory, "music.mp3")
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i",
+                    f"testsrc2=size={height * 16 // 9}x{height}:rate=30:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-g", "60", video], check=True)
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i",
+                    f"sine=frequency=440:duration={seconds}", "-c:a", "libmp3lame", music], check=True)
+    return video, music
+
+def run_batch(mode, processes, video, music, directory, allocator):
+    """Wall time for processes merges started together"""
+    def merge(index):
+        output = os.path.join(directory, f"out_{index}.mp4")
+        if mode == "threads0":
+            run_ffmpeg(build_merge_command(video, music, output, encoder=ENCODER))
+            return
+        with allocator.lease(expected=processes) as lease:
+            run_ffmpeg(build_merge_command(video, music, output, encoder=ENCODER, threads=lease["threads"]),
+                       cpus=lease["cpus"])
+
+    workers = [threading.Thread(target=merge, args=(index,)) for index in range(processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    allocator = CpuAllocator()
+    parser.add_argument("--max-processes", type=int, default=max(2, allocator.budget))
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+    configure_logging(level="WARNING")
+
+    print("📊 Concurrent FFmpeg thread allocation benchmark")
+    print("=" * 40)
+    print(f"CPU budget {allocator.budget} of {len(allocator.cpus)} visible CPUs, "
+          f"{args.seconds:g}s {args.height}p clip, libx264 veryfast")
+    print(f"{'processes':>9}  {'threads0 x':>10}  {'leased x':>9}  {'gain':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        video, music = make_inputs(directory, args.seconds, args.height)
+        for processes in range(1, args.max_processes + 1):
+            throughput = {}
+            for mode in ("threads0", "leased"):
+                wall = run_batch(mode, processes, video, music, directory, allocator)
+                throughput[mode] = processes * args.seconds / wall
+            print(f"{processes:>9}  {throughput['threads0']:>10.2f}  {throughput['leased']:>9.2f}  "
+                  f"{throughput['leased'] / throughput['threads0'] - 1:>+6.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Shared core of the RunPod FFmpeg merge workers
+
+worker.py and worker_flexible.py are thin configurations on top of this
+package, so download, parsing, planning and FFmpeg changes land in both.
+
+Exports are resolved lazily so importing the package (and registering the
+handler on a cold start) doesn't load modules a job hasn't needed yet.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "crossfade": "audiomix",
+    "make_layer": "audiomix",
+    "render_mix": "audiomix",
+    "lookup_cached_result": "cache",
+    "result_cache_key": "cache",
+    "store_cached_result": "cache",
+    "run_job": "client",
+    "wait_for_job": "client",
+    "handle_concat_job": "concat",
+    "choose_video_encoder": "costmodel",
+    "predict_speed": "costmodel",
+    "record_speed": "costmodel",
+    "CpuAllocator": "cpus",
+    "cpu_lease": "cpus",
+    "download_file": "download",
+    "fetch_input": "download",
+    "materialize_local_file": "download",
+    "explain_job": "explain",
+    "check_gpu_availability": "ffmpeg",
+    "generate_preview": "ffmpeg",
+    "generate_thumbnail": "ffmpeg",
+    "merge_renditions": "ffmpeg",
+    "merge_video_audio": "ffmpeg",
+    "run_ffmpeg": "ffmpeg",
+    "verify_ffmpeg_installation": "ffmpeg",
+    "DEFAULT_CONFIG": "handler",
+    "handle_job": "handler",
+    "make_handler": "handler",
+    "configure_logging": "logs",
+    "get_logger": "logs",
+    "set_debug": "logs",
+    "byte_range": "mediaindex",
+    "index_input": "mediaindex",
+    "keyframe_at": "mediaindex",
+    "load_index": "mediaindex",
+    "parse_job": "handler",
+    "parse_concat_format": "parsers",
+    "parse_digitalocean_format": "parsers",
+    "parse_renditions": "parsers",
+    "parse_simple_format": "parsers",
+    "build_concat_command": "planner",
+    "build_merge_command": "planner",
+    "build_rendition_command": "planner",
+    "PreflightError": "preflight",
+    "check_input": "preflight",
+    "preflight_job": "preflight",
+    "check_media_file": "probe",
+    "probe_clip": "probe",
+    "probe_duration": "probe",
+    "probe_video_stream": "probe",
+    "JobScheduler": "scheduler",
+    "estimate_job_cost": "scheduler",
+    "make_scheduled_handler": "scheduler",
+    "start_warm_up": "startup",
+    "verify_signature": "webhooks",
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
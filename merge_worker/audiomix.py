@@ -0,0 +1,196 @@
+"""
+Block audio engine - layered mixes in constant memory, piped straight into the mux
+
+Each layer is decoded by its own FFmpeg process to raw float PCM on a pipe.
+The timeline is then rendered with NumPy one block (AUDIO_BLOCK_SECONDS) at
+a time: per-layer gain, quarter-sine fades, and summing the layers. A
+crossfade is two overlapping layers with opposite fades. Memory stays at a
+few blocks however long the output is. Nothing full-length is written to
+disk, because the mix goes to the muxing FFmpeg's stdin as it is rendered.
+
+NumPy is optional - without it jobs keep using the FFmpeg filter graph.
+"""
+
+import os
+import subprocess
+
+from .logs import ProgressLog, get_logger, kv
+
+log = get_logger(__name__)
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+AUDIO_BLOCK_SECONDS = float(os.environ.get("AUDIO_BLOCK_SECONDS", 1.0))
+# Raw format of the rendered mix, as FFmpeg input options
+PCM_FORMAT = "f32le"
+
+def numpy_available():
+    """True if the block engine can run"""
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def make_layer(path, gain=1.0, start=0.0, duration=None, fade_in=0.0, fade_out=0.0, loop=False):
+    """One input on the timeline
+
+    The layer plays from start (seconds into the output) for duration seconds,
+    or to the end of the output; loop repeats the input to fill that span.
+    Fades are quarter-sine, so two overlapping layers with matching fades
+    form an equal-power crossfade.
+    """
+    return {"path": path, "gain": gain, "start": start, "duration": duration,
+            "fade_in": fade_in, "fade_out": fade_out, "loop": loop}
+
+def crossfade(first, second, seconds):
+    """Start second seconds before first ends, fading one out as the other fades in"""
+    if first["duration"] is None:
+        raise ValueError("The first layer of a crossfade needs a duration")
+    first["fade_out"] = second["fade_in"] = seconds
+    second["start"] = first["start"] + first["duration"] - seconds
+    return [first, second]
+
+def music_layers(audio_path, volume, timing):
+    """The job's music track as block engine layers, None when the engine can't be used"""
+    if not timing:
+        log.warning("Output duration unknown, mixing audio with the FFmpeg filter graph")
+        return None
+    if not numpy_available():
+        log.warning("NumPy not installed, mixing audio with the FFmpeg filter graph")
+        return None
+    return [make_layer(audio_path, gain=volume, loop=timing["loop_audio"],
+                       fade_in=timing.get("fade_in", 0.0), fade_out=timing.get("fade_out", 0.0))]
+
+class _DecoderPipe:
+    """Raw PCM of one input from an FFmpeg decoder process"""
+
+    def __init__(self, path, sample_rate, channels):
+        self.path = path
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-i", path,
+             "-map", "0:a:0", "-f", PCM_FORMAT, "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def read(self, size):
+        data = self.process.stdout.read(size)
+        if len(data) < size and self.process.wait() != 0:
+            raise RuntimeError(f"Decoding {self.path} failed: {self.process.stderr.read().decode(errors='replace').strip()}")
+        return data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+def open_decoder(path, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    """Default layer source - anything with read(size) and close() returning f32le frames works"""
+    return _DecoderPipe(path, sample_rate, channels)
+
+class _LayerState:
+    """Playback position of one layer, its source opened lazily and reopened to loop"""
+
+    def __init__(self, layer, total_frames, sample_rate, channels, open_source):
+        self.layer = layer
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.open_source = open_source
+        self.first = round(layer["start"] * sample_rate)
+        span = round(layer["duration"] * sample_rate) if layer["duration"] is not None else total_frames
+        self.last = min(self.first + span, total_frames)
+        self.fade_in = round(layer["fade_in"] * sample_rate)
+        self.fade_out = round(layer["fade_out"] * sample_rate)
+        self.source = None
+        self.exhausted = False
+
+    def read(self, frames):
+        """Next frames of decoded audio, fewer once a non-looping input runs out"""
+        import numpy as np
+
+        frame_bytes = 4 * self.channels
+        chunks, wanted, fresh = [], frames, False
+        while wanted and not self.exhausted:
+            if self.source is None:
+                self.source = self.open_source(self.layer["path"], self.sample_rate, self.channels)
+                fresh = True
+            data = self.source.read(wanted * frame_bytes)
+            got = len(data) // frame_bytes
+            if got:
+                chunks.append(np.frombuffer(data, dtype="<f4", count=got * self.channels))
+                wanted -= got
+                fresh = False
+            if wanted:
+                self.close()
+                # An input that yields nothing at all would loop forever
+                self.exhausted = not self.layer["loop"] or fresh
+        samples = np.concatenate(chunks) if len(chunks) > 1 else chunks[0] if chunks else np.empty(0, "<f4")
+        return samples.reshape(-1, self.channels)
+
+    def envelope(self, first, last):
+        """Gain for frames first..last, or a scalar when no fade touches them"""
+        import numpy as np
+
+        gain = self.layer["gain"]
+        fade_in_end = self.first + self.fade_in
+        fade_out_start = self.last - self.fade_out
+        if first >= fade_in_end and last <= fade_out_start:
+            return gain
+        position = np.arange(first, last, dtype=np.float32)
+        shape = np.ones(last - first, dtype=np.float32)
+        if self.fade_in and first < fade_in_end:
+            np.minimum(shape, np.sin(np.pi / 2 * np.clip((position - self.first) / self.fade_in, 0, 1)), out=shape)
+        if self.fade_out and last > fade_out_start:
+            np.minimum(shape, np.sin(np.pi / 2 * np.clip((self.last - position) / self.fade_out, 0, 1)), out=shape)
+        return (shape * gain)[:, None]
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+def iter_mix_blocks(layers, duration, sample_rate=SAMPLE_RATE, channels=CHANNELS,
+                    block_seconds=AUDIO_BLOCK_SECONDS, open_source=open_decoder):
+    """Yield the mix as float32 (frames, channels) arrays of at most one block each
+
+    The same buffer is reused for every block, so consume (or copy) each
+    block before asking for the next.
+    """
+    import numpy as np
+
+    total_frames = round(duration * sample_rate)
+    block_frames = max(int(block_seconds * sample_rate), 1)
+    states = [_LayerState(layer, total_frames, sample_rate, channels, open_source) for layer in layers]
+    buffer = np.zeros((block_frames, channels), dtype="<f4")
+    try:
+        for block_start in range(0, total_frames, block_frames):
+            block_end = min(block_start + block_frames, total_frames)
+            block = buffer[:block_end - block_start]
+            block.fill(0)
+            for state in states:
+                first, last = max(block_start, state.first), min(block_end, state.last)
+                if first >= last or state.exhausted:
+                    if block_start >= state.last:
+                        state.close()
+                    continue
+                samples = state.read(last - first)
+                offset = first - block_start
+                block[offset:offset + len(samples)] += samples * state.envelope(first, first + len(samples))
+            np.clip(block, -1.0, 1.0, out=block)
+            yield block
+    finally:
+        for state in states:
+            state.close()
+
+def render_mix(layers, duration, sink, sample_rate=SAMPLE_RATE, channels=CHANNELS,
+               block_seconds=AUDIO_BLOCK_SECONDS, open_source=open_decoder):
+    """Write duration seconds of the mixed layers to sink as f32le PCM; returns frames written"""
+    progress = ProgressLog(log, "🎚️  Mixing audio", total=round(duration * sample_rate))
+    frames = 0
+    for block in iter_mix_blocks(layers, duration, sample_rate, channels, block_seconds, open_source):
+        sink.write(block.data)
+        frames += len(block)
+        progress.update(frames)
+    log.info("🎚️  Mixed %d layers", len(layers), extra=kv(seconds=round(frames / sample_rate, 1)))
+    return frames
@@ -0,0 +1,174 @@
+"""
+Result cache for duplicate submissions
+
+Outputs are hardlinked into the cache directory and back out on a hit, so
+a cached result costs no extra disk space or copy time.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from .download import materialize_local_file, resolve_local_path
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+RESULT_CACHE_DIR = Path(os.environ.get("RESULT_CACHE_DIR", "/workspace/cache/results"))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 6 * 3600))  # seconds
+RESULT_CACHE_MAX_BYTES = int(float(os.environ.get("RESULT_CACHE_MAX_GB", 100)) * 1024 ** 3)
+# Parsed fields that change the produced output - everything else (job id,
+# output filename, download tuning) is irrelevant to the result
+RESULT_CACHE_SPEC_FIELDS = ("volume", "gpu_acceleration", "use_nvenc", "renditions", "duration", "loop_audio",
+                            "audio_engine", "audio_fade_in", "audio_fade_out", "encoder", "quality", "video_bitrate",
+                            "thumbnail", "thumbnail_time", "thumbnail_height", "preview", "preview_duration")
+
+_result_cache_lock = threading.Lock()
+
+def input_cache_identity(url, expected=None, info=None):
+    """Content identity of an input for result caching, None until it's known
+
+    Downloads are identified by SHA-256 (declared up front or computed while
+    downloading); volume files by path, size and mtime so they need no read.
+    """
+    if info and info["digests"].get("sha256"):
+        return f"sha256:{info['digests']['sha256']}"
+    if expected and expected.get("sha256"):
+        return f"sha256:{expected['sha256']}"
+    source_path = resolve_local_path(url)
+    if source_path:
+        stat = os.stat(source_path)
+        return f"file:{source_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    return None
+
+def result_cache_key(params, video_identity, audio_identity):
+    """Canonical hash of the normalized job spec plus input identities"""
+    if not video_identity or not audio_identity:
+        return None
+    spec = {field: params.get(field) for field in RESULT_CACHE_SPEC_FIELDS}
+    if spec.get("renditions"):
+        # Rendition filenames derive from the job id, so leave them out
+        spec["renditions"] = [{k: v for k, v in r.items() if k != "filename"} for r in spec["renditions"]]
+    spec["video"] = video_identity
+    spec["audio"] = audio_identity
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def _load_cache_index():
+    index_path = RESULT_CACHE_DIR / "index.json"
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"entries": {}, "stats": {"hits": 0, "misses": 0}}
+
+def _save_cache_index(index):
+    # Write-then-rename so concurrent workers on the volume never see a partial index
+    RESULT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = RESULT_CACHE_DIR / f"index.json.{uuid.uuid4().hex[:8]}"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, RESULT_CACHE_DIR / "index.json")
+
+def _evict_cache_entries(index, now):
+    """Drop expired entries, then least recently used ones until under the size cap"""
+    entries = index["entries"]
+    for key in [k for k, e in entries.items() if now - e["created"] > RESULT_CACHE_TTL]:
+        _remove_cache_entry(key, entries.pop(key))
+
+    total = sum(e["size"] for e in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+        if total <= RESULT_CACHE_MAX_BYTES:
+            break
+        total -= entries[key]["size"]
+        _remove_cache_entry(key, entries.pop(key))
+
+def _remove_cache_entry(key, entry):
+    shutil.rmtree(RESULT_CACHE_DIR / key, ignore_errors=True)
+    log.info("🗑️  Evicted cached result %s", key[:12])
+
+def _rewrite_paths(value, mapping):
+    """Swap cached file paths/names for the ones of the current job throughout a response"""
+    if isinstance(value, dict):
+        return {k: _rewrite_paths(v, mapping) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rewrite_paths(v, mapping) for v in value]
+    if isinstance(value, str):
+        return mapping.get(value, value)
+    return value
+
+def lookup_cached_result(key, output_paths):
+    """Restore cached outputs to output_paths and return their response, or None"""
+    if not key:
+        return None
+
+    with _result_cache_lock:
+        index = _load_cache_index()
+        now = time.time()
+        _evict_cache_entries(index, now)
+
+        entry = index["entries"].get(key)
+        cached_files = [RESULT_CACHE_DIR / key / name for name in entry["files"]] if entry else []
+        if (not entry or len(cached_files) != len(output_paths)
+                or not all(path.exists() for path in cached_files)):
+            index["entries"].pop(key, None)
+            index["stats"]["misses"] += 1
+            _save_cache_index(index)
+            return None
+
+        entry["hits"] += 1
+        entry["last_used"] = now
+        index["stats"]["hits"] += 1
+        _save_cache_index(index)
+
+    mapping = {}
+    for cached_file, original, output_path in zip(cached_files, entry["paths"], output_paths):
+        materialize_local_file(str(cached_file), str(output_path))
+        mapping[original] = str(output_path)
+        mapping[Path(original).name] = output_path.name
+    log.info("♻️  Result cache hit %s", key[:12], extra=kv(hits=entry["hits"]))
+
+    response_data = _rewrite_paths(entry["response"], mapping)
+    response_data["cache"] = {"hit": True, "key": key, "hits": entry["hits"],
+                              "age_seconds": round(now - entry["created"], 1)}
+    return response_data
+
+def store_cached_result(key, output_paths, response_data, sources=None):
+    """Hardlink finished outputs into the cache under key
+
+    sources are the files to link when they aren't at output_paths yet -
+    a job's partial outputs, cached before they replace the published ones.
+    """
+    sources = sources or output_paths
+    if not key:
+        return
+
+    try:
+        entry_dir = RESULT_CACHE_DIR / key
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        for output_path, source in zip(output_paths, sources):
+            materialize_local_file(str(source), str(entry_dir / output_path.name))
+
+        with _result_cache_lock:
+            index = _load_cache_index()
+            now = time.time()
+            index["entries"][key] = {
+                "files": [path.name for path in output_paths],
+                "paths": [str(path) for path in output_paths],
+                "size": sum(path.stat().st_size for path in sources),
+                "created": now,
+                "last_used": now,
+                "hits": 0,
+                "response": response_data
+            }
+            _evict_cache_entries(index, now)
+            _save_cache_index(index)
+        log.info("💾 Cached result %s", key[:12])
+    except Exception as e:
+        # Caching is an optimization - never fail the job over it
+        log.warning("Failed to cache result: %s", e)
@@ -0,0 +1,81 @@
+"""
+Client helpers for the RunPod endpoint - submit a job and wait for its result
+
+Waiting polls /status with exponential backoff. A quick job is seen within a
+second or two of finishing, and a 3-hour merge costs a few dozen requests
+instead of hundreds. Jobs sent with a webhook_url don't need to poll at all;
+polling is the fallback for callers that can't receive webhooks.
+"""
+
+import random
+import time
+
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+# RunPod job statuses after which nothing changes
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+REQUEST_TIMEOUT = (5, 30)  # connect, read
+
+def endpoint_base(endpoint_url):
+    """https://api.runpod.ai/v2/<endpoint id> from the endpoint URL, with or without /run"""
+    base = endpoint_url.rstrip("/")
+    for suffix in ("/run", "/runsync"):
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+def _headers(api_key):
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+def submit_job(endpoint_url, api_key, payload):
+    """Queue a job (payload is the {"input": ...} body); returns RunPod's response with the job id"""
+    import requests
+
+    response = requests.post(f"{endpoint_base(endpoint_url)}/run", headers=_headers(api_key), json=payload,
+                             timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+def poll_intervals(initial=1.0, factor=2.0, maximum=30.0, jitter=0.1):
+    """Endless delays between status polls: initial, growing by factor up to maximum, +/- jitter"""
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter) if jitter else delay
+        delay = min(delay * factor, maximum)
+
+def wait_for_job(endpoint_url, api_key, job_id, timeout=3600, initial_interval=1.0, max_interval=30.0,
+                 on_status=None):
+    """Poll a job's status with exponential backoff until it finishes; returns the final status JSON
+
+    on_status, if given, is called with every status response (progress
+    updates are under "output" while the job runs). Raises TimeoutError
+    if the job hasn't finished within timeout seconds.
+    """
+    import requests
+
+    status_url = f"{endpoint_base(endpoint_url)}/status/{job_id}"
+    deadline = time.monotonic() + timeout
+    polls = 0
+    with requests.Session() as session:
+        for delay in poll_intervals(initial_interval, maximum=max_interval):
+            time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+            response = session.get(status_url, headers=_headers(api_key), timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            status = response.json()
+            polls += 1
+            if on_status:
+                on_status(status)
+            if status.get("status") in TERMINAL_STATUSES:
+                log.info("Job finished", extra=kv(job_id=job_id, status=status.get("status"), polls=polls))
+                return status
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} still {status.get('status')} after {timeout}s ({polls} polls)")
+
+def run_job(endpoint_url, api_key, payload, **wait_options):
+    """Submit a job and wait for it (see wait_for_job); returns the final status JSON"""
+    submitted = submit_job(endpoint_url, api_key, payload)
+    if submitted.get("status") in TERMINAL_STATUSES:
+        return submitted
+    return wait_for_job(endpoint_url, api_key, submitted["id"], **wait_options)
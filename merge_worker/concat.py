@@ -0,0 +1,224 @@
+"""
+Concat jobs - join many clips into one long video by stream copy
+
+Clips are downloaded concurrently and probed. They are joined with the
+concat demuxer, so video is never re-encoded when the clips already match.
+Any clip whose codec, resolution, frame rate, pixel format or timebase
+differs from the majority is conformed first, re-encoding only the streams
+that differ. Music, when requested, is muxed in the same pass with the
+same volume, looping and fades as a merge.
+"""
+
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .cache import input_cache_identity, lookup_cached_result, result_cache_key, store_cached_result
+from .cpus import cpu_lease
+from .download import fetch_input
+from .ffmpeg import COPY_THREADS, check_gpu_availability, run_ffmpeg
+from .logs import get_logger, kv
+from .mediaindex import load_index, start_indexing
+from .planner import (DURATION_TOLERANCE, build_concat_command, build_conform_command, clip_bitrate, concat_list,
+                      partial_output_path, plan_concat, plan_timing)
+from .preflight import PreflightError, preflight_job, release_disk_space, required_disk_space, reserve_disk_space
+from .probe import check_media_file, probe_clip
+
+log = get_logger(__name__)
+
+CONCAT_DOWNLOAD_WORKERS = int(os.environ.get("CONCAT_DOWNLOAD_WORKERS", 4))
+
+def _concat_identity(identities):
+    """Content identity of the ordered clip list, None unless every clip's is known"""
+    if None in identities:
+        return None
+    return "concat:" + ",".join(identities)
+
+def handle_concat_job(event, config, params):
+    """Run a parsed concat job (parsers.parse_concat_format) - same response shape as a merge"""
+    from .handler import ffmpeg_progress, report_progress
+
+    clips = params["clips"]
+    audio_url = params.get("audio_url")
+    direct_io = params.get("direct_io", False)
+    log.info("Processing concat job", extra=kv(clips=len(clips), music=bool(audio_url)))
+
+    workspace_dir = Path(config["workspace_dir"])
+    job_id = uuid.uuid4().hex[:8]
+    job_dir = workspace_dir / "temp" / f"concat_{job_id}"
+    output_filename = params["output_filename"]
+    output_path = workspace_dir / output_filename
+    # Written under a per-job name and published when the job is done
+    work_path = partial_output_path(output_path, job_id)
+    use_cache = params.get("use_cache", True)
+
+    if use_cache:
+        cache_key = result_cache_key(
+            params,
+            _concat_identity([input_cache_identity(clip["url"], clip["expected"]) for clip in clips]),
+            input_cache_identity(audio_url, params.get("audio_expected")) if audio_url else "none"
+        )
+        cached = lookup_cached_result(cache_key, [output_path])
+        if cached:
+            return cached
+
+    workspace_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        preflight = params.get("preflight") or preflight_job(params)
+        # Conformed copies of mismatched clips need room too - budget for all of them
+        inputs = sum(info["size"] or 0 for info in preflight.values())
+        reservation = reserve_disk_space(workspace_dir, required_disk_space(preflight, 2 * inputs))
+    except PreflightError as e:
+        return {"error": f"Preflight failed: {e}"}
+
+    try:
+        job_dir.mkdir(parents=True, exist_ok=True)
+        # Clips arrive concurrently; each download still adapts its own connection count
+        start_time = time.time()
+        clip_paths = [job_dir / f"clip_{index:04d}.mp4" for index in range(len(clips))]
+        audio_path = job_dir / "music.mp3"
+        with ThreadPoolExecutor(max_workers=CONCAT_DOWNLOAD_WORKERS) as pool:
+            clip_futures = [
+                pool.submit(fetch_input, clip["url"], str(path), direct_io=direct_io, expected=clip["expected"],
+                            preflight=preflight[f"clip{index + 1}"])
+                for index, (clip, path) in enumerate(zip(clips, clip_paths))
+            ]
+            audio_future = pool.submit(fetch_input, audio_url, str(audio_path), direct_io=direct_io,
+                                       expected=params.get("audio_expected"),
+                                       preflight=preflight["audio"]) if audio_url else None
+            clip_infos = [future.result() for future in clip_futures]
+            audio_info = audio_future.result() if audio_future else None
+            download_time = time.time() - start_time
+            log.info("📦 %d clips ready in %.1f seconds", len(clips), download_time,
+                     extra=kv(total_mb=sum(info["size"] for info in clip_infos) >> 20))
+
+            # Same clips under different URLs - digests are known now
+            identities = [input_cache_identity(clip["url"], info=info) for clip, info in zip(clips, clip_infos)]
+            cache_key = None
+            if use_cache:
+                cache_key = result_cache_key(
+                    params,
+                    _concat_identity(identities),
+                    input_cache_identity(audio_url, info=audio_info) if audio_url else "none"
+                )
+                cached = lookup_cached_result(cache_key, [output_path])
+                if cached:
+                    return cached
+
+            # Clips seen before are probed already; the rest are indexed in the background
+            indexes = [load_index(identity) for identity in identities]
+            unprobed = [index for index, media_index in enumerate(indexes) if not media_index]
+            try:
+                probed = dict(zip(unprobed, pool.map(probe_clip, [str(clip_paths[index]) for index in unprobed])))
+            except FileNotFoundError:
+                return {"error": "Concat jobs need ffprobe to check clip compatibility"}
+            except ValueError as e:
+                return {"error": f"Input check failed: {e}"}
+            probes = [media_index["probe"] if media_index else probed[index]
+                      for index, media_index in enumerate(indexes)]
+            for index in unprobed:
+                # Linked outside job_dir, which is removed when the join is done
+                start_indexing(str(clip_paths[index]), identities[index], job_dir.parent, params.get("index", False))
+
+        # Music replaces the clips' audio, so then only their video has to match
+        plan = plan_concat(probes, keep_audio=not audio_url)
+        total_duration = plan["duration"]
+        log.info("🧩 %d of %d clips need conforming", len(plan["conform"]), len(clips),
+                 extra=kv(reference=f"{plan['reference']['video']['codec_name']} "
+                                    f"{plan['reference']['video']['width']}x{plan['reference']['video']['height']}"))
+        report_progress(event, {"stage": "concat", "clips": len(clips), "conform": len(plan["conform"])}, params)
+
+        requested = params.get("duration")
+        if requested and total_duration and requested > total_duration + DURATION_TOLERANCE:
+            return {"error": f"duration {requested}s is longer than the clips combined ({total_duration:.1f}s)"}
+
+        audio_duration = None
+        if audio_url:
+            try:
+                audio_duration = check_media_file(str(audio_path), "Audio")
+            except ValueError as e:
+                return {"error": f"Input check failed: {e}"}
+        timing = plan_timing(total_duration, audio_duration, requested, loop_audio=params.get("loop_audio", True),
+                             fade_in=params.get("audio_fade_in", 0.0), fade_out=params.get("audio_fade_out", 0.0))
+
+        ffmpeg_start = time.time()
+        video_codec = "h264_nvenc" if params.get("use_nvenc") and check_gpu_availability() else "libx264"
+        bitrate = clip_bitrate(probes, plan["reference"])
+        joined_paths = list(clip_paths)
+        for index in plan["conform"]:
+            conformed = job_dir / f"conformed_{index:04d}.mp4"
+            with cpu_lease() as lease:
+                run_ffmpeg(build_conform_command(str(clip_paths[index]), str(conformed), probes[index],
+                                                 plan["reference"], video_codec, bitrate, lease["threads"]),
+                           cpus=lease["cpus"])
+            joined_paths[index] = conformed
+        conform_time = time.time() - ffmpeg_start
+
+        list_path = job_dir / "clips.ffconcat"
+        list_path.write_text(concat_list(joined_paths))
+        with cpu_lease(max_threads=COPY_THREADS) as lease:
+            run_ffmpeg(build_concat_command(str(list_path), str(work_path), str(audio_path) if audio_url else None,
+                                            params["volume"], timing), cpus=lease["cpus"],
+                       on_progress=ffmpeg_progress(event, params, "joining", timing["duration"] if timing else None))
+        ffmpeg_time = time.time() - ffmpeg_start
+        log.info("✅ Concat completed in %.1f seconds", ffmpeg_time, extra=kv(conform_s=round(conform_time, 1)))
+
+        if not work_path.exists() or work_path.stat().st_size == 0:
+            work_path.unlink(missing_ok=True)
+            return {"error": f"FFmpeg failed to create output file {output_path.name}"}
+    except BaseException:
+        work_path.unlink(missing_ok=True)
+        raise
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        release_disk_space(reservation)
+
+    output_size_mb = work_path.stat().st_size / (1024 * 1024)
+    output_duration = timing["duration"] if timing else None
+    response_data = {
+        "success": True,
+        "output_path": str(output_path),
+        "output_filename": output_filename,
+        "output_size_mb": round(output_size_mb, 2),
+        "job_id": job_id,
+        "concat": {
+            "clips": len(clips),
+            "conformed": plan["conform"],  # Clip indexes that had to be re-encoded
+            "reference": plan["reference"]["video"],
+            "conform_seconds": round(conform_time, 1)
+        },
+        "metrics": {
+            "download_seconds": round(download_time, 1),
+            "ffmpeg_seconds": round(ffmpeg_time, 1)
+        },
+        "inputs": {
+            "clips": [{"size": info["size"], **info["digests"]} for info in clip_infos],
+            "audio": {"size": audio_info["size"], **audio_info["digests"]} if audio_info else None
+        },
+        # DigitalOcean FFmpeg compatibility - exact format
+        "response": {
+            "file_url": str(output_path),
+            "thumbnail_url": str(output_path),
+            "preview_url": None,
+            "duration": round(output_duration, 3) if output_duration else None,
+            "bitrate": None,
+            "filesize": round(output_size_mb, 2),
+            "metadata": {
+                "width": int(plan["reference"]["video"]["width"]),
+                "height": int(plan["reference"]["video"]["height"]),
+                "duration": round(output_duration, 3) if output_duration else None,
+                "fps": None,
+                "codec": f"{plan['reference']['video']['codec_name']}/{'aac' if audio_url else 'copy'}"
+            }
+        }
+    }
+
+    # Cached from this job's own file - another job may publish to the same path meanwhile
+    if cache_key:
+        store_cached_result(cache_key, [output_path], response_data, sources=[work_path])
+        response_data["cache"] = {"hit": False, "key": cache_key}
+    os.replace(work_path, output_path)
+    return response_data
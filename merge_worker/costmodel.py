@@ -0,0 +1,184 @@
+"""
+Encoder cost model - learned encode speeds drive encoder choice and run time estimates
+
+Every merge reports FFmpeg's achieved speed (the speed= figure from
+-progress, as a multiple of real time). It is recorded per codec, preset and
+output resolution in a small JSON store on the volume. The store is shared
+by every worker that mounts the volume, so estimates improve with each job.
+Configurations that haven't been measured yet fall back to built-in priors.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from .logs import get_logger, kv
+from .planner import DEFAULT_PRESETS
+
+log = get_logger(__name__)
+
+ENCODER_STATS_PATH = Path(os.environ.get("ENCODER_STATS_PATH", "/workspace/cache/encoder_stats.json"))
+# Weight of the newest measurement in the running average
+SPEED_SMOOTHING = 0.3
+
+QUALITY_TIERS = ("fast", "balanced", "high")
+# (codec, preset, quality tier) for each re-encode the model may pick
+ENCODER_CANDIDATES = [
+    ("h264_nvenc", "p1", "fast"),
+    ("h264_nvenc", "p4", "balanced"),
+    ("h264_nvenc", "p7", "high"),
+    ("libx264", "veryfast", "fast"),
+    ("libx264", "medium", "balanced"),
+    ("libx264", "slow", "high"),
+]
+# Speed at 1080p (times real time) until the configuration has been measured
+PRIOR_SPEEDS = {
+    "copy": 150.0,
+    "h264_nvenc:p1": 10.0,
+    "h264_nvenc:p4": 6.0,
+    "h264_nvenc:p7": 3.0,
+    "libx264:veryfast": 2.0,
+    "libx264:medium": 0.8,
+    "libx264:slow": 0.4,
+}
+DEFAULT_PRIOR_SPEED = 1.0
+RESOLUTION_BUCKETS = (360, 480, 720, 1080, 1440, 2160)
+
+_stats_lock = threading.Lock()
+
+def resolution_bucket(height):
+    """Nearest standard height, 1080 when the height isn't known"""
+    if not height:
+        return 1080
+    return min(RESOLUTION_BUCKETS, key=lambda bucket: abs(bucket - height))
+
+def _encoder_name(codec, preset=None):
+    return codec if codec == "copy" else f"{codec}:{preset}"
+
+def _load_stats():
+    try:
+        with open(ENCODER_STATS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_stats(stats):
+    # Write-then-rename, like the result cache index
+    ENCODER_STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ENCODER_STATS_PATH.with_name(f"{ENCODER_STATS_PATH.name}.{uuid.uuid4().hex[:8]}")
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, ENCODER_STATS_PATH)
+
+def record_speed(codec, preset, height, speed):
+    """Fold one achieved speed into the running average for its configuration"""
+    if not speed or speed <= 0:
+        return
+    key = f"{_encoder_name(codec, preset)}@{resolution_bucket(height)}"
+    try:
+        with _stats_lock:
+            stats = _load_stats()
+            entry = stats.get(key)
+            if entry:
+                entry["speed"] = round(entry["speed"] + SPEED_SMOOTHING * (speed - entry["speed"]), 3)
+                entry["samples"] += 1
+            else:
+                entry = stats[key] = {"speed": round(speed, 3), "samples": 1}
+            entry["updated"] = time.time()
+            _save_stats(stats)
+        log.info("📈 Recorded %.1fx for %s", speed, key, extra=kv(average=entry["speed"], samples=entry["samples"]))
+    except OSError as e:
+        log.warning("Could not record encoder speed: %s", e)
+
+def predict_speed(codec, preset=None, height=None):
+    """Expected speed (multiple of real time) - measured if available, else the prior"""
+    name = _encoder_name(codec, preset)
+    bucket = resolution_bucket(height)
+    entry = _load_stats().get(f"{name}@{bucket}")
+    if entry:
+        return entry["speed"]
+    prior = PRIOR_SPEEDS.get(name, DEFAULT_PRIOR_SPEED)
+    if codec == "copy":
+        return prior
+    # Encode time scales roughly with pixel count
+    return prior * (1080 / bucket) ** 2
+
+def predict_seconds(codec, preset, height, duration):
+    """Expected run time for duration seconds of output, None if the duration is unknown"""
+    if not duration:
+        return None
+    return round(duration / predict_speed(codec, preset, height), 1)
+
+def bitrate_to_bits(bitrate):
+    """"5M" -> 5000000, "800k" -> 800000"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", str(bitrate))
+    if not match:
+        raise ValueError(f"Invalid bitrate '{bitrate}'")
+    scale = {"": 1, "k": 1000, "m": 1000 ** 2}[match.group(2).lower()]
+    return int(float(match.group(1)) * scale)
+
+def choose_video_encoder(params, source=None, gpu_available=False, duration=None):
+    """Fastest configuration meeting the requested encoder/quality/bitrate
+
+    Without a quality or bitrate target the worker keeps its configured
+    behaviour (NVENC p1 when enabled and available, stream copy otherwise).
+    With a target, stream copy wins whenever the source already fits it,
+    otherwise the re-encode with the lowest predicted run time at or above
+    the requested quality tier is used. Returns codec, preset, bitrate,
+    predicted speed and seconds.
+    """
+    requested = params.get("encoder") or "auto"
+    quality = params.get("quality")
+    target_bitrate = params.get("video_bitrate")
+    use_nvenc = params.get("use_nvenc") and gpu_available
+    height = source.get("height") if source else None
+
+    if requested != "auto":
+        if requested == "h264_nvenc" and not gpu_available:
+            log.warning("NVENC requested but no GPU available, using libx264")
+            requested = "libx264"
+        tier = QUALITY_TIERS.index(quality or "fast")
+        candidates = [(requested, preset) for codec, preset, level in ENCODER_CANDIDATES
+                      if codec == requested and QUALITY_TIERS.index(level) == tier] or [("copy", None)]
+    elif not quality and not target_bitrate:
+        candidates = [("h264_nvenc", "p1") if use_nvenc else ("copy", None)]
+    else:
+        tier = QUALITY_TIERS.index(quality or "fast")
+        source_bits = source.get("bit_rate") if source else None
+        candidates = []
+        # Copy keeps the source quality, so only the bitrate ceiling can rule it out
+        if not target_bitrate or (source_bits and source_bits <= bitrate_to_bits(target_bitrate)):
+            candidates.append(("copy", None))
+        candidates.extend((codec, preset) for codec, preset, level in ENCODER_CANDIDATES
+                          if QUALITY_TIERS.index(level) >= tier and (codec != "h264_nvenc" or use_nvenc))
+
+    codec, preset = max(candidates, key=lambda candidate: predict_speed(*candidate, height))
+    return {
+        "codec": codec,
+        "preset": preset,
+        "bitrate": target_bitrate or "5M",
+        "height": height,
+        "predicted_speed": round(predict_speed(codec, preset, height), 2),
+        "predicted_seconds": predict_seconds(codec, preset, height, duration)
+    }
+
+def predict_rendition_seconds(renditions, use_nvenc, gpu_available, source_height=None, duration=None):
+    """Expected run time of a rendition pass - its encodes share the machine, so their times add up"""
+    if not duration:
+        return None
+    seconds = 0.0
+    for rendition in renditions:
+        if rendition["type"] != "video":
+            continue
+        if rendition["codec"] == "copy":
+            codec, preset = "copy", None
+        elif rendition["codec"] in ("auto", "h264_nvenc") and use_nvenc and gpu_available:
+            codec, preset = "h264_nvenc", rendition["preset"] or DEFAULT_PRESETS["h264_nvenc"]
+        else:
+            codec, preset = "libx264", rendition["preset"] or DEFAULT_PRESETS["libx264"]
+        seconds += duration / predict_speed(codec, preset, rendition["height"] or source_height)
+    return round(seconds, 1)
@@ -0,0 +1,149 @@
+"""
+CPU allocation for concurrent FFmpeg processes
+
+Several FFmpeg processes can run on one worker at once (scheduler lanes,
+concat conforms, the block engine's decoders). Left at -threads 0 each one
+sizes its thread pools to every core it can see and they thrash. The
+allocator knows the worker's real CPU budget - the cgroup CPU quota and the
+affinity mask, whichever is smaller - and leases each FFmpeg process a
+thread count and a set of CPUs it is pinned to, preferring cores nobody else
+holds.
+"""
+
+import contextlib
+import math
+import os
+import threading
+
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+# 0 restores the old behaviour: -threads 0 and no pinning
+CPU_ALLOCATION = os.environ.get("FFMPEG_CPU_ALLOCATION", "1") != "0"
+
+# cgroup v2 first, then the v1 cpu controller (mounted as "cpu" or "cpu,cpuacct")
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_DIRS = ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct")
+
+def cgroup_cpu_limit():
+    """CPUs' worth of time the cgroup quota allows (e.g. 2.5), None when unlimited"""
+    try:
+        with open(CGROUP_V2_CPU_MAX) as f:
+            quota, _, period = f.read().strip().partition(" ")
+        if quota == "max":
+            return None
+        return int(quota) / int(period or 100000)
+    except (OSError, ValueError):
+        pass
+    for directory in CGROUP_V1_DIRS:
+        try:
+            with open(os.path.join(directory, "cpu.cfs_quota_us")) as f:
+                quota = int(f.read())
+            with open(os.path.join(directory, "cpu.cfs_period_us")) as f:
+                period = int(f.read())
+        except (OSError, ValueError):
+            continue
+        return quota / period if quota > 0 and period > 0 else None
+    return None
+
+def available_cpus():
+    """CPU ids this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+@contextlib.contextmanager
+def pinned(cpus):
+    """Pin the calling thread to cpus while the block runs, so processes it starts inherit the mask
+
+    Only the calling thread's affinity changes (Linux sets it per thread), so
+    other jobs' threads are unaffected and no preexec_fn runs in the child.
+    """
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+class CpuAllocator:
+    """Leases thread counts and CPU sets to FFmpeg processes out of the worker's CPU budget
+
+    A process that starts alone gets the whole budget. Later ones get a fair
+    share (budget / processes running), or more when earlier leases left
+    cores idle, on the least-held cores. A running process keeps its lease
+    until it exits, so shares only rebalance as processes come and go.
+    """
+
+    def __init__(self, cpus=None, limit=None):
+        self.cpus = sorted(cpus) if cpus else available_cpus()
+        limit = cgroup_cpu_limit() if limit is None else limit
+        # A 2.5-CPU quota still lets three threads make progress
+        self.budget = min(len(self.cpus), math.ceil(limit)) if limit else len(self.cpus)
+        self._holders = {cpu: 0 for cpu in self.cpus}
+        self._leased_threads = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _share(self, max_threads, expected):
+        slots = max(self._active + 1, expected)
+        fair = self.budget // slots
+        # Idle budget is split among the processes still expected to start
+        idle = max(0, self.budget - self._leased_threads) // (slots - self._active)
+        share = max(1, fair, idle)
+        return min(share, max_threads) if max_threads else share
+
+    @contextlib.contextmanager
+    def lease(self, max_threads=None, expected=1):
+        """{"threads", "cpus"} for one FFmpeg process, held until the block exits
+
+        max_threads caps the lease for processes that can't use more (stream
+        copies). expected is the number of processes the caller is about to
+        start together, so the first of a batch doesn't take every core.
+        """
+        with self._lock:
+            threads = self._share(max_threads, expected)
+            cpus = sorted(sorted(self.cpus, key=lambda cpu: (self._holders[cpu], cpu))[:threads])
+            for cpu in cpus:
+                self._holders[cpu] += 1
+            self._leased_threads += threads
+            self._active += 1
+        log.debug("CPU lease", extra=kv(threads=threads, cpus=",".join(map(str, cpus)), active=self._active))
+        try:
+            yield {"threads": threads, "cpus": cpus}
+        finally:
+            with self._lock:
+                for cpu in cpus:
+                    self._holders[cpu] -= 1
+                self._leased_threads -= threads
+                self._active -= 1
+
+    def status(self):
+        with self._lock:
+            return {"budget": self.budget, "cpus": len(self.cpus), "active": self._active,
+                    "leased_threads": self._leased_threads}
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+def get_allocator():
+    """The worker-wide allocator, created on first use"""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = CpuAllocator()
+            log.info("🧮 CPU budget for FFmpeg", extra=kv(**_allocator.status()))
+        return _allocator
+
+@contextlib.contextmanager
+def cpu_lease(max_threads=None, expected=1):
+    """A lease from the worker-wide allocator; {"threads": 0, "cpus": None} when allocation is off"""
+    if not CPU_ALLOCATION:
+        yield {"threads": 0, "cpus": None}
+        return
+    with get_allocator().lease(max_threads, expected) as lease:
+        yield lease
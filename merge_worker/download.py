@@ -0,0 +1,605 @@
+"""
+Input fetching: HTTP downloads, zero-copy volume inputs and integrity checks
+"""
+
+import hashlib
+import os
+import shutil
+import time
+
+from .logs import ProgressLog, get_logger, kv
+
+log = get_logger(__name__)
+
+# Digests that can be requested/verified per input ("sha256", "md5", "size")
+HASH_ALGORITHMS = ("sha256", "md5")
+
+# Download writer tuning - writes go out in large page-aligned blocks from a
+# single preallocated buffer, so resident memory stays at one chunk per download
+DOWNLOAD_ALIGNMENT = 4096
+# Flush and drop written pages every 256MB once past the head of the file, so a
+# 15GB download can't push the start of the file (read first by FFmpeg) out of cache
+WRITEBACK_WINDOW = 256 * 1024 * 1024
+CACHE_KEEP_HEAD = 512 * 1024 * 1024
+
+def _open_download_target(local_path, direct_io=False):
+    """Open local_path for raw writes, with O_DIRECT when requested and supported"""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    if direct_io and hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(local_path, flags | os.O_DIRECT, 0o644), True
+        except OSError as e:
+            log.warning("O_DIRECT not supported for %s (%s), using buffered writes", local_path, e)
+    return os.open(local_path, flags, 0o644), False
+
+def _write_all(fd, view):
+    """os.write until the whole memoryview is on disk"""
+    written = 0
+    while written < len(view):
+        written += os.write(fd, view[written:])
+
+def _drop_cached_range(fd, start, end):
+    """Write back [start, end) and tell the kernel we won't re-read it soon"""
+    if end <= start or not hasattr(os, "posix_fadvise"):
+        return
+    os.fdatasync(fd)
+    os.posix_fadvise(fd, start, end - start, os.POSIX_FADV_DONTNEED)
+
+# Adaptive transfer tuning - the read size and the number of connections
+# double while each step still improves measured throughput by PLATEAU_GAIN
+MIN_READ_SIZE = 256 * 1024
+MAX_READ_SIZE = 8 * 1024 * 1024
+MAX_CONNECTIONS = int(os.environ.get("DOWNLOAD_MAX_CONNECTIONS", 8))
+PLATEAU_GAIN = 0.1
+SAMPLE_SECONDS = 0.25  # each read size is measured for at least this long
+# New connections pay a round trip before their first byte, so measure longer
+CONNECTION_SAMPLE_SECONDS = 0.5
+# Files below this size aren't worth extra connections
+STRIPE_MIN_SIZE = 64 * 1024 * 1024
+# Ranged requests each pay one round trip; segments are sized so that costs
+# at most LATENCY_OVERHEAD of a segment's transfer time
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+MAX_SEGMENT_SIZE = 128 * 1024 * 1024
+LATENCY_OVERHEAD = 0.05
+
+class ThroughputTuner:
+    """Doubles a setting (read size, connections) until throughput stops improving"""
+
+    def __init__(self, value, maximum, sample_seconds=SAMPLE_SECONDS):
+        self.value = min(value, maximum)
+        self.sample_seconds = sample_seconds
+        self.maximum = maximum
+        self.settled = self.value >= maximum
+        self.best_rate = 0.0
+        self._bytes = 0
+        self._seconds = 0.0
+
+    def record(self, nbytes, seconds):
+        """Add a measurement; returns True when the setting was raised"""
+        if self.settled:
+            return False
+        self._bytes += nbytes
+        self._seconds += seconds
+        if self._seconds < self.sample_seconds:
+            return False
+        rate = self._bytes / self._seconds
+        self._bytes, self._seconds = 0, 0.0
+        if rate <= self.best_rate * (1 + PLATEAU_GAIN):
+            self.settled = True  # plateau - the last step didn't pay off
+            return False
+        self.best_rate = rate
+        self.value = min(self.value * 2, self.maximum)
+        self.settled = self.value >= self.maximum
+        return True
+
+def _segment_size(rate, ttfb):
+    """Segment long enough that one request round trip is LATENCY_OVERHEAD of it"""
+    size = int(rate * ttfb / LATENCY_OVERHEAD) if rate and ttfb else MIN_SEGMENT_SIZE
+    size = max(MIN_SEGMENT_SIZE, min(MAX_SEGMENT_SIZE, size))
+    return size - size % DOWNLOAD_ALIGNMENT
+
+def _body_reader(response):
+    """readinto for the response body, bypassing urllib3's copy when it isn't encoded"""
+    raw = response.raw
+    raw.decode_content = True
+    # urllib3's readinto goes through an intermediate bytes object; the underlying
+    # http.client response fills our buffer directly when the body isn't encoded
+    encoded = response.headers.get('content-encoding', 'identity') != 'identity'
+    fp = getattr(raw, "_fp", None)
+    return raw.readinto if encoded or fp is None else fp.readinto
+
+def _fill(read_into, view, size):
+    """Read until size bytes are in view or the body ends; returns the byte count"""
+    import http.client
+
+    import requests
+    import urllib3
+
+    filled = 0
+    while filled < size:
+        try:
+            count = read_into(view[filled:size])
+        except (urllib3.exceptions.HTTPError, http.client.HTTPException, OSError) as e:
+            # Connection dropped mid-body - surface it as a retryable error
+            raise requests.exceptions.ChunkedEncodingError(e)
+        if not count:
+            break
+        filled += count
+    return filled
+
+def _clear_direct_io(fd):
+    """Final partial block can't satisfy O_DIRECT alignment rules"""
+    import fcntl
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+def _stream_to_file(response, local_path, total_size, direct_io=False, hashers=(), metrics=None):
+    """Copy the response body into local_path through one reusable buffer
+
+    Every hasher is updated with each block as it is written, so digests
+    come for free without a second read of the file. The read size starts
+    small and doubles while throughput keeps improving.
+    """
+    import mmap
+
+    import requests
+
+    # Anonymous mmap is page-aligned, which O_DIRECT requires; pages beyond
+    # the read size in use are never touched, so they cost no memory
+    buffer = mmap.mmap(-1, MAX_READ_SIZE)
+    view = memoryview(buffer)
+    read_into = _body_reader(response)
+    tuner = ThroughputTuner(MIN_READ_SIZE, MAX_READ_SIZE)
+
+    fd, direct = _open_download_target(local_path, direct_io)
+    # Only bother managing the cache when the file can't comfortably fit in it
+    manage_cache = not direct and total_size > CACHE_KEEP_HEAD + WRITEBACK_WINDOW
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    downloaded = 0
+    dropped_until = CACHE_KEEP_HEAD
+    progress = ProgressLog(log, "Downloading", total_size)
+    start = time.monotonic()
+
+    try:
+        while True:
+            read_start = time.monotonic()
+            filled = _fill(read_into, view, tuner.value)
+            if filled == 0:
+                break
+            tuner.record(filled, time.monotonic() - read_start)
+
+            if direct and filled % DOWNLOAD_ALIGNMENT:
+                _clear_direct_io(fd)
+                direct = False
+
+            _write_all(fd, view[:filled])
+            for hasher in hashers:
+                hasher.update(view[:filled])
+            downloaded += filled
+
+            if manage_cache and downloaded - dropped_until >= WRITEBACK_WINDOW:
+                _drop_cached_range(fd, dropped_until, downloaded)
+                dropped_until = downloaded
+
+            progress.update(downloaded)
+    finally:
+        os.close(fd)
+        view.release()
+        buffer.close()
+
+    if total_size > 0 and downloaded != total_size:
+        raise requests.exceptions.ChunkedEncodingError(
+            f"Incomplete download: got {downloaded} of {total_size} bytes"
+        )
+    if metrics is not None:
+        elapsed = max(time.monotonic() - start, 1e-6)
+        metrics.update(connections=1, read_size=tuner.value, segment_size=None,
+                       throughput_mb_s=round(downloaded / elapsed / 1024 ** 2, 1))
+    return downloaded
+
+class _RangeNotHonoured(Exception):
+    """Server advertised ranges but answered a ranged request with the whole body"""
+
+def _download_striped(url, local_path, total_size, ttfb, hashers=(), metrics=None, timeout=1200):
+    """Download with ranged requests over a growing number of connections
+
+    Connection threads claim the next segment, fetch it with a Range
+    request and pwrite it in place. The calling thread hashes the completed
+    prefix of the file in order, reading it back while it is still in the
+    page cache. It also doubles the connection count while aggregate
+    throughput keeps improving. Writes are always buffered: with O_DIRECT
+    the read-back for the digest would come from disk.
+    """
+    import mmap
+    import threading
+
+    import requests
+
+    fd, _ = _open_download_target(local_path)
+    os.ftruncate(fd, total_size)
+    read_fd = os.open(local_path, os.O_RDONLY)
+    manage_cache = total_size > CACHE_KEEP_HEAD + WRITEBACK_WINDOW
+
+    connections = ThroughputTuner(1, MAX_CONNECTIONS, CONNECTION_SAMPLE_SECONDS)
+    state = {
+        "next_offset": 0,
+        "segment_size": _segment_size(0, ttfb),
+        "completed": {},  # segment start -> end
+        "written": 0,
+        "ttfb": ttfb,
+        "read_size": MIN_READ_SIZE,
+        "error": None
+    }
+    condition = threading.Condition()
+
+    def claim_segment():
+        with condition:
+            if state["error"] or state["next_offset"] >= total_size:
+                return None
+            start = state["next_offset"]
+            end = min(start + state["segment_size"], total_size)
+            state["next_offset"] = end
+            return start, end
+
+    def fetch_segment(session, buffer, view, tuner, start, end):
+        request_start = time.monotonic()
+        with session.get(url, stream=True, timeout=(60, timeout),
+                         headers={"Range": f"bytes={start}-{end - 1}"}) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise _RangeNotHonoured(f"Expected 206 for a ranged request, got {response.status_code}")
+            request_ttfb = time.monotonic() - request_start
+            read_into = _body_reader(response)
+            offset = start
+            while offset < end:
+                read_start = time.monotonic()
+                filled = _fill(read_into, view, min(tuner.value, end - offset))
+                if filled == 0:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        f"Segment {start}-{end} ended at {offset}"
+                    )
+                tuner.record(filled, time.monotonic() - read_start)
+                written = 0
+                while written < filled:
+                    written += os.pwrite(fd, view[written:filled], offset + written)
+                offset += filled
+                with condition:
+                    state["written"] += filled
+        with condition:
+            state["ttfb"] += 0.3 * (request_ttfb - state["ttfb"])
+            state["read_size"] = max(state["read_size"], tuner.value)
+            state["completed"][start] = end
+            condition.notify_all()
+
+    def connection_worker(index):
+        buffer = mmap.mmap(-1, MAX_READ_SIZE)
+        view = memoryview(buffer)
+        tuner = ThroughputTuner(MIN_READ_SIZE, MAX_READ_SIZE)
+        try:
+            with requests.Session() as session:
+                while True:
+                    with condition:
+                        # Wait until the tuner lets this connection take part
+                        while index >= connections.value and not state["error"] \
+                                and state["next_offset"] < total_size:
+                            condition.wait(0.5)
+                    segment = claim_segment()
+                    if segment is None:
+                        return
+                    fetch_segment(session, buffer, view, tuner, *segment)
+        except Exception as e:
+            with condition:
+                state["error"] = state["error"] or e
+                condition.notify_all()
+        finally:
+            view.release()
+            buffer.close()
+
+    threads = [threading.Thread(target=connection_worker, args=(index,), daemon=True,
+                                name=f"download-{index}") for index in range(MAX_CONNECTIONS)]
+    for thread in threads:
+        thread.start()
+
+    hash_buffer = bytearray(MAX_READ_SIZE)
+    hash_view = memoryview(hash_buffer)
+    hashed = 0
+    dropped_until = CACHE_KEEP_HEAD
+    progress = ProgressLog(log, "Downloading", total_size)
+    start = last_sample = time.monotonic()
+    last_written = 0
+
+    try:
+        while hashed < total_size:
+            with condition:
+                while hashed not in state["completed"] and not state["error"]:
+                    condition.wait(0.1)
+                    now = time.monotonic()
+                    if now - last_sample >= CONNECTION_SAMPLE_SECONDS:
+                        # Aggregate throughput decides whether another connection helps
+                        if connections.record(state["written"] - last_written, now - last_sample):
+                            rate = connections.best_rate / max(connections.value // 2, 1)
+                            state["segment_size"] = _segment_size(rate, state["ttfb"])
+                            condition.notify_all()
+                        last_written, last_sample = state["written"], now
+                if state["error"]:
+                    raise state["error"]
+                segment_end = state["completed"].pop(hashed)
+
+            # Hash the newly contiguous prefix in order while it is still cached
+            while hashed < segment_end:
+                count = os.preadv(read_fd, [hash_view[:min(MAX_READ_SIZE, segment_end - hashed)]], hashed)
+                for hasher in hashers:
+                    hasher.update(hash_view[:count])
+                hashed += count
+            progress.update(hashed)
+
+            if manage_cache and hashed - dropped_until >= WRITEBACK_WINDOW:
+                _drop_cached_range(fd, dropped_until, hashed)
+                dropped_until = hashed
+    finally:
+        with condition:
+            state["error"] = state["error"] or (None if hashed >= total_size else Exception("Download aborted"))
+            condition.notify_all()
+        for thread in threads:
+            thread.join()
+        hash_view.release()
+        os.close(read_fd)
+        os.close(fd)
+
+    if metrics is not None:
+        elapsed = max(time.monotonic() - start, 1e-6)
+        metrics.update(connections=connections.value, read_size=state["read_size"],
+                       segment_size=state["segment_size"],
+                       throughput_mb_s=round(total_size / elapsed / 1024 ** 2, 1))
+    return total_size
+
+# Client errors that can succeed on a later attempt - every other 4xx fails at once
+RETRYABLE_CLIENT_ERRORS = (408, 425, 429)
+
+def _stripable(total_size, accepts_ranges):
+    return bool(accepts_ranges and total_size and total_size >= STRIPE_MIN_SIZE and MAX_CONNECTIONS > 1)
+
+def download_file(url, local_path, timeout=1200, max_retries=3, direct_io=False, expected=None, preflight=None):
+    """Download file with progress tracking and retry logic
+
+    Large files on servers that accept ranges are fetched over several
+    connections; the read size and connection count adapt to measured
+    throughput. A preflight result (preflight.check_input) that already
+    found such a file skips the probe request. Returns {"path", "size",
+    "digests", "transfer"}; digests always include sha256 plus any other
+    algorithm named in expected, and transfer holds the chosen read size,
+    segment size, connection count, time to first byte and throughput.
+    """
+    # Imported here so worker startup doesn't pay for requests/urllib3/ssl
+    import requests
+
+    log.info("Downloading %s", url, extra=kv(path=local_path))
+    expected = expected or {}
+    algorithms = ["sha256"] + [name for name in HASH_ALGORITHMS if name in expected and name != "sha256"]
+    striping = True
+    
+    for attempt in range(max_retries):
+        try:
+            hashers = [hashlib.new(name) for name in algorithms]
+            if striping and preflight and _stripable(preflight["size"], preflight["ranges"]):
+                total_size, ttfb, stripe = preflight["size"], preflight["ttfb"], True
+                metrics = {"ttfb_ms": round(ttfb * 1000, 1)}
+            else:
+                request_start = time.monotonic()
+                with requests.get(url, stream=True, timeout=(60, timeout)) as response:
+                    response.raise_for_status()
+                    ttfb = time.monotonic() - request_start
+                    total_size = int(response.headers.get('content-length', 0))
+                    encoded = response.headers.get('content-encoding', 'identity') != 'identity'
+                    if encoded:
+                        total_size = 0  # Length is of the encoded body, can't check it
+                    
+                    expected_size = expected.get("size")
+                    if expected_size and total_size and total_size != int(expected_size):
+                        raise ValueError(f"Size mismatch for {url}: server reports {total_size} bytes, "
+                                         f"expected {expected_size}")
+                    
+                    metrics = {"ttfb_ms": round(ttfb * 1000, 1)}
+                    stripe = striping and _stripable(
+                        total_size, response.headers.get('accept-ranges', '').lower() == 'bytes')
+                    log.debug("Response received", extra=kv(size_mb=total_size >> 20, striped=stripe,
+                                                             ttfb_ms=metrics["ttfb_ms"]))
+                    if not stripe:
+                        size = _stream_to_file(response, local_path, total_size, direct_io=direct_io,
+                                               hashers=hashers, metrics=metrics)
+            
+            if stripe:
+                # Any probe response is closed unread; segments come from ranged requests
+                if direct_io:
+                    log.debug("O_DIRECT not used for a striped download; the digest reads back from cache")
+                size = _download_striped(url, local_path, total_size, ttfb, hashers=hashers, metrics=metrics,
+                                         timeout=timeout)
+            
+            log.info("Download complete", extra=kv(path=local_path, size_mb=size >> 20, **metrics))
+            return {
+                "path": local_path,
+                "size": size,
+                "digests": {name: hasher.hexdigest() for name, hasher in zip(algorithms, hashers)},
+                "transfer": metrics
+            }
+            
+        except _RangeNotHonoured as e:
+            log.warning("%s - falling back to a single connection", e)
+            striping = False
+        except (requests.exceptions.Timeout, requests.exceptions.RequestException) as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status and 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS:
+                # 403/404 won't change in 10 seconds
+                raise Exception(f"Download of {url} failed: {e}")
+            log.warning("Download attempt %d failed: %s", attempt + 1, e)
+            if attempt < max_retries - 1:
+                log.info("Retrying in 10 seconds")
+                time.sleep(10)
+            else:
+                raise Exception(f"Failed to download after {max_retries} attempts: {e}")
+        except Exception as e:
+            log.error("Unexpected download error: %s", e)
+            raise
+    raise Exception(f"Failed to download {url}")
+
+# Network volume mount points RunPod exposes to workers - inputs under these
+# roots can be used in place instead of being served over HTTP
+VOLUME_ROOTS = ("/workspace", "/runpod-volume")
+
+def resolve_local_path(url):
+    """Return the on-volume path for file:// or volume paths, None for remote URLs
+
+    Anything without a scheme must name a file under VOLUME_ROOTS, so a
+    mistyped URL fails with an error that says so instead of a 404.
+    """
+    if not url:
+        return None
+
+    if url.startswith("file://"):
+        path = url[len("file://"):]
+    elif "://" in url:
+        return None
+    else:
+        path = url
+
+    if os.path.isabs(path):
+        candidates = [path]
+    else:
+        # Volume-relative path like "masters/video.mp4"
+        candidates = [os.path.join(root, path) for root in VOLUME_ROOTS]
+
+    for candidate in candidates:
+        real_path = os.path.realpath(candidate)
+        # Only allow files that actually live on a mounted volume
+        inside_volume = any(
+            real_path == root or real_path.startswith(root.rstrip("/") + "/")
+            for root in VOLUME_ROOTS
+        )
+        if not inside_volume:
+            raise ValueError(f"Local input must live under {', '.join(VOLUME_ROOTS)}: {url}")
+        if os.path.isfile(real_path):
+            return real_path
+
+    if url.startswith("file://"):
+        raise FileNotFoundError(f"Local input not found on volume: {url}")
+    raise FileNotFoundError(f"Input {url} has no URL scheme and is not a file under {', '.join(VOLUME_ROOTS)} - "
+                            f"remote inputs need http:// or https://")
+
+def _reflink_file(src_path, dst_path):
+    """Clone file extents with FICLONE (btrfs/xfs/overlayfs on reflink-capable storage)"""
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(dst_path)
+            raise
+
+def _kernel_copy_file(src_path, dst_path):
+    """Copy inside the kernel with copy_file_range, falling back to sendfile"""
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        offset = 0
+        use_copy_file_range = hasattr(os, "copy_file_range")
+
+        while remaining > 0:
+            count = min(remaining, 1 << 30)
+            if use_copy_file_range:
+                try:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), count)
+                except OSError:
+                    # Cross-filesystem on older kernels - switch to sendfile
+                    use_copy_file_range = False
+                    continue
+            else:
+                copied = os.sendfile(dst.fileno(), src.fileno(), offset, count)
+            if copied == 0:
+                break
+            offset += copied
+            remaining -= copied
+
+        if remaining > 0:
+            raise OSError(f"Short kernel copy: {remaining} bytes left")
+
+def materialize_local_file(src_path, dst_path):
+    """Make src_path available at dst_path with as little I/O as possible
+
+    Tries a hardlink, a reflink (FICLONE), an in-kernel copy
+    (copy_file_range/sendfile) and finally a plain userspace copy.
+    Returns the method that succeeded.
+    """
+    if os.path.exists(dst_path):
+        os.unlink(dst_path)
+
+    attempts = [
+        ("hardlink", os.link),
+        ("reflink", _reflink_file),
+        ("kernel_copy", _kernel_copy_file),
+        ("copy", shutil.copyfile),
+    ]
+
+    for method, func in attempts:
+        try:
+            func(src_path, dst_path)
+            log.info("📎 Materialized volume input via %s", method, extra=kv(source=src_path, path=dst_path))
+            return method
+        except OSError as e:
+            log.debug("%s not possible (%s), trying next method", method, e)
+            if method != "hardlink" and os.path.exists(dst_path):
+                os.unlink(dst_path)
+
+    raise Exception(f"Failed to materialize local input {src_path}")
+
+def hash_file(path, algorithms, block_size=8 * 1024 * 1024):
+    """Hash an existing file in one sequential pass"""
+    hashers = [hashlib.new(name) for name in algorithms]
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            for hasher in hashers:
+                hasher.update(view[:count])
+    return {name: hasher.hexdigest() for name, hasher in zip(algorithms, hashers)}
+
+def fetch_input(url, local_path, direct_io=False, expected=None, preflight=None):
+    """Fetch an input to local_path - zero-copy for volume files, HTTP otherwise
+
+    Returns {"path", "size", "digests", "method"} and raises ValueError if
+    the result doesn't match the expected size/digests.
+    """
+    expected = expected or {}
+    source_path = resolve_local_path(url)
+    if source_path:
+        method = materialize_local_file(source_path, local_path)
+        # Hashing a volume file costs a full read, so only do it when asked to verify
+        algorithms = [name for name in HASH_ALGORITHMS if name in expected]
+        info = {
+            "path": local_path,
+            "size": os.path.getsize(local_path),
+            "digests": hash_file(local_path, algorithms) if algorithms else {},
+            "method": method
+        }
+    else:
+        info = download_file(url, local_path, direct_io=direct_io, expected=expected, preflight=preflight)
+        info["method"] = "download"
+
+    verify_input(info, expected, url)
+    return info
+
+def verify_input(info, expected, name):
+    """Compare a fetched input against expected size/digests"""
+    if expected.get("size") and info["size"] != int(expected["size"]):
+        raise ValueError(f"Size mismatch for {name}: got {info['size']} bytes, expected {expected['size']}")
+
+    for algorithm in HASH_ALGORITHMS:
+        wanted = expected.get(algorithm)
+        if wanted and info["digests"].get(algorithm) != wanted.lower():
+            raise ValueError(f"{algorithm} mismatch for {name}: got {info['digests'].get(algorithm)}, "
+                             f"expected {wanted.lower()}")
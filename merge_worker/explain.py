@@ -0,0 +1,260 @@
+"""
+Explain mode - the plan and cost of a job, without running it
+
+A job sent with "explain": true is preflighted like any other (HEAD requests,
+stat for volume files). The response is then the plan instead of a result:
+the FFmpeg commands in the order they run (thumbnail and preview included),
+whether video and audio are copied or re-encoded, the scratch space the job
+reserves, the expected output size and run time.
+Nothing is downloaded. Stream details and durations come from the keyframe
+index when an input has been seen before (declared SHA-256 or volume file).
+Otherwise the requested duration is used, or one guessed from the video's
+size, and the commands keep -shortest where a real run would cut at the
+probed length. Thread counts are left to the CPU lease taken at run time,
+and the result cache isn't consulted, since a lookup restores its outputs.
+"""
+
+import uuid
+from pathlib import Path
+
+from .audiomix import CHANNELS, PCM_FORMAT, SAMPLE_RATE
+from .cache import input_cache_identity
+from .costmodel import bitrate_to_bits, choose_video_encoder, predict_seconds
+from .ffmpeg import check_gpu_availability, thumbnail_seek
+from .logs import get_logger, kv
+from .mediaindex import load_index, video_stream
+from .planner import (AUDIO_BITRATE, DEFAULT_PRESETS, build_concat_command, build_conform_command, build_merge_command,
+                      build_preview_command, build_rendition_command, build_thumbnail_command, clip_bitrate,
+                      concat_list, partial_output_path, plan_concat, plan_timing, preview_start)
+from .preflight import PreflightError, available_disk_space, output_space, preflight_job, required_disk_space
+from .scheduler import ASSUMED_VIDEO_BITS_PER_SECOND, FAST_LANE_MAX_SECONDS, estimate_job_cost
+
+log = get_logger(__name__)
+
+AUDIO_BITS_PER_SECOND = bitrate_to_bits(AUDIO_BITRATE)
+AUDIO_ENCODE = {"mode": "encode", "codec": "aac", "bitrate": AUDIO_BITRATE}
+
+def _stored_index(url, expected=None):
+    """Keyframe index of an input seen by an earlier job, None if there is none"""
+    try:
+        return load_index(input_cache_identity(url, expected))
+    except (OSError, ValueError):
+        return None
+
+def _duration(index, requested, size):
+    """(seconds, where they come from) for the output - the index wins over a guess from the size"""
+    if requested:
+        return requested, "requested"
+    if index and index.get("duration"):
+        return index["duration"], "index"
+    if size:
+        return size * 8 / ASSUMED_VIDEO_BITS_PER_SECOND, "size_estimate"
+    return None, None
+
+def _copy_bits_per_second(index, size):
+    """Bitrate of a stream-copied video - the indexed file's average, else the scheduler's assumption"""
+    if index and index.get("duration") and size:
+        return size * 8 / index["duration"]
+    return ASSUMED_VIDEO_BITS_PER_SECOND
+
+def _video_bits_per_second(bitrate):
+    try:
+        return bitrate_to_bits(bitrate)
+    except ValueError:
+        return ASSUMED_VIDEO_BITS_PER_SECOND
+
+def _scratch(workspace_dir, preflight, output_bytes):
+    """Scratch bytes the job would reserve, and whether this worker could admit it now"""
+    required = required_disk_space(preflight, output_bytes)
+    available = available_disk_space(workspace_dir) if workspace_dir.exists() else None
+    return {"required_bytes": required, "available_bytes": available,
+            "fits": available >= required if available is not None else None}
+
+def _inputs(preflight, indexed):
+    return {name: {"url": info["url"], "size": info["size"], "local": info["local"],
+                   "content_type": info["content_type"], "indexed": name in indexed}
+            for name, info in preflight.items()}
+
+def explain_job(params, config):
+    """Plan a parsed job without downloading or encoding anything; returns the plan or {"error"}"""
+    try:
+        preflight = params.get("preflight") or preflight_job(params)
+    except PreflightError as e:
+        return {"error": f"Preflight failed: {e}"}
+
+    workspace_dir = Path(config["workspace_dir"])
+    if params.get("job_type") == "concat":
+        plan = _explain_concat(params, workspace_dir, preflight)
+    else:
+        plan = _explain_merge(params, workspace_dir, preflight)
+    if "error" in plan:
+        return plan
+    log.info("🔎 Explained job", extra=kv(video=plan["video"].get("mode"), output_mb=plan["output"]["size_mb"],
+                                         estimated_s=plan["estimate"]["seconds"]))
+    return plan
+
+def _explain_merge(params, workspace_dir, preflight):
+    """Plan of a merge, with or without renditions - same paths and commands as handler.handle_job()"""
+    if not params["video_url"] or not params["audio_url"]:
+        return {"error": "Both video_url and audio_url are required"}
+
+    job_id = uuid.uuid4().hex[:8]
+    video_temp = str(workspace_dir / "temp" / f"video_{job_id}.mp4")
+    audio_temp = str(workspace_dir / "temp" / f"audio_{job_id}.mp3")
+    renditions = params.get("renditions")
+    output_filename = renditions[0]["filename"] if renditions else params["output_filename"]
+    output_paths = [workspace_dir / r["filename"] for r in renditions] if renditions \
+        else [workspace_dir / output_filename]
+
+    video_size = preflight["video"]["size"]
+    index = _stored_index(params["video_url"], params.get("video_expected"))
+    source = video_stream(index) if index else None
+    duration, duration_source = _duration(index, params.get("duration"), video_size)
+    # The music is only measured once downloaded, so its looping is decided then
+    timing = plan_timing(index and index.get("duration"), None, params.get("duration"),
+                         loop_audio=params.get("loop_audio", True), fade_in=params.get("audio_fade_in", 0.0),
+                         fade_out=params.get("audio_fade_out", 0.0))
+    gpu_available = check_gpu_availability()
+    copy_bits = _copy_bits_per_second(index, video_size)
+
+    if renditions:
+        partial = [{**r, "filename": partial_output_path(r["filename"], job_id).name} for r in renditions]
+        command = build_rendition_command(video_temp, audio_temp, str(workspace_dir), partial, params["volume"],
+                                          gpu_acceleration=params.get("gpu_acceleration", True),
+                                          use_nvenc=params.get("use_nvenc", True), gpu_available=gpu_available,
+                                          timing=timing)
+        video = {"mode": "copy" if all(r["codec"] == "copy" for r in renditions if r["type"] == "video")
+                 else "encode",
+                 "renditions": {r["name"]: r["codec"] for r in renditions if r["type"] == "video"}}
+        bits = 0
+        for rendition in renditions:
+            if rendition["type"] == "video":
+                bits += copy_bits if rendition["codec"] == "copy" else _video_bits_per_second(rendition["bitrate"])
+            if rendition["type"] in ("video", "audio"):
+                bits += AUDIO_BITS_PER_SECOND
+    else:
+        encoder = choose_video_encoder(params, source, gpu_available, duration)
+        piped_audio = {"format": PCM_FORMAT, "sample_rate": SAMPLE_RATE, "channels": CHANNELS} \
+            if params.get("audio_engine") == "numpy" else None
+        partial = str(partial_output_path(output_paths[0], job_id))
+        command = build_merge_command(video_temp, audio_temp, partial, params["volume"],
+                                      gpu_acceleration=params.get("gpu_acceleration", True),
+                                      use_nvenc=params.get("use_nvenc", True), gpu_available=gpu_available,
+                                      timing=timing, encoder=encoder, piped_audio=piped_audio)
+        if encoder["codec"] == "copy":
+            video = {"mode": "copy"}
+            bits = copy_bits
+        else:
+            video = {"mode": "encode", "codec": encoder["codec"], "preset": encoder["preset"],
+                     "bitrate": encoder["bitrate"]}
+            bits = _video_bits_per_second(encoder["bitrate"])
+        bits += AUDIO_BITS_PER_SECOND
+
+    commands = [command]
+    # The artifacts handle_job makes alongside - the thumbnail from the source first, the preview from the output last
+    output_path = workspace_dir / output_filename
+    if params.get("thumbnail"):
+        thumbnail = partial_output_path(workspace_dir / f"{output_path.stem}_thumb.jpg", job_id)
+        at_seconds = thumbnail_seek(params["thumbnail_time"], index and index.get("duration"), index)
+        commands.insert(0, build_thumbnail_command(video_temp, str(thumbnail), at_seconds, params["thumbnail_height"]))
+    if params.get("preview") and output_path.suffix == ".mp4":
+        preview = partial_output_path(workspace_dir / f"{output_path.stem}_preview.mp4", job_id)
+        length = params["preview_duration"]
+        start = preview_start(params["thumbnail_time"], length, timing["duration"] if timing else None)
+        commands.append(build_preview_command(str(partial_output_path(output_path, job_id)), str(preview), start,
+                                              length))
+
+    output_bytes = int(bits * duration / 8) if duration else None
+    return {
+        "explain": True,
+        "job_type": "renditions" if renditions else "merge",
+        "inputs": _inputs(preflight, ["video"] if index else []),
+        "duration": {"seconds": round(duration, 3) if duration else None, "source": duration_source},
+        "video": video,
+        # The music is always mixed at the requested volume
+        "audio": {**AUDIO_ENCODE, "engine": params.get("audio_engine", "ffmpeg")},
+        "commands": commands,
+        "scratch": _scratch(workspace_dir, preflight, output_space(params, preflight, index and index.get("duration"))),
+        "output": {
+            "paths": [str(path) for path in output_paths],
+            "size_bytes": output_bytes,
+            "size_mb": round(output_bytes / (1024 * 1024), 1) if output_bytes else None
+        },
+        "estimate": estimate_job_cost({**params, "preflight": preflight, "duration": duration}, source)
+    }
+
+def _explain_concat(params, workspace_dir, preflight):
+    """Plan of a concat job - which clips get conformed is only known when every clip is indexed"""
+    clips = params["clips"]
+    audio_url = params.get("audio_url")
+    job_id = uuid.uuid4().hex[:8]
+    job_dir = workspace_dir / "temp" / f"concat_{job_id}"
+    clip_paths = [job_dir / f"clip_{index:04d}.mp4" for index in range(len(clips))]
+    output_path = workspace_dir / params["output_filename"]
+    indexes = [_stored_index(clip["url"], clip["expected"]) for clip in clips]
+    clip_bytes = sum(preflight[f"clip{index + 1}"]["size"] or 0 for index in range(len(clips)))
+
+    plan = None
+    if None not in indexes:
+        plan = plan_concat([index["probe"] for index in indexes], keep_audio=not audio_url)
+    requested = params.get("duration")
+    if plan and plan["duration"] and not requested:
+        duration, duration_source = plan["duration"], "index"
+    else:
+        duration, duration_source = _duration(None, requested, clip_bytes)
+    timing = plan_timing(plan and plan["duration"], None, requested, loop_audio=params.get("loop_audio", True),
+                         fade_in=params.get("audio_fade_in", 0.0), fade_out=params.get("audio_fade_out", 0.0))
+
+    commands = []
+    conform_seconds = 0.0
+    joined_paths = list(clip_paths)
+    if plan:
+        probes = [index["probe"] for index in indexes]
+        video_codec = "h264_nvenc" if params.get("use_nvenc") and check_gpu_availability() else "libx264"
+        bitrate = clip_bitrate(probes, plan["reference"])
+        height = int(plan["reference"]["video"]["height"] or 0) or None
+        for index in plan["conform"]:
+            conformed = job_dir / f"conformed_{index:04d}.mp4"
+            try:
+                commands.append(build_conform_command(str(clip_paths[index]), str(conformed), probes[index],
+                                                      plan["reference"], video_codec, bitrate))
+            except ValueError as e:
+                return {"error": f"Clip {index + 1} can't be conformed: {e}"}
+            conform_seconds += predict_seconds(video_codec, DEFAULT_PRESETS[video_codec], height,
+                                              probes[index]["duration"]) or 0.0
+            joined_paths[index] = conformed
+    list_path = job_dir / "clips.ffconcat"
+    commands.append(build_concat_command(str(list_path), str(partial_output_path(output_path, job_id)),
+                                         str(job_dir / "music.mp3") if audio_url else None, params["volume"], timing))
+
+    # Joined clips are copied, so the output is about their size cut to the output length
+    total = plan["duration"] if plan and plan["duration"] else clip_bytes * 8 / ASSUMED_VIDEO_BITS_PER_SECOND
+    output_bytes = int(clip_bytes * min(duration / total, 1.0)) if duration and total else clip_bytes or None
+    if audio_url and duration and output_bytes:
+        output_bytes += int(AUDIO_BITS_PER_SECOND * duration / 8)
+
+    estimate = estimate_job_cost({**params, "preflight": preflight, "duration": duration})
+    if conform_seconds and estimate["seconds"] is not None:
+        estimate["ffmpeg_seconds"] = round(estimate["ffmpeg_seconds"] + conform_seconds, 1)
+        estimate["seconds"] = round(estimate["seconds"] + conform_seconds, 1)
+        estimate["lane"] = "fast" if estimate["seconds"] <= FAST_LANE_MAX_SECONDS else "slow"
+    return {
+        "explain": True,
+        "job_type": "concat",
+        "inputs": _inputs(preflight, [f"clip{index + 1}" for index, media_index in enumerate(indexes)
+                                      if media_index]),
+        "duration": {"seconds": round(duration, 3) if duration else None, "source": duration_source},
+        # Clip indexes re-encoded to match the others; None until every clip has been indexed
+        "video": {"mode": "copy", "conform": plan["conform"] if plan else None},
+        "audio": AUDIO_ENCODE if audio_url else {"mode": "copy"},
+        "commands": commands,
+        "concat_list": concat_list(joined_paths),
+        # Conformed copies of clips are budgeted like the real run does
+        "scratch": _scratch(workspace_dir, preflight, 2 * sum(info["size"] or 0 for info in preflight.values())),
+        "output": {
+            "paths": [str(output_path)],
+            "size_bytes": output_bytes,
+            "size_mb": round(output_bytes / (1024 * 1024), 1) if output_bytes else None
+        },
+        "estimate": estimate
+    }
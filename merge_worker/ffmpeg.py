@@ -0,0 +1,245 @@
+"""
+FFmpeg runner: capability checks, merges and thumbnail/preview extraction
+"""
+
+import subprocess
+import threading
+
+from .audiomix import CHANNELS, PCM_FORMAT, SAMPLE_RATE, render_mix
+from .costmodel import record_speed
+from .cpus import cpu_lease, pinned
+from .logs import LazyCommand, get_logger, kv
+from .mediaindex import keyframe_at
+from .planner import (build_merge_command, build_preview_command, build_rendition_command, build_thumbnail_command,
+                      preview_start)
+
+log = get_logger(__name__)
+
+# Threads leased to stream copies - demux, mux and the AAC encode barely use more
+COPY_THREADS = 2
+
+def verify_ffmpeg_installation():
+    """Verify FFmpeg is available - safe version that won't crash worker"""
+    try:
+        # Test if ffmpeg command exists and works
+        result = subprocess.run(["ffmpeg", "-version"], 
+                               capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            version_info = result.stdout.split('\n')[0] if result.stdout else "unknown version"
+            log.info("✅ FFmpeg is available and working", extra=kv(version=version_info))
+            return True
+        else:
+            log.error("❌ FFmpeg command failed")
+            return False
+    except FileNotFoundError:
+        log.error("❌ FFmpeg command not found")
+        return False
+    except subprocess.TimeoutExpired:
+        log.error("❌ FFmpeg version check timed out")
+        return False
+    except Exception as e:
+        log.error("❌ FFmpeg verification error: %s", e)
+        return False
+
+_gpu_available = None
+
+def check_gpu_availability():
+    """Check if CUDA/GPU is available - probed once per process, since nvidia-smi is slow"""
+    global _gpu_available
+    if _gpu_available is None:
+        _gpu_available = False
+        try:
+            result = subprocess.run(["nvidia-smi"], capture_output=True, text=True)
+            _gpu_available = result.returncode == 0
+        except Exception:
+            pass
+        if _gpu_available:
+            log.info("🎮 GPU detected and available")
+        else:
+            log.info("💻 No GPU detected, using CPU")
+    return _gpu_available
+
+def parse_progress_speed(progress_output):
+    """Final speed= value (multiple of real time) from -progress output, None if not reported"""
+    speed = None
+    for line in progress_output.splitlines():
+        if line.startswith("speed=") and line.endswith("x"):
+            try:
+                speed = float(line[len("speed="):-1])
+            except ValueError:
+                pass
+    return speed
+
+def _progress_update(block):
+    """{"out_seconds", "speed"} from one -progress block (key=value lines ending in progress=)"""
+    out_time = block.get("out_time_us", block.get("out_time_ms", ""))  # Both are microseconds
+    speed = block.get("speed", "")
+    return {
+        "out_seconds": int(out_time) / 1e6 if out_time.isdigit() else None,
+        "speed": float(speed[:-1]) if speed.endswith("x") and speed[:-1].replace(".", "", 1).isdigit() else None
+    }
+
+def _read_progress(stream, on_progress):
+    """Read -progress output, handing each completed block to on_progress; returns the whole output"""
+    lines, block = [], {}
+    for raw in stream:
+        line = raw.decode(errors="replace").strip()
+        lines.append(line)
+        key, _, value = line.partition("=")
+        block[key] = value
+        if key == "progress":
+            try:
+                on_progress(_progress_update(block))
+            except Exception as e:
+                log.warning("Progress callback failed: %s", e)
+            block = {}
+    return "\n".join(lines)
+
+def _run_piped(cmd, feed=None, on_progress=None):
+    """Run cmd while feed(stdin) writes its input and on_progress follows -progress
+
+    Returns (returncode, stdout, stderr).
+    """
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE if feed else None, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    # Drained in threads so FFmpeg never stalls on a full pipe while its input is being written
+    output = {}
+
+    def drain(name, stream):
+        if name == "stdout" and on_progress:
+            output[name] = _read_progress(stream, on_progress)
+        else:
+            output[name] = stream.read().decode(errors="replace")
+
+    readers = [threading.Thread(target=drain, args=pipe, daemon=True)
+               for pipe in (("stdout", process.stdout), ("stderr", process.stderr))]
+    for reader in readers:
+        reader.start()
+    try:
+        if feed:
+            feed(process.stdin)
+            process.stdin.close()
+    except BrokenPipeError:
+        pass  # FFmpeg exited early - its return code and stderr say why
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        for reader in readers:
+            reader.join()
+    return process.returncode, output["stdout"], output["stderr"]
+
+def run_ffmpeg(cmd, feed=None, cpus=None, on_progress=None):
+    """Run an FFmpeg command, printing stderr if it fails
+
+    feed, if given, is called with FFmpeg's stdin to stream an input
+    (e.g. the block engine's mix for a pipe:0 input). cpus (a CPU lease's
+    set) pins FFmpeg to those cores, along with feed and any processes it
+    starts. on_progress, if given, is called with {"out_seconds", "speed"}
+    for every -progress update (about twice a second). Returns the achieved
+    speed reported through -progress (None if FFmpeg didn't report one).
+    """
+    log.info("Running FFmpeg", extra=kv(args=len(cmd), output=cmd[-1]))
+    log.debug("FFmpeg command: %s", LazyCommand(cmd))
+    # Machine-readable progress on stdout, used to learn encode speeds and report progress
+    cmd = cmd[:1] + ["-progress", "pipe:1", "-nostats"] + cmd[1:]
+    
+    try:
+        with pinned(cpus):
+            if feed is None and on_progress is None:
+                result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+                stdout = result.stdout
+            else:
+                returncode, stdout, stderr = _run_piped(cmd, feed, on_progress)
+                if returncode:
+                    raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+        speed = parse_progress_speed(stdout)
+        log.info("FFmpeg completed successfully", extra=kv(speed=speed))
+        return speed
+    except subprocess.CalledProcessError as e:
+        # The failing command is worth its length in the logs
+        log.error("FFmpeg error: %s", e, extra=kv(command=LazyCommand(cmd)))
+        log.error("FFmpeg stderr: %s", e.stderr)
+        raise
+
+def merge_video_audio(video_path, audio_path, output_path, volume=0.7, gpu_acceleration=False, use_nvenc=False,
+                      timing=None, encoder=None, audio_layers=None, on_progress=None):
+    """Merge video and audio using FFmpeg with optional GPU acceleration
+
+    With an encoder from costmodel.choose_video_encoder(), the achieved
+    speed is recorded for future estimates. With audio_layers (audiomix
+    layers, requires timing) the soundtrack is rendered by the block engine
+    and piped into the mux instead of going through a filter graph.
+    FFmpeg runs on a CPU lease; a stream copy only needs a couple of threads.
+    on_progress is passed to run_ffmpeg(). Returns the achieved speed.
+    """
+    gpu_available = check_gpu_availability()
+    piped_audio = {"format": PCM_FORMAT, "sample_rate": SAMPLE_RATE, "channels": CHANNELS} if audio_layers else None
+    codec = encoder["codec"] if encoder else "h264_nvenc" if use_nvenc and gpu_available else "copy"
+    with cpu_lease(max_threads=COPY_THREADS if codec == "copy" else None) as lease:
+        cmd = build_merge_command(video_path, audio_path, output_path, volume,
+                                  gpu_acceleration=gpu_acceleration, use_nvenc=use_nvenc,
+                                  gpu_available=gpu_available, timing=timing, encoder=encoder,
+                                  piped_audio=piped_audio, threads=lease["threads"])
+        # The layer decoders and the mixing share the mux's cores
+        feed = (lambda stdin: render_mix(audio_layers, timing["duration"], stdin)) if audio_layers else None
+        speed = run_ffmpeg(cmd, feed=feed, cpus=lease["cpus"], on_progress=on_progress)
+    if encoder:
+        record_speed(encoder["codec"], encoder["preset"], encoder["height"], speed)
+    return speed
+
+def merge_renditions(video_path, audio_path, output_dir, renditions, volume=0.7,
+                     gpu_acceleration=False, use_nvenc=False, timing=None, on_progress=None):
+    """Produce every requested rendition in one FFmpeg run"""
+    gpu_available = check_gpu_availability()
+    encoded = any(r["type"] == "thumbnail" or (r["type"] == "video" and r["codec"] != "copy") for r in renditions)
+    with cpu_lease(max_threads=None if encoded else COPY_THREADS) as lease:
+        cmd = build_rendition_command(video_path, audio_path, output_dir, renditions, volume,
+                                      gpu_acceleration=gpu_acceleration, use_nvenc=use_nvenc,
+                                      gpu_available=gpu_available, timing=timing, threads=lease["threads"])
+
+        log.info("🎞️  Producing %d renditions in one pass", len(renditions))
+        return run_ffmpeg(cmd, cpus=lease["cpus"], on_progress=on_progress)
+
+def thumbnail_seek(at_seconds=10, duration=None, index=None):
+    """Time a thumbnail is grabbed at - within the first half of a known duration, snapped to a keyframe"""
+    if duration:
+        at_seconds = min(at_seconds, duration / 2)
+    if index:
+        at_seconds = keyframe_at(index, at_seconds)[0]
+    return at_seconds
+
+def generate_thumbnail(video_path, thumbnail_path, at_seconds=10, height=720, duration=None, index=None):
+    """Grab one frame near at_seconds by decoding only keyframes
+
+    Input-side -ss seeks straight to the nearest keyframe through the index
+    and -skip_frame nokey makes the decoder drop everything else, so this
+    decodes a frame or two no matter how long the video is. With the input's
+    keyframe index (mediaindex.py) the seek lands exactly on a keyframe, so
+    nothing past it is read either.
+    """
+    at_seconds = thumbnail_seek(at_seconds, duration, index)
+    cmd = build_thumbnail_command(video_path, thumbnail_path, at_seconds, height)
+
+    subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=120)
+    log.info("🖼️  Thumbnail created at %.1fs", at_seconds, extra=kv(path=thumbnail_path))
+    return thumbnail_path
+
+def generate_preview(source_path, preview_path, start=10, length=10, height=360, duration=None):
+    """Short low-bitrate clip starting near start, decoding only that stretch of the file"""
+    start = preview_start(start, length, duration)
+    cmd = build_preview_command(source_path, preview_path, start, length, height)
+
+    subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=300)
+    log.info("🎬 Preview created (%.0fs from %.1fs)", length, start, extra=kv(path=preview_path))
+    return preview_path
+
+def run_optional_step(name, func, *args, **kwargs):
+    """Run a thumbnail/preview step without letting it fail the job"""
+    try:
+        return func(*args, **kwargs)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError) as e:
+        stderr = getattr(e, "stderr", None)
+        log.warning("%s generation failed: %s%s", name, e, f" - {stderr.strip()}" if stderr else "")
+        return None
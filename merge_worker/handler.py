@@ -0,0 +1,463 @@
+"""
+Job handler shared by every worker entry point
+"""
+
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+from .logs import LazyJSON, get_logger, kv
+
+log = get_logger(__name__)
+
+# Entry points (worker.py, worker_flexible.py) are thin configurations of this
+DEFAULT_CONFIG = {
+    "workspace_dir": "/workspace",
+    "parser_defaults": {}  # Overrides for parsers.PARSER_DEFAULTS
+}
+
+def cleanup_temp_files(*paths):
+    """Remove downloaded inputs once they're no longer needed"""
+    try:
+        for path in paths:
+            path.unlink()
+        log.debug("Temporary files cleaned up")
+    except Exception as e:
+        log.warning("Failed to clean up temp files: %s", e)
+
+def job_notifier(event, params):
+    """The job's WebhookNotifier (made once, kept in params), None without a webhook_url"""
+    if not params or not params.get("webhook"):
+        return None
+    if "notifier" not in params:
+        from .webhooks import WebhookNotifier
+
+        params["notifier"] = WebhookNotifier(params["webhook"], event.get("id"))
+    return params["notifier"]
+
+def report_progress(event, progress, params=None):
+    """Send an interim status to RunPod (shown by /status) and to the job's webhook
+
+    Only real RunPod jobs have an id; webhook progress events are throttled.
+    """
+    notifier = job_notifier(event, params)
+    if notifier:
+        notifier.progress(progress)
+    if not event.get("id"):
+        return
+    try:
+        import runpod
+        runpod.serverless.progress_update(event, progress)
+    except Exception as e:
+        log.warning("Progress update failed: %s", e)
+
+def ffmpeg_progress(event, params, stage, duration=None):
+    """run_ffmpeg() callback that sends FFmpeg's position to the job's webhook, None when no one listens
+
+    The notifier throttles these to one every WEBHOOK_PROGRESS_INTERVAL seconds.
+    """
+    notifier = job_notifier(event, params)
+    if not notifier or not notifier.send_progress:
+        return None
+
+    def forward(update):
+        seconds = update["out_seconds"]
+        notifier.progress({
+            "stage": stage,
+            "seconds": round(seconds, 1) if seconds is not None else None,
+            "percent": round(min(seconds / duration, 1.0) * 100, 1) if seconds is not None and duration else None,
+            "speed": update["speed"]
+        })
+    return forward
+
+def make_handler(config=None):
+    """Build a RunPod handler for one worker configuration"""
+    config = {**DEFAULT_CONFIG, **(config or {})}
+
+    def handler(event):
+        try:
+            params = parse_job(event, config)
+        except Exception:
+            params = None  # handle_job reports the error
+        result = handle_job(event, config, params)
+        notifier = job_notifier(event, params)
+        if notifier:
+            notifier.result(result)
+        return result
+
+    return handler
+
+def parse_job(event, config=DEFAULT_CONFIG):
+    """Unwrap the RunPod event and parse it in whichever format it uses"""
+    from .parsers import parse_concat_format, parse_digitalocean_format, parse_simple_format
+
+    # RunPod wraps payload in "input" field
+    payload = event["input"] if "input" in event else event
+    
+    # Detect format and parse
+    if "clips" in payload:
+        log.debug("Detected concat job", extra=kv(wrapped="input" in event))
+        return parse_concat_format(payload, config["parser_defaults"])
+    if "inputs" in payload:
+        # DigitalOcean format
+        log.debug("Detected DigitalOcean FFmpeg format", extra=kv(wrapped="input" in event))
+        return parse_digitalocean_format(payload, config["parser_defaults"])
+    # Simple format
+    log.debug("Detected simple RunPod format", extra=kv(wrapped="input" in event))
+    return parse_simple_format(payload, config["parser_defaults"])
+
+def missing_input_error(params):
+    """Error for a parsed job with an input URL missing, None when every input has one"""
+    from .preflight import job_inputs
+
+    missing = [name for name, url, _ in job_inputs(params) if not url]
+    if not missing:
+        return None
+    if params.get("job_type") == "concat":
+        return f"No URL given for {', '.join(missing)}"
+    return "Both video_url and audio_url are required"
+
+def handle_job(event, config=DEFAULT_CONFIG, params=None):
+    """
+    Main handler for RunPod serverless - supports both formats
+    
+    DigitalOcean Format (RunPod wraps in "input"):
+    {
+        "input": {
+            "inputs": [
+                {"file_url": "VIDEO_URL"},
+                {"file_url": "AUDIO_URL"}
+            ],
+            "filters": [
+                {"filter": "[1:0]volume=1[audio]"}
+            ],
+            "outputs": [...],
+            "id": "audio-layering"
+        }
+    }
+    
+    Simple Format (RunPod wraps in "input"):
+    {
+        "input": {
+            "video_url": "VIDEO_URL",
+            "audio_url": "AUDIO_URL",
+            "volume": 0.7,
+            "output_filename": "output.mp4"
+        }
+    }
+    
+    Concat Format (RunPod wraps in "input") - clips joined in order, see concat.py:
+    {
+        "input": {
+            "clips": ["CLIP_URL_1", "CLIP_URL_2", ...],
+            "audio_url": "AUDIO_URL"
+        }
+    }
+    
+    params is the already parsed event, if the caller has it.
+    """
+    # Loaded by the first job rather than at import, so registering the handler stays cheap (bench_startup.py)
+    from .audiomix import music_layers
+    from .cache import input_cache_identity, lookup_cached_result, result_cache_key, store_cached_result
+    from .costmodel import choose_video_encoder, predict_rendition_seconds
+    from .download import fetch_input
+    from .ffmpeg import (check_gpu_availability, generate_preview, generate_thumbnail, merge_renditions,
+                         merge_video_audio, run_optional_step)
+    from .mediaindex import load_index, start_indexing, video_stream
+    from .planner import partial_output_path, plan_timing
+    from .preflight import (PreflightError, output_space, preflight_job, release_disk_space, required_disk_space,
+                            reserve_disk_space)
+    from .probe import check_media_file, probe_video_stream
+
+    work_paths = {}
+    reservation = 0
+    try:
+        # Serialized only at DEBUG - DigitalOcean payloads can be large
+        log.debug("Received event: %s", LazyJSON(event))
+        
+        # The scheduler has usually parsed the event already
+        if params is None:
+            params = parse_job(event, config)
+        if params.get("explain"):
+            from .explain import explain_job
+            return explain_job(params, config)
+        if params.get("job_type") == "concat":
+            from .concat import handle_concat_job
+            return handle_concat_job(event, config, params)
+        
+        video_url = params["video_url"]
+        audio_url = params["audio_url"]
+        volume = params["volume"]
+        output_filename = params["output_filename"]
+        gpu_acceleration = params.get("gpu_acceleration", True)
+        use_nvenc = params.get("use_nvenc", True)
+        direct_io = params.get("direct_io", False)
+        
+        if missing_input_error(params):
+            return {"error": missing_input_error(params)}
+        
+        log.info("Processing job", extra=kv(video=video_url, audio=audio_url, volume=volume))
+        log.debug("GPU settings", extra=kv(gpu_acceleration=gpu_acceleration, use_nvenc=use_nvenc))
+        
+        # Create workspace directories
+        workspace_dir = Path(config["workspace_dir"])
+        temp_dir = workspace_dir / "temp"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Generate unique job ID
+        job_id = uuid.uuid4().hex[:8]
+        
+        # Define file paths
+        video_temp = temp_dir / f"video_{job_id}.mp4"
+        audio_temp = temp_dir / f"audio_{job_id}.mp3"
+        renditions = params.get("renditions")
+        if renditions:
+            output_filename = renditions[0]["filename"]
+        output_path = workspace_dir / output_filename
+        output_paths = [workspace_dir / r["filename"] for r in renditions] if renditions else [output_path]
+        thumbnail_path = workspace_dir / f"{output_path.stem}_thumb.jpg" if params.get("thumbnail") else None
+        preview_path = workspace_dir / f"{output_path.stem}_preview.mp4" if params.get("preview") else None
+        artifact_paths = [path for path in (thumbnail_path, preview_path) if path]
+        # Outputs are written under per-job names and replace the published ones when the job is done
+        work_paths = {path: partial_output_path(path, job_id) for path in output_paths + artifact_paths}
+        use_cache = params.get("use_cache", True)
+        
+        # Duplicate submission with declared digests / volume inputs - skip everything
+        if use_cache:
+            cache_key = result_cache_key(
+                params,
+                input_cache_identity(video_url, params.get("video_expected")),
+                input_cache_identity(audio_url, params.get("audio_expected"))
+            )
+            cached = lookup_cached_result(cache_key, output_paths + artifact_paths)
+            if cached:
+                return cached
+        
+        # Reject unreachable/non-media inputs and jobs that can't fit on disk before downloading
+        try:
+            preflight = params.get("preflight") or preflight_job(params)
+            # A video seen before has a known duration to size renditions by
+            known_video = load_index(input_cache_identity(video_url, params.get("video_expected")))
+            needed = required_disk_space(preflight, output_space(params, preflight,
+                                                                 known_video and known_video["duration"]))
+            reservation = reserve_disk_space(workspace_dir, needed)
+        except PreflightError as e:
+            return {"error": f"Preflight failed: {e}"}
+        
+        # Download files with timing
+        start_time = time.time()
+        video_start = time.time()
+        video_info = fetch_input(video_url, str(video_temp), direct_io=direct_io,
+                                 expected=params.get("video_expected"), preflight=preflight["video"])
+        video_time = time.time() - video_start
+        log.info("📹 Video ready in %.1f seconds", video_time, extra=kv(method=video_info.get("method")))
+        
+        audio_start = time.time()
+        audio_info = fetch_input(audio_url, str(audio_temp), direct_io=direct_io,
+                                 expected=params.get("audio_expected"), preflight=preflight["audio"])
+        audio_time = time.time() - audio_start
+        log.info("🎵 Audio ready in %.1f seconds", audio_time, extra=kv(method=audio_info.get("method")))
+        
+        download_time = time.time() - start_time
+        
+        # Verify downloads
+        if not video_temp.exists() or video_temp.stat().st_size == 0:
+            return {"error": "Failed to download video file"}
+        
+        if not audio_temp.exists() or audio_temp.stat().st_size == 0:
+            return {"error": "Failed to download audio file"}
+        
+        log.info("📦 Inputs ready in %.1f seconds", download_time,
+                 extra=kv(video_mb=video_temp.stat().st_size >> 20, audio_mb=audio_temp.stat().st_size >> 20))
+        
+        # Catch truncated/corrupt inputs now instead of minutes into the mux
+        try:
+            video_duration = check_media_file(str(video_temp), "Video")
+            audio_duration = check_media_file(str(audio_temp), "Audio")
+        except ValueError as e:
+            return {"error": f"Input check failed: {e}"}
+        
+        # Exact output length from the probed inputs - replaces -shortest guesswork
+        timing = plan_timing(video_duration, audio_duration, params.get("duration"),
+                             loop_audio=params.get("loop_audio", True), fade_in=params.get("audio_fade_in", 0.0),
+                             fade_out=params.get("audio_fade_out", 0.0))
+        output_duration = timing["duration"] if timing else None
+        if timing:
+            log.info("⏱️  Output duration %.1fs", output_duration,
+                     extra=kv(loop_video=timing["loop_video"], loop_audio=timing["loop_audio"]))
+        
+        # Same content under different URLs - digests are known now
+        video_identity = input_cache_identity(video_url, info=video_info)
+        cache_key = None
+        if use_cache:
+            cache_key = result_cache_key(
+                params,
+                video_identity,
+                input_cache_identity(audio_url, info=audio_info)
+            )
+            cached = lookup_cached_result(cache_key, output_paths + artifact_paths)
+            if cached:
+                cleanup_temp_files(video_temp, audio_temp)
+                return cached
+        
+        # Keyframe index from an earlier job with this video, otherwise built in the background
+        media_index = load_index(video_identity)
+        if not media_index:
+            start_indexing(str(video_temp), video_identity, force=params.get("index", False))
+        
+        # Pick the encoder from learned speeds and tell the caller how long the encode should take
+        gpu_available = check_gpu_availability()
+        source_video = video_stream(media_index) if media_index else probe_video_stream(str(video_temp))
+        encoder = None
+        if renditions:
+            predicted_seconds = predict_rendition_seconds(renditions, use_nvenc, gpu_available,
+                                                          source_video and source_video["height"], output_duration)
+        else:
+            encoder = choose_video_encoder(params, source_video, gpu_available, output_duration)
+            predicted_seconds = encoder["predicted_seconds"]
+            log.info("🧮 Encoder %s %s", encoder["codec"], encoder["preset"] or "",
+                     extra=kv(predicted_speed=encoder["predicted_speed"], predicted_s=predicted_seconds))
+        estimate = {
+            "encoder": encoder["codec"] if encoder else "renditions",
+            "preset": encoder["preset"] if encoder else None,
+            "predicted_seconds": predicted_seconds
+        }
+        report_progress(event, {"stage": "encoding", "estimate": estimate}, params)
+        
+        # Video frames are unchanged by the merge, so the thumbnail can come from the source
+        if thumbnail_path and not run_optional_step(
+                "Thumbnail", generate_thumbnail, str(video_temp), str(work_paths[thumbnail_path]),
+                at_seconds=params["thumbnail_time"], height=params["thumbnail_height"],
+                duration=video_duration, index=media_index):
+            thumbnail_path = None
+        
+        # Merge video and audio with timing
+        ffmpeg_start = time.time()
+        if renditions:
+            achieved_speed = merge_renditions(
+                str(video_temp),
+                str(audio_temp),
+                str(workspace_dir),
+                [{**r, "filename": work_paths[workspace_dir / r["filename"]].name} for r in renditions],
+                volume,
+                gpu_acceleration=gpu_acceleration,
+                use_nvenc=use_nvenc,
+                timing=timing,
+                on_progress=ffmpeg_progress(event, params, "encoding", output_duration)
+            )
+        else:
+            # Block engine: the soundtrack is rendered in NumPy and piped into this same mux
+            audio_layers = None
+            if params.get("audio_engine") == "numpy":
+                audio_layers = music_layers(str(audio_temp), volume, timing)
+            achieved_speed = merge_video_audio(
+                str(video_temp), 
+                str(audio_temp), 
+                str(work_paths[output_path]),
+                volume,
+                gpu_acceleration=gpu_acceleration,
+                use_nvenc=use_nvenc,
+                timing=timing,
+                encoder=encoder,
+                audio_layers=audio_layers,
+                on_progress=ffmpeg_progress(event, params, "encoding", output_duration)
+            )
+        ffmpeg_time = time.time() - ffmpeg_start
+        log.info("✅ FFmpeg completed in %.1f seconds", ffmpeg_time)
+        
+        # Verify output
+        for path in output_paths:
+            if not work_paths[path].exists() or work_paths[path].stat().st_size == 0:
+                return {"error": f"FFmpeg failed to create output file {path.name}"}
+        
+        output_size_mb = work_paths[output_path].stat().st_size / (1024*1024)
+        log.info("Output file created", extra=kv(path=output_path, size_mb=round(output_size_mb, 1)))
+        
+        # Preview needs the music, so it's cut from the finished output
+        if preview_path and (output_path.suffix != ".mp4" or not run_optional_step(
+                "Preview", generate_preview, str(work_paths[output_path]), str(work_paths[preview_path]),
+                start=params["thumbnail_time"], length=params["preview_duration"],
+                duration=output_duration)):
+            preview_path = None
+        
+        cleanup_temp_files(video_temp, audio_temp)
+        
+        # Return response in DigitalOcean FFmpeg format
+        response_data = {
+            "success": True,
+            "output_path": str(output_path),
+            "output_filename": output_filename,
+            "output_size_mb": round(output_size_mb, 2),
+            "job_id": job_id,
+            # Predicted vs achieved encode time - also sent up front as a progress update
+            "estimate": {**estimate, "achieved_speed": achieved_speed, "ffmpeg_seconds": round(ffmpeg_time, 1)},
+            # How each input arrived - for downloads, the read size and connection count the transfer settled on
+            "metrics": {
+                "download_seconds": round(download_time, 1),
+                "video": {"method": video_info["method"], **video_info.get("transfer", {})},
+                "audio": {"method": audio_info["method"], **audio_info.get("transfer", {})}
+            },
+            # Digests computed while downloading - usable as input cache keys
+            "inputs": {
+                "video": {"size": video_info["size"], **video_info["digests"]},
+                "audio": {"size": audio_info["size"], **audio_info["digests"]}
+            },
+            # DigitalOcean FFmpeg compatibility - exact format
+            "response": {
+                "file_url": str(output_path),
+                # Falls back to the file itself when no thumbnail could be made
+                "thumbnail_url": str(thumbnail_path or output_path),
+                "preview_url": str(preview_path) if preview_path else None,
+                "duration": round(output_duration, 3) if output_duration else None,
+                "bitrate": None,
+                "filesize": round(output_size_mb, 2),
+                "metadata": {
+                    "width": None,
+                    "height": None,
+                    "duration": round(output_duration, 3) if output_duration else None,
+                    "fps": None,
+                    "codec": "h264/aac"
+                }
+            }
+        }
+        
+        if renditions:
+            response_data["renditions"] = [
+                {
+                    "name": r["name"],
+                    "type": r["type"],
+                    "filename": r["filename"],
+                    "file_url": str(path),
+                    "filesize": round(work_paths[path].stat().st_size / (1024*1024), 2)
+                }
+                for r, path in zip(renditions, output_paths)
+            ]
+        
+        # Cached from this job's own files - another job may publish to the same paths meanwhile.
+        # A result missing an artifact isn't cached: lookups restore every requested file or none.
+        produced_paths = output_paths + [path for path in (thumbnail_path, preview_path) if path]
+        if cache_key:
+            if len(produced_paths) == len(output_paths + artifact_paths):
+                store_cached_result(cache_key, produced_paths, response_data,
+                                    sources=[work_paths[path] for path in produced_paths])
+            response_data["cache"] = {"hit": False, "key": cache_key}
+        for path in produced_paths:
+            os.replace(work_paths[path], path)
+        
+        # Final timing summary
+        total_time = time.time() - start_time
+        log.info("⏱️  Job complete", extra=kv(downloads_s=round(download_time, 1), ffmpeg_s=round(ffmpeg_time, 1),
+                                              total_s=round(total_time, 1)))
+        log.debug("Returning response: %s", LazyJSON(response_data))
+        return response_data
+        
+    except Exception as e:
+        log.error("Handler error: %s", e, exc_info=log.isEnabledFor(logging.DEBUG))
+        return {"error": f"Processing failed: {str(e)}"}
+    finally:
+        release_disk_space(reservation)
+        # Partial outputs of a failed job
+        for path in work_paths.values():
+            path.unlink(missing_ok=True)
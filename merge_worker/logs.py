@@ -0,0 +1,113 @@
+"""
+Leveled, structured logging with bounded volume
+
+Everything under the merge_worker logger goes to stdout (RunPod's log
+stream), one line per record. Any structured fields are appended as
+key=value pairs, or emitted as a JSON object per line with LOG_FORMAT=json.
+Full payloads, responses and FFmpeg command lines are DEBUG records passed
+as lazy arguments, so nothing is serialized unless LOG_LEVEL=DEBUG.
+Download and encode progress goes through ProgressLog, which logs at most
+once per LOG_PROGRESS_INTERVAL seconds.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "text" or "json"
+LOG_PROGRESS_INTERVAL = float(os.environ.get("LOG_PROGRESS_INTERVAL", 10))  # seconds
+
+ROOT_LOGGER = "merge_worker"
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: "LEVEL module: message key=value ..." or a JSON object"""
+
+    def __init__(self, style="text"):
+        super().__init__()
+        self.json = style == "json"
+
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        if self.json:
+            return json.dumps({"ts": round(record.created, 3), "level": record.levelname,
+                               "logger": record.name, "msg": message, **fields}, default=str)
+        pairs = "".join(f" {key}={value}" for key, value in fields.items())
+        return f"{record.levelname:<7} {record.name.rsplit('.', 1)[-1]}: {message}{pairs}"
+
+_configured = False
+
+def configure_logging(level=None, style=None, stream=None):
+    """(Re)attach the stdout handler - level/style default to LOG_LEVEL/LOG_FORMAT"""
+    global _configured
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(StructuredFormatter(style or LOG_FORMAT))
+    logger.addHandler(handler)
+    logger.setLevel(level or LOG_LEVEL)
+    # Stay out of runpod's root logger configuration
+    logger.propagate = False
+    _configured = True
+    return logger
+
+def get_logger(name):
+    """Logger for a merge_worker module (or an entry point), configured on first use"""
+    if not _configured:
+        configure_logging()
+    if not name.startswith(ROOT_LOGGER):
+        name = f"{ROOT_LOGGER}.{name}"
+    return logging.getLogger(name)
+
+def set_debug(enabled=True):
+    """Toggle DEBUG output (payload/response dumps, FFmpeg command lines) at runtime"""
+    logging.getLogger(ROOT_LOGGER).setLevel(logging.DEBUG if enabled else LOG_LEVEL)
+
+def kv(**fields):
+    """Structured fields for a record: log.info("Downloaded", extra=kv(size_mb=12))"""
+    return {"fields": fields}
+
+class LazyJSON:
+    """Serializes only if the record is actually emitted"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, default=str)
+
+class LazyCommand:
+    """Joins a command line only if the record is actually emitted"""
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+
+    def __str__(self):
+        return " ".join(self.cmd)
+
+class ProgressLog:
+    """Progress records for one long operation, at most one per interval"""
+
+    def __init__(self, logger, label, total=0, interval=None):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.interval = LOG_PROGRESS_INTERVAL if interval is None else interval
+        self.next_time = time.monotonic() + self.interval
+
+    def update(self, done):
+        now = time.monotonic()
+        if now < self.next_time or not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.next_time = now + self.interval
+        if self.total:
+            self.logger.info("%s %d%%", self.label, done * 100 // self.total,
+                             extra=kv(done_mb=done >> 20, total_mb=self.total >> 20))
+        else:
+            self.logger.info("%s", self.label, extra=kv(done_mb=done >> 20))
@@ -0,0 +1,242 @@
+"""
+Persistent keyframe index per input - seek by byte range without re-scanning the file
+
+The first time an input is seen, one ffprobe pass lists the video packets.
+The index keeps the stream parameters (probe.probe_clip()), the packet count
+and every keyframe's timestamp and byte offset. It is stored gzipped on the
+volume, keyed by the input's content identity (its SHA-256 for downloads,
+path/size/mtime for volume files), so a re-submitted input costs no probing
+at all. Lookups bisect the keyframe list: the keyframe at or before a time,
+the next one after it, and the byte range covering a time span.
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .logs import get_logger, kv
+from .probe import probe_clip
+
+log = get_logger(__name__)
+
+MEDIA_INDEX_DIR = Path(os.environ.get("MEDIA_INDEX_DIR", "/workspace/cache/index"))
+MEDIA_INDEX_ENABLED = os.environ.get("MEDIA_INDEX_ENABLED", "1") != "0"
+# Indexes are a few tens of KB each; the least recently used are pruned past this count
+MEDIA_INDEX_MAX_ENTRIES = int(os.environ.get("MEDIA_INDEX_MAX_ENTRIES", 5000))
+MEDIA_INDEX_TIMEOUT = 600  # seconds for the packet scan of one input
+# Larger inputs are only indexed when the job asks for it ("index": true). The scan reads the whole
+# file but demuxes only (about 0.3 CPU-s per GB), and a fresh download is mostly still in the page
+# cache, so it costs little for the 5-15 GB multi-hour inputs it pays off on. Past 20 GB (mezzanine
+# masters) a cold re-read is minutes of disk time taken from the next job's download and encode.
+MEDIA_INDEX_MAX_BYTES = int(float(os.environ.get("MEDIA_INDEX_MAX_GB", 20)) * 1024 ** 3)
+MEDIA_INDEX_WORKERS = int(os.environ.get("MEDIA_INDEX_WORKERS", 1))
+# Scans waiting beyond this are skipped - the input is indexed the next time it's seen
+MEDIA_INDEX_MAX_PENDING = int(os.environ.get("MEDIA_INDEX_MAX_PENDING", 4))
+INDEX_VERSION = 2  # 2: probes carry the H.264 level
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+def index_key(identity):
+    """File name stem for an input's index - the SHA-256 itself when the identity is one"""
+    if identity.startswith("sha256:"):
+        return identity[len("sha256:"):]
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def _index_path(identity):
+    return MEDIA_INDEX_DIR / f"{index_key(identity)}.json.gz"
+
+def load_index(identity):
+    """Stored index for an input identity (cache.input_cache_identity()), None if there is none"""
+    if not identity or not MEDIA_INDEX_ENABLED:
+        return None
+    path = _index_path(identity)
+    try:
+        with gzip.open(path, "rt") as f:
+            index = json.load(f)
+    except (OSError, EOFError, json.JSONDecodeError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    try:
+        os.utime(path)  # Recency for pruning
+    except OSError:
+        pass
+    return index
+
+def store_index(identity, index):
+    # Write-then-rename, like the result cache index
+    MEDIA_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    path = _index_path(identity)
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}")
+    with gzip.open(tmp_path, "wt") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    _prune()
+
+def _prune():
+    entries = list(MEDIA_INDEX_DIR.glob("*.json.gz"))
+    if len(entries) <= MEDIA_INDEX_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - MEDIA_INDEX_MAX_ENTRIES]:
+        entry.unlink(missing_ok=True)
+
+def parse_packets(output):
+    """(packet count, keyframe times, keyframe byte offsets) from ffprobe compact packet output"""
+    count = 0
+    keyframes = []
+    for line in output.splitlines():
+        fields = dict(field.partition("=")[::2] for field in line.split("|"))
+        if "flags" not in fields:
+            continue
+        count += 1
+        if not fields["flags"].startswith("K"):
+            continue
+        time = fields.get("pts_time", "N/A")
+        if time == "N/A":
+            time = fields.get("dts_time", "N/A")
+        if time == "N/A" or fields.get("pos", "N/A") == "N/A":
+            continue
+        keyframes.append((round(float(time), 6), int(fields["pos"])))
+    keyframes.sort()
+    return count, [time for time, _ in keyframes], [offset for _, offset in keyframes]
+
+def build_index(path, timeout=MEDIA_INDEX_TIMEOUT):
+    """Index one video file with ffprobe
+
+    Raises ValueError if the file can't be read and FileNotFoundError
+    without ffprobe, like probe_clip().
+    """
+    probe = probe_clip(path, timeout=timeout)
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "packet=pts_time,dts_time,pos,flags", "-of", "compact=p=0", path],
+        capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise ValueError(f"ffprobe could not list packets of {path}: {result.stderr.strip()}")
+    count, times, offsets = parse_packets(result.stdout)
+    if not times:
+        raise ValueError(f"No keyframes found in {path}")
+    return {
+        "version": INDEX_VERSION,
+        "size": os.path.getsize(path),
+        "duration": probe["duration"],
+        "probe": probe,
+        "packets": count,
+        "keyframes": {"times": times, "offsets": offsets}
+    }
+
+def index_input(path, identity):
+    """The input's index - loaded if stored, built and stored otherwise; None if it can't be built"""
+    index = load_index(identity)
+    if index or not identity or not MEDIA_INDEX_ENABLED:
+        return index
+    try:
+        index = build_index(path)
+    except (ValueError, FileNotFoundError, subprocess.TimeoutExpired) as e:
+        log.warning("Could not index %s: %s", Path(path).name, e)
+        return None
+    try:
+        store_index(identity, index)
+    except OSError as e:
+        log.warning("Could not store media index: %s", e)
+    log.info("🗂️  Indexed %s", Path(path).name,
+             extra=kv(keyframes=len(index["keyframes"]["times"]), packets=index["packets"]))
+    return index
+
+def start_indexing(path, identity, link_dir=None, force=False):
+    """Index an input in the background; returns a Future, or None if it won't be indexed now
+
+    The scan reads its own hardlink of the file, made in link_dir (default
+    the file's directory) and deleted when the scan ends. So the job neither
+    waits for the scan nor keeps its copy around for it. Inputs larger than
+    MEDIA_INDEX_MAX_BYTES are only indexed with force. When
+    MEDIA_INDEX_MAX_PENDING scans are already waiting, the input is skipped.
+    """
+    global _executor, _pending
+    if not identity or not MEDIA_INDEX_ENABLED:
+        return None
+    name = Path(path).name
+    if not force and os.path.getsize(path) > MEDIA_INDEX_MAX_BYTES:
+        log.debug("Not indexing %s - larger than MEDIA_INDEX_MAX_GB", name)
+        return None
+    with _executor_lock:
+        if _pending >= MEDIA_INDEX_MAX_PENDING:
+            log.info("Index queue full, not indexing %s", name, extra=kv(pending=_pending))
+            return None
+        link = Path(link_dir or Path(path).parent) / f"index_{uuid.uuid4().hex[:8]}{Path(path).suffix}"
+        try:
+            os.link(path, link)
+        except OSError as e:
+            log.warning("Could not link %s for indexing: %s", name, e)
+            return None
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MEDIA_INDEX_WORKERS, thread_name_prefix="media-index")
+        _pending += 1
+    return _executor.submit(_index_link, link, identity)
+
+def _index_link(link, identity):
+    global _pending
+    try:
+        return index_input(str(link), identity)
+    finally:
+        link.unlink(missing_ok=True)
+        with _executor_lock:
+            _pending -= 1
+
+def keyframe_at(index, seconds):
+    """(time, byte offset) of the last keyframe at or before seconds - the first keyframe before it"""
+    keyframes = index["keyframes"]
+    position = max(0, bisect.bisect_right(keyframes["times"], seconds) - 1)
+    return keyframes["times"][position], keyframes["offsets"][position]
+
+def keyframe_after(index, seconds):
+    """(time, byte offset) of the first keyframe after seconds, None past the last one"""
+    keyframes = index["keyframes"]
+    position = bisect.bisect_right(keyframes["times"], seconds)
+    if position == len(keyframes["times"]):
+        return None
+    return keyframes["times"][position], keyframes["offsets"][position]
+
+def byte_range(index, start, end):
+    """(first byte, end byte) of the video packets needed to decode start..end seconds
+
+    Starts at the keyframe at or before start and stops at the keyframe
+    after end (the end of the file past the last one). Audio interleaved
+    with the video falls inside the same range.
+    """
+    following = keyframe_after(index, end)
+    return keyframe_at(index, start)[1], following[1] if following else index["size"]
+
+def split_points(index, segment_seconds):
+    """Keyframe times splitting the video into segments of about segment_seconds, 0 excluded"""
+    times = index["keyframes"]["times"]
+    points = []
+    target = segment_seconds
+    while True:
+        following = keyframe_after(index, target - 1e-6)
+        if following is None:
+            return points
+        if following[0] > (points[-1] if points else times[0]):
+            points.append(following[0])
+        target = following[0] + segment_seconds
+
+def video_stream(index):
+    """probe.probe_video_stream()-shaped summary of an indexed input's video"""
+    video = index["probe"]["video"]
+    return {
+        "codec": video["codec_name"],
+        "width": int(video["width"]) if video["width"] else None,
+        "height": int(video["height"]) if video["height"] else None,
+        "bit_rate": index["probe"]["bit_rate"]
+    }
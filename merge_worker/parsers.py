@@ -0,0 +1,309 @@
+"""
+Request parsing for the DigitalOcean FFmpeg format and the simple RunPod format
+"""
+
+import re
+import uuid
+from pathlib import Path
+
+from .download import HASH_ALGORITHMS
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+# Values used when a request doesn't set them - entry points override these
+PARSER_DEFAULTS = {
+    "digitalocean_volume": 1.0,  # Same default as DigitalOcean FFmpeg
+    "simple_volume": 0.7,
+    "gpu_acceleration": True,
+    "use_nvenc": True
+}
+
+def parse_expected(source, prefix=""):
+    """Pull optional size/digest expectations (e.g. "sha256" or "video_sha256") for one input"""
+    expected = {}
+    for key in HASH_ALGORITHMS + ("size",):
+        value = source.get(f"{prefix}{key}")
+        if value:
+            expected[key] = int(value) if key == "size" else str(value).lower()
+    return expected
+
+RENDITION_TYPES = ("video", "audio", "thumbnail")
+RENDITION_EXTENSIONS = {"video": "mp4", "audio": "m4a", "thumbnail": "jpg"}
+# Default bitrate per output height for re-encoded renditions
+RENDITION_BITRATES = {2160: "20M", 1440: "10M", 1080: "5M", 720: "3M", 480: "1500k", 360: "800k"}
+
+def parse_renditions(outputs, base_name):
+    """Turn an outputs/renditions array into rendition specs for one FFmpeg pass
+
+    Each entry may set "type" (video/audio/thumbnail), "name", "height",
+    "codec" ("copy", "auto", "h264_nvenc", "libx264"), "bitrate", "preset",
+    "format" and, for thumbnails, "time". DigitalOcean-style "options"
+    lists are read for -c:v, -b:v and -preset.
+    """
+    renditions = []
+    for index, output in enumerate(outputs):
+        if not isinstance(output, dict):
+            raise ValueError(f"Output {index} must be an object")
+
+        options = {o.get("option"): o.get("argument") for o in output.get("options", [])
+                   if isinstance(o, dict)}
+        kind = output.get("type", "video")
+        if kind not in RENDITION_TYPES:
+            raise ValueError(f"Output {index} has unknown type '{kind}' (use {', '.join(RENDITION_TYPES)})")
+
+        height = int(output["height"]) if output.get("height") else None
+        codec = output.get("codec") or options.get("-c:v")
+        if kind == "video":
+            codec = codec or ("auto" if height else "copy")
+            if codec in ("h264", "libx264"):
+                codec = "libx264"
+            elif codec not in ("copy", "auto", "h264_nvenc"):
+                raise ValueError(f"Output {index} has unsupported codec '{codec}'")
+            if codec == "copy" and height:
+                raise ValueError(f"Output {index} can't be scaled to {height}p with stream copy")
+
+        if index == 0:
+            default_name = "main"
+        elif kind == "video":
+            default_name = f"{height}p" if height else f"video_{index}"
+        else:
+            default_name = kind
+        name = output.get("name") or default_name
+        extension = output.get("format") or RENDITION_EXTENSIONS[kind]
+        filename = f"{base_name}.{extension}" if index == 0 else f"{base_name}_{name}.{extension}"
+        bitrate = output.get("bitrate") or options.get("-b:v") or RENDITION_BITRATES.get(height, "5M")
+
+        renditions.append({
+            "name": name,
+            "type": kind,
+            "height": height,
+            "codec": codec,
+            "bitrate": str(bitrate),
+            "preset": output.get("preset") or options.get("-preset"),
+            "time": float(output.get("time", 10)),
+            "filename": filename
+        })
+
+    filenames = [r["filename"] for r in renditions]
+    if len(set(filenames)) != len(filenames):
+        raise ValueError("Rendition names must be unique")
+    return renditions
+
+def parse_timing_options(event):
+    """Output length options shared by both request formats"""
+    duration = event.get("duration")
+    if duration is not None:
+        duration = float(duration)
+        if duration <= 0:
+            raise ValueError(f"duration must be positive, got {duration}")
+    return {
+        "duration": duration,  # Output length in seconds - defaults to the video's length
+        "loop_audio": event.get("loop_audio", True)  # Repeat music shorter than the output
+    }
+
+AUDIO_ENGINE_CHOICES = ("ffmpeg", "numpy")
+
+def parse_audio_options(event):
+    """Music fades and mixing engine shared by both request formats"""
+    engine = event.get("audio_engine", "ffmpeg")
+    if engine not in AUDIO_ENGINE_CHOICES:
+        raise ValueError(f"audio_engine must be one of {', '.join(AUDIO_ENGINE_CHOICES)}, got '{engine}'")
+    fades = {}
+    for name in ("audio_fade_in", "audio_fade_out"):
+        fades[name] = float(event.get(name, 0))
+        if fades[name] < 0:
+            raise ValueError(f"{name} must not be negative, got {fades[name]}")
+    return {
+        "audio_engine": engine,  # numpy renders the music in blocks and pipes it into the mux
+        **fades  # Seconds of quarter-sine fade at the start/end of the output
+    }
+
+def parse_webhook_options(event):
+    """Completion webhook shared by every request format (see webhooks.py)"""
+    url = event.get("webhook_url")
+    if not url:
+        return {"webhook": None}
+    if not re.match(r"https?://", str(url)):
+        raise ValueError(f"webhook_url must be an http(s) URL, got '{url}'")
+    return {
+        # The final result is POSTed here; progress events too when webhook_progress is set
+        "webhook": {"url": str(url), "progress": bool(event.get("webhook_progress", False))}
+    }
+
+ENCODER_CHOICES = ("auto", "copy", "h264_nvenc", "libx264")
+QUALITY_CHOICES = ("fast", "balanced", "high")
+
+def parse_encoding_options(event):
+    """Encoder selection targets shared by both request formats"""
+    encoder = event.get("encoder", "auto")
+    if encoder not in ENCODER_CHOICES:
+        raise ValueError(f"encoder must be one of {', '.join(ENCODER_CHOICES)}, got '{encoder}'")
+    quality = event.get("quality")
+    if quality is not None and quality not in QUALITY_CHOICES:
+        raise ValueError(f"quality must be one of {', '.join(QUALITY_CHOICES)}, got '{quality}'")
+    video_bitrate = event.get("video_bitrate")
+    if video_bitrate is not None and not re.fullmatch(r"\d+(\.\d+)?[kKmM]?", str(video_bitrate)):
+        raise ValueError(f"video_bitrate must look like 5M or 800k, got '{video_bitrate}'")
+    return {
+        "encoder": encoder,  # auto lets the cost model pick the fastest fitting configuration
+        "quality": quality,  # Lowest acceptable preset tier
+        "video_bitrate": str(video_bitrate) if video_bitrate is not None else None  # Bitrate ceiling
+    }
+
+def parse_artifact_options(event):
+    """Thumbnail/preview options shared by both request formats"""
+    return {
+        "thumbnail": event.get("thumbnail", True),  # Real thumbnail instead of the video path
+        "thumbnail_time": float(event.get("thumbnail_time", 10)),
+        "thumbnail_height": int(event.get("thumbnail_height", 720)),
+        "preview": event.get("preview", False),  # Short low-bitrate preview clip
+        "preview_duration": float(event.get("preview_duration", 10))
+    }
+
+def parse_digitalocean_format(event, defaults=None):
+    """Parse DigitalOcean-style FFmpeg JSON into our format"""
+    defaults = {**PARSER_DEFAULTS, **(defaults or {})}
+    
+    # Extract inputs
+    inputs = event.get("inputs", [])
+    if not inputs or len(inputs) < 2:
+        raise ValueError("DigitalOcean format requires at least 2 inputs (video and audio)")
+    
+    # Validate input structure - "file_path" points at a file on the network volume
+    if not isinstance(inputs[0], dict) or ("file_url" not in inputs[0] and "file_path" not in inputs[0]):
+        raise ValueError("First input must have 'file_url' or 'file_path' field")
+    if not isinstance(inputs[1], dict) or ("file_url" not in inputs[1] and "file_path" not in inputs[1]):
+        raise ValueError("Second input must have 'file_url' or 'file_path' field")
+    
+    video_url = inputs[0].get("file_url") or inputs[0].get("file_path")
+    audio_url = inputs[1].get("file_url") or inputs[1].get("file_path")
+    
+    # Extract volume from filters - exactly like DigitalOcean FFmpeg
+    volume = defaults["digitalocean_volume"]
+    filters = event.get("filters", [])
+    
+    for filter_obj in filters:
+        if isinstance(filter_obj, dict) and "filter" in filter_obj:
+            filter_str = filter_obj["filter"]
+            
+            # Parse volume from filter like "[1:0]volume=1[audio]" or "[1:a]volume=0.7[audio]"
+            volume_match = re.search(r'volume=([0-9]*\.?[0-9]+)', filter_str)
+            if volume_match:
+                volume = float(volume_match.group(1))
+                log.debug("Extracted volume %s from filter %s", volume, filter_str)
+                break
+    
+    # Generate output filename from id (exactly like DigitalOcean)
+    job_id = event.get("id", f"output_{uuid.uuid4().hex[:8]}")
+    output_filename = f"{job_id}.mp4"
+    
+    # Extract GPU settings from DigitalOcean format
+    gpu_acceleration = event.get("gpu_acceleration", defaults["gpu_acceleration"])
+    use_nvenc = event.get("use_nvenc", defaults["use_nvenc"])
+    direct_io = event.get("direct_io", False)  # O_DIRECT writes bypass the page cache
+    
+    # Check for GPU hints in outputs array
+    outputs = event.get("outputs", [])
+    for output in outputs:
+        if isinstance(output, dict):
+            if "codec" in output and "nvenc" in output["codec"]:
+                use_nvenc = True
+            if "preset" in output and output["preset"] in ["p1", "p2", "p3", "p4"]:
+                gpu_acceleration = True
+    
+    log.debug("Parsed DigitalOcean job %s", job_id,
+              extra=kv(volume=volume, gpu_acceleration=gpu_acceleration, use_nvenc=use_nvenc))
+    
+    return {
+        "video_url": video_url,
+        "audio_url": audio_url,
+        "volume": volume,
+        "output_filename": output_filename,
+        "job_id": job_id,
+        "gpu_acceleration": gpu_acceleration,
+        "use_nvenc": use_nvenc,
+        "direct_io": direct_io,
+        "video_expected": parse_expected(inputs[0]),
+        "audio_expected": parse_expected(inputs[1]),
+        "use_cache": event.get("cache", True),
+        "explain": bool(event.get("explain", False)),
+        "index": bool(event.get("index", False)),
+        # Several outputs are produced as renditions of a single FFmpeg pass
+        "renditions": parse_renditions(outputs, job_id) if len(outputs) > 1 else None,
+        **parse_timing_options(event),
+        **parse_audio_options(event),
+        **parse_encoding_options(event),
+        **parse_artifact_options(event),
+        **parse_webhook_options(event)
+    }
+
+def parse_simple_format(event, defaults=None):
+    """Parse simple RunPod format with GPU acceleration support"""
+    defaults = {**PARSER_DEFAULTS, **(defaults or {})}
+    output_filename = event.get("output_filename", f"merged_{uuid.uuid4().hex[:8]}.mp4")
+    renditions = event.get("renditions")
+    return {
+        # Either field may be an http(s) URL, a file:// URL or a path on the network volume
+        "video_url": event.get("video_url") or event.get("video_path"),
+        "audio_url": event.get("audio_url") or event.get("audio_path"),
+        "volume": float(event.get("volume", defaults["simple_volume"])),
+        "output_filename": output_filename,
+        "gpu_acceleration": event.get("gpu_acceleration", defaults["gpu_acceleration"]),
+        "use_nvenc": event.get("use_nvenc", defaults["use_nvenc"]),
+        "direct_io": event.get("direct_io", False),  # O_DIRECT writes bypass the page cache
+        "video_expected": parse_expected(event, "video_"),
+        "audio_expected": parse_expected(event, "audio_"),
+        "use_cache": event.get("cache", True),  # Return an identical earlier result if cached
+        "explain": bool(event.get("explain", False)),  # Return the plan and estimates instead of running
+        "index": bool(event.get("index", False)),  # Keyframe-index inputs over MEDIA_INDEX_MAX_GB too
+        "renditions": parse_renditions(renditions, Path(output_filename).stem) if renditions else None,
+        **parse_timing_options(event),
+        **parse_audio_options(event),
+        **parse_encoding_options(event),
+        **parse_artifact_options(event),
+        **parse_webhook_options(event)
+    }
+
+def parse_concat_format(event, defaults=None):
+    """Parse a concat job - an ordered list of clips joined into one video, optionally with music
+
+    Each clip is a URL/volume path, or an object with "url" (or "file_url" /
+    "file_path") plus optional size/digest expectations.
+    """
+    defaults = {**PARSER_DEFAULTS, **(defaults or {})}
+    clips = event.get("clips")
+    if not isinstance(clips, list) or not clips:
+        raise ValueError("clips must be a non-empty list of clip URLs")
+    parsed_clips = []
+    for index, clip in enumerate(clips):
+        if isinstance(clip, str):
+            clip = {"url": clip}
+        url = clip.get("url") or clip.get("file_url") or clip.get("file_path")
+        if not url:
+            raise ValueError(f"Clip {index + 1} has no url")
+        parsed_clips.append({"url": url, "expected": parse_expected(clip)})
+
+    log.debug("Parsed concat job", extra=kv(clips=len(parsed_clips), music=bool(event.get("audio_url"))))
+    return {
+        "job_type": "concat",
+        "clips": parsed_clips,
+        "video_url": None,
+        # Optional music, muxed in the same pass - it replaces the clips' own audio
+        "audio_url": event.get("audio_url") or event.get("audio_path"),
+        "volume": float(event.get("volume", defaults["simple_volume"])),
+        "output_filename": event.get("output_filename", f"concat_{uuid.uuid4().hex[:8]}.mp4"),
+        # Only used to re-encode clips that don't match the others
+        "gpu_acceleration": event.get("gpu_acceleration", defaults["gpu_acceleration"]),
+        "use_nvenc": event.get("use_nvenc", defaults["use_nvenc"]),
+        "direct_io": event.get("direct_io", False),
+        "audio_expected": parse_expected(event, "audio_"),
+        "use_cache": event.get("cache", True),
+        "explain": bool(event.get("explain", False)),
+        "index": bool(event.get("index", False)),
+        "encoder": "copy",  # Joined by stream copy
+        "renditions": None,
+        **parse_timing_options(event),
+        **parse_audio_options(event),
+        **parse_webhook_options(event)
+    }
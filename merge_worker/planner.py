@@ -0,0 +1,412 @@
+"""
+FFmpeg command planning - turns parsed job parameters into command lines
+"""
+
+from pathlib import Path
+
+from .logs import get_logger
+
+log = get_logger(__name__)
+
+AUDIO_BITRATE = "256k"
+AUDIO_ENCODER_ARGS = ["-c:a", "aac", "-b:a", AUDIO_BITRATE, "-ac", "2"]
+# Preset each encoder runs at when the job doesn't name one (p1 = fastest NVENC preset)
+DEFAULT_PRESETS = {"h264_nvenc": "p1", "libx264": "veryfast"}
+
+def video_encoder_args(codec, bitrate="5M", preset=None):
+    """Encoder options for a re-encoded video stream"""
+    if codec == "h264_nvenc":
+        return [
+            "-c:v", "h264_nvenc", 
+            "-preset", preset or DEFAULT_PRESETS["h264_nvenc"],
+            "-profile:v", "high",
+            "-rc", "cbr",  # Constant bitrate for speed
+            "-b:v", bitrate,  # Fixed bitrate for predictable speed
+            "-maxrate", bitrate,
+            "-bufsize", _double_bitrate(bitrate)
+        ]
+    return [
+        "-c:v", "libx264",
+        "-preset", preset or DEFAULT_PRESETS["libx264"],
+        "-b:v", bitrate,
+        "-maxrate", bitrate,
+        "-bufsize", _double_bitrate(bitrate),
+        "-pix_fmt", "yuv420p"
+    ]
+
+def _double_bitrate(bitrate):
+    """"5M" -> "10M", "800k" -> "1600k" (VBV buffer of two seconds)"""
+    number, unit = (bitrate[:-1], bitrate[-1]) if bitrate[-1] in "kKmM" else (bitrate, "")
+    return f"{int(float(number) * 2)}{unit}"
+
+# Durations within this many seconds of the target count as covering it
+DURATION_TOLERANCE = 0.05
+# A thumbnail time is kept this far before the end so select still finds a frame
+THUMBNAIL_END_MARGIN = 1.0
+
+def plan_timing(video_duration, audio_duration, requested_duration=None, loop_audio=True, fade_in=0.0,
+                fade_out=0.0):
+    """Exact output length, which inputs need looping, and the music fades
+
+    The output is requested_duration long, or as long as the video when no
+    duration is requested. A shorter video is looped, and so is a shorter
+    music track unless loop_audio is off. Fades are clamped to the output
+    length. Returns None when the length can't be known (no ffprobe), in
+    which case commands fall back to -shortest without fades.
+    """
+    target = requested_duration or video_duration
+    if not target:
+        return None
+    return {
+        "duration": target,
+        "loop_video": bool(video_duration) and target > video_duration + DURATION_TOLERANCE,
+        "loop_audio": bool(loop_audio and audio_duration) and target > audio_duration + DURATION_TOLERANCE,
+        "fade_in": min(fade_in, target),
+        "fade_out": min(fade_out, target)
+    }
+
+def music_filter(volume, timing):
+    """Filter chain applied to the music track - volume, then any fades
+
+    qsin fades match the block engine's (audiomix), so both engines produce
+    the same mix.
+    """
+    chain = [f"volume={volume}"]
+    if timing and timing.get("fade_in"):
+        chain.append(f"afade=t=in:curve=qsin:d={timing['fade_in']:.3f}")
+    if timing and timing.get("fade_out"):
+        start = timing["duration"] - timing["fade_out"]
+        chain.append(f"afade=t=out:curve=qsin:st={start:.3f}:d={timing['fade_out']:.3f}")
+    return ",".join(chain)
+
+def partial_output_path(path, job_id):
+    """Where a job writes an output until it's finished - same directory and extension, unique per job
+
+    Jobs with the same output filename can run at once. Each publishes its
+    finished files with os.replace(), so neither sees the other's partial ones.
+    """
+    path = Path(path)
+    return path.with_name(f".{job_id}_{path.name}")
+
+def _input_args(path, timing, loop_key):
+    """-i for one input, looped and cut at the target duration so FFmpeg stops reading it in time"""
+    args = []
+    if timing:
+        if timing[loop_key]:
+            args.extend(["-stream_loop", "-1"])
+        args.extend(["-t", f"{timing['duration']:.3f}"])
+    return args + ["-i", path]
+
+def _thread_args(option, threads):
+    """[option, threads] for a thread budget, nothing when FFmpeg picks (threads 0)"""
+    return [option, str(threads)] if threads else []
+
+def build_merge_command(video_path, audio_path, output_path, volume=0.7, gpu_acceleration=False,
+                        use_nvenc=False, gpu_available=False, timing=None, encoder=None, piped_audio=None,
+                        threads=0):
+    """Command for the standard single-output merge
+
+    encoder is a costmodel.choose_video_encoder() result; without one the
+    video is NVENC-encoded when enabled and available, stream-copied otherwise.
+    piped_audio ({"format", "sample_rate", "channels"}) reads an already
+    mixed raw PCM track from stdin instead of audio_path. threads is the
+    process's budget from the CPU allocator (cpus.py), 0 for every core.
+    """
+    if encoder is None:
+        nvenc = use_nvenc and gpu_available
+        encoder = {"codec": "h264_nvenc", "preset": DEFAULT_PRESETS["h264_nvenc"], "bitrate": "5M"} if nvenc \
+            else {"codec": "copy"}
+
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y"]
+    
+    # Add performance optimizations - decoder and filter threads within the budget
+    cmd.extend(["-threads", str(threads)])
+    cmd.extend(_thread_args("-filter_threads", threads))
+    
+    # Add GPU acceleration if available and requested
+    if gpu_acceleration and gpu_available:
+        log.info("🚀 Using GPU acceleration for FFmpeg")
+        cmd.extend(["-hwaccel", "cuda"])
+        if encoder["codec"] == "h264_nvenc":
+            # Decoded frames go straight to NVENC without leaving the GPU
+            cmd.extend(["-hwaccel_output_format", "cuda"])
+        # GPU-specific optimizations
+        cmd.extend(["-gpu", "0"])  # Use first GPU
+    
+    # Add inputs - each is cut at the target length instead of relying on -shortest
+    cmd.extend(_input_args(video_path, timing, "loop_video"))
+    if piped_audio:
+        # Gain and fades are already applied, and the stream ends at the output length
+        cmd.extend(["-f", piped_audio["format"], "-ar", str(piped_audio["sample_rate"]),
+                    "-ac", str(piped_audio["channels"]), "-i", "pipe:0"])
+    else:
+        cmd.extend(_input_args(audio_path, timing, "loop_audio"))
+    
+    # Add mapping
+    cmd.extend(["-map", "0:v:0", "-map", "1:a:0"])
+    
+    # Add volume filter
+    if not piped_audio:
+        cmd.extend(["-filter:a", music_filter(volume, timing)])
+    
+    # Video encoding options - optimized for maximum speed
+    if encoder["codec"] == "copy":
+        cmd.extend(["-c:v", "copy"])  # Stream copy (fastest)
+    else:
+        log.info("🎯 Encoding video with %s preset %s", encoder["codec"], encoder["preset"])
+        cmd.extend(video_encoder_args(encoder["codec"], encoder["bitrate"], encoder["preset"]))
+        cmd.extend(_thread_args("-threads", threads))
+    
+    # Audio encoding - optimized for speed
+    cmd.extend(AUDIO_ENCODER_ARGS)
+    
+    # Other options
+    if not timing:
+        cmd.append("-shortest")
+    cmd.append(output_path)
+    return cmd
+
+def _rendition_video_codec(rendition, use_nvenc, gpu_available):
+    """Concrete encoder for a re-encoded rendition"""
+    codec = rendition["codec"]
+    if codec in ("auto", "h264_nvenc") and use_nvenc and gpu_available:
+        return "h264_nvenc"
+    if codec == "h264_nvenc":
+        log.warning("NVENC unavailable for rendition '%s', using libx264", rendition["name"])
+    return "libx264"
+
+def build_rendition_command(video_path, audio_path, output_dir, renditions, volume=0.7,
+                            gpu_acceleration=False, use_nvenc=False, gpu_available=False, timing=None, threads=0):
+    """One FFmpeg command producing every rendition from a single decode of each input
+
+    The volume-adjusted audio is asplit once per rendition that carries
+    audio; decoded video is split once per rendition that needs frames
+    (re-encodes and thumbnails). Stream-copied renditions map the input
+    directly, so if nothing needs frames the video is never decoded.
+    A thread budget is shared by the re-encoded renditions' encoders,
+    which all run at once. A thumbnail time past the end of a known-length
+    output is pulled back to just before the end, as select would otherwise
+    never pass a frame.
+    """
+    audio_renditions = [r for r in renditions if r["type"] in ("video", "audio")]
+    decoded_renditions = [r for r in renditions
+                          if r["type"] == "thumbnail" or (r["type"] == "video" and r["codec"] != "copy")]
+    encoded_count = sum(r["type"] == "video" and r["codec"] != "copy" for r in renditions)
+    encoder_threads = max(1, threads // encoded_count) if threads and encoded_count else 0
+
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y", "-threads", str(threads)]
+    cmd.extend(_thread_args("-filter_complex_threads", threads))
+    if decoded_renditions and gpu_acceleration and gpu_available:
+        # Frames stay in system memory so split/scale/select run as software filters
+        cmd.extend(["-hwaccel", "cuda"])
+    cmd.extend(_input_args(video_path, timing, "loop_video"))
+    cmd.extend(_input_args(audio_path, timing, "loop_audio"))
+
+    filters = []
+    audio_labels = [f"[a{i}]" for i in range(len(audio_renditions))]
+    if audio_labels:
+        split = f",asplit={len(audio_labels)}" if len(audio_labels) > 1 else ""
+        filters.append(f"[1:a:0]{music_filter(volume, timing)}{split}{''.join(audio_labels)}")
+
+    video_labels = [f"[v{i}]" for i in range(len(decoded_renditions))]
+    if video_labels:
+        split = f"split={len(video_labels)}" if len(video_labels) > 1 else "null"
+        filters.append(f"[0:v:0]{split}{''.join(video_labels)}")
+
+    outputs = []
+    for rendition in renditions:
+        output_path = str(Path(output_dir) / rendition["filename"])
+        args = []
+
+        if rendition["type"] in ("video", "thumbnail") and rendition in decoded_renditions:
+            source = video_labels[decoded_renditions.index(rendition)]
+            chain = []
+            if rendition["type"] == "thumbnail":
+                at_seconds = rendition["time"]
+                if timing:
+                    at_seconds = min(at_seconds, max(0.0, timing["duration"] - THUMBNAIL_END_MARGIN))
+                chain.append(f"select='gte(t,{at_seconds})'")
+            if rendition["height"]:
+                chain.append(f"scale=-2:{rendition['height']}")
+            if chain:
+                label = f"[{source[1:-1]}o]"
+                filters.append(f"{source}{','.join(chain)}{label}")
+                source = label
+            args.extend(["-map", source])
+        elif rendition["type"] == "video":
+            args.extend(["-map", "0:v:0"])
+
+        if rendition["type"] in ("video", "audio"):
+            args.extend(["-map", audio_labels[audio_renditions.index(rendition)]])
+
+        if rendition["type"] == "video":
+            if rendition["codec"] == "copy":
+                args.extend(["-c:v", "copy"])
+            else:
+                codec = _rendition_video_codec(rendition, use_nvenc, gpu_available)
+                args.extend(video_encoder_args(codec, rendition["bitrate"], rendition["preset"]))
+                args.extend(_thread_args("-threads", encoder_threads))
+            args.extend(AUDIO_ENCODER_ARGS)
+            if not timing:
+                args.append("-shortest")
+        elif rendition["type"] == "audio":
+            args.extend(["-vn"] + AUDIO_ENCODER_ARGS)
+        else:
+            args.extend(["-frames:v", "1", "-q:v", "2"])
+
+        outputs.extend(args + [output_path])
+
+    if filters:
+        cmd.extend(["-filter_complex", ";".join(filters)])
+    return cmd + outputs
+
+def build_thumbnail_command(video_path, thumbnail_path, at_seconds, height=720):
+    """One frame at at_seconds, decoding keyframes only (ffmpeg.thumbnail_seek picks the time)"""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y",
+           "-skip_frame", "nokey", "-ss", f"{at_seconds:.3f}", "-i", video_path,
+           "-map", "0:v:0", "-frames:v", "1", "-fps_mode", "vfr"]
+    if height:
+        cmd.extend(["-vf", f"scale=-2:{height}"])
+    return cmd + ["-q:v", "2", thumbnail_path]
+
+def preview_start(start, length, duration=None):
+    """Start of a preview, moved back so the clip ends within a known duration"""
+    return max(0, min(start, duration - length)) if duration else start
+
+def build_preview_command(source_path, preview_path, start, length=10, height=360):
+    """Short low-bitrate clip of the finished output, decoding only that stretch of it (see preview_start)"""
+    return ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y",
+            "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", source_path,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:{height}",
+            "-c:v", "libx264", "-preset", "veryfast", "-b:v", "600k", "-maxrate", "600k",
+            "-bufsize", "1200k", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "96k", "-ac", "2",
+            "-movflags", "+faststart", preview_path]
+
+# ffprobe profile names -> -profile:v values for re-encoding to an H.264 reference
+H264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high",
+                 "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"}
+# Encoder for each audio codec a reference track may use
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+
+def _h264_level(level):
+    """ffprobe's level_idc ("31") -> -level value ("3.1"), None when unknown (-99) or 1b"""
+    number = int(level) if level and level.lstrip("-").isdigit() else 0
+    return f"{number // 10}.{number % 10}" if number >= 10 else None
+
+def plan_concat(probes, keep_audio=True):
+    """Pick the stream properties clips are joined with and which clips must be conformed
+
+    probes are probe.probe_clip() results in clip order. The reference is
+    the video (and, with keep_audio, audio) signature covering the most
+    running time, so the fewest seconds get re-encoded. Returns
+    {"reference", "conform": [clip indexes], "duration"}.
+    """
+    def weight(index):
+        return probes[index]["duration"] or 0
+
+    def most_common(key):
+        totals = {}
+        for index, clip in enumerate(probes):
+            signature = repr(clip[key])
+            totals[signature] = totals.get(signature, 0) + weight(index)
+        best = max(totals, key=totals.get)
+        return next(clip[key] for clip in probes if repr(clip[key]) == best)
+
+    reference = {"video": most_common("video"), "audio": most_common("audio") if keep_audio else None}
+    conform = [index for index, clip in enumerate(probes)
+               if clip["video"] != reference["video"] or (keep_audio and clip["audio"] != reference["audio"])]
+    durations = [clip["duration"] for clip in probes]
+    return {
+        "reference": reference,
+        "conform": conform,
+        "duration": sum(durations) if None not in durations else None
+    }
+
+def clip_bitrate(probes, reference):
+    """Bitrate for re-encoded clips - the average of the clips they must blend in with"""
+    rates = [clip["bit_rate"] for clip in probes if clip["video"] == reference["video"] and clip["bit_rate"]]
+    return f"{sum(rates) // len(rates) // 1000}k" if rates else "5M"
+
+def build_conform_command(clip_path, output_path, clip, reference, video_codec="libx264", bitrate="5M",
+                          threads=0):
+    """Re-encode only the streams of one clip that differ from the concat reference
+
+    A matching video stream is copied even when the audio needs work, and a
+    clip without audio gets silence when the reference has audio. threads
+    is the CPU allocator's budget, as for merges.
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y"]
+    cmd.extend(_thread_args("-filter_threads", threads))
+    cmd.extend(_thread_args("-threads", threads) + ["-i", clip_path])
+    ref_video, ref_audio = reference["video"], reference["audio"]
+    silent = ref_audio and not clip["audio"]
+    if silent:
+        cmd.extend(["-f", "lavfi", "-i", f"anullsrc=r={ref_audio['sample_rate']}:cl=stereo"])
+    cmd.extend(["-map", "0:v:0"])
+    if ref_audio:
+        cmd.extend(["-map", "1:a:0" if silent else "0:a:0"])
+
+    if clip["video"] == ref_video:
+        cmd.extend(["-c:v", "copy"])
+    else:
+        if ref_video["codec_name"] != "h264":
+            raise ValueError(f"Can't re-encode clips to match {ref_video['codec_name']} - only H.264 is supported")
+        width, height = ref_video["width"], ref_video["height"]
+        sar = (ref_video["sample_aspect_ratio"] or "1:1").replace(":", "/")
+        if sar.startswith("0/"):
+            sar = "1"
+        chain = [f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                 f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", f"setsar={sar}", f"fps={ref_video['r_frame_rate']}"]
+        cmd.extend(["-vf", ",".join(chain)])
+        cmd.extend(video_encoder_args(video_codec, bitrate))
+        cmd.extend(_thread_args("-threads", threads))
+        cmd.extend(["-pix_fmt", ref_video["pix_fmt"]])
+        if ref_video["profile"] in H264_PROFILES:
+            cmd.extend(["-profile:v", H264_PROFILES[ref_video["profile"]]])
+        if _h264_level(ref_video["level"]):
+            cmd.extend(["-level", _h264_level(ref_video["level"])])
+        # Same timescale as the other clips, so stream-copied timestamps line up
+        cmd.extend(["-video_track_timescale", ref_video["time_base"].partition("/")[2]])
+
+    if not ref_audio:
+        cmd.append("-an")
+    elif clip["audio"] == ref_audio:
+        cmd.extend(["-c:a", "copy"])
+    else:
+        encoder = AUDIO_ENCODERS.get(ref_audio["codec_name"])
+        if not encoder:
+            raise ValueError(f"Can't re-encode clip audio to {ref_audio['codec_name']}")
+        cmd.extend(["-c:a", encoder, "-ar", ref_audio["sample_rate"], "-ac", ref_audio["channels"]])
+        if silent:
+            cmd.append("-shortest")
+    return cmd + [output_path]
+
+def concat_list(paths):
+    """Concat demuxer script joining paths in order"""
+    lines = ["ffconcat version 1.0"]
+    for path in paths:
+        escaped = str(path).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+    return "\n".join(lines) + "\n"
+
+def build_concat_command(list_path, output_path, audio_path=None, volume=0.7, timing=None):
+    """Join the clips of a concat script by stream copy, optionally with music in the same pass
+
+    The music replaces the clips' own audio; without music the clips' audio
+    is copied along with the video.
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y", "-f", "concat", "-safe", "0"]
+    if timing:
+        cmd.extend(["-t", f"{timing['duration']:.3f}"])
+    cmd.extend(["-i", list_path])
+    if audio_path:
+        cmd.extend(_input_args(audio_path, timing, "loop_audio"))
+        cmd.extend(["-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-filter:a", music_filter(volume, timing)])
+        cmd.extend(AUDIO_ENCODER_ARGS)
+        if not timing:
+            cmd.append("-shortest")
+    else:
+        cmd.extend(["-map", "0:v:0", "-map", "0:a:0?", "-c", "copy"])
+    return cmd + [output_path]
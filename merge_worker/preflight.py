@@ -0,0 +1,227 @@
+"""
+Input preflight - reject bad inputs before anything is downloaded
+
+Every input gets a HEAD request in parallel (or a one-byte ranged GET when
+HEAD isn't allowed, as with presigned S3 URLs). Each is checked for status,
+Content-Type, Content-Length and range support. A 403, a 404, an HTML error
+page or a size mismatch becomes an error response within about a second,
+instead of surfacing three retries later. Statuses the download retries
+(5xx, 408, 425, 429) are left to it. The sizes found feed the scheduler's
+cost estimate, download striping and the disk space check.
+"""
+
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .costmodel import bitrate_to_bits
+from .download import RETRYABLE_CLIENT_ERRORS, resolve_local_path
+from .logs import get_logger, kv
+from .planner import AUDIO_BITRATE
+
+log = get_logger(__name__)
+
+PREFLIGHT_TIMEOUT = (3, 5)  # connect, read seconds
+PREFLIGHT_WORKERS = 16  # Concat jobs can have hundreds of clips
+# Free space kept on the scratch disk on top of inputs and outputs
+DISK_HEADROOM = int(float(os.environ.get("DISK_HEADROOM_GB", 1)) * 1024 ** 3)
+# Sizing renditions when no duration is known - same guess as the scheduler's estimate
+ASSUMED_VIDEO_BITS_PER_SECOND = 5_000_000
+THUMBNAIL_BYTES = 1024 ** 2  # Allowance for one JPEG
+# Content types that are never media - typically an error or login page
+REJECTED_CONTENT_TYPES = ("text/", "application/json", "application/xml", "application/xhtml", "image/")
+
+class PreflightError(ValueError):
+    """An input that can't be used - the job fails without downloading anything"""
+
+# Scratch bytes held by admitted jobs until they finish
+_reserved = 0
+_reserved_lock = threading.Lock()
+
+def _content_type_problem(content_type, kind):
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type.startswith(REJECTED_CONTENT_TYPES):
+        return f"server returned {content_type}, not media"
+    if kind != "audio" and content_type.startswith("audio/"):
+        return f"video input is {content_type}"
+    return None
+
+def _ranged_get(url):
+    """One-byte GET - works where HEAD is refused and proves range support"""
+    import requests
+
+    with requests.get(url, headers={"Range": "bytes=0-0"}, stream=True, allow_redirects=True,
+                      timeout=PREFLIGHT_TIMEOUT) as response:
+        if response.status_code == 206:
+            total = response.headers.get("content-range", "").rpartition("/")[2]
+            size = int(total) if total.isdigit() else None
+            return response.status_code, response.headers, size, True
+        length = response.headers.get("content-length")
+        return response.status_code, response.headers, int(length) if length else None, False
+
+def check_input(url, expected=None, kind="video"):
+    """Validate one input without downloading it
+
+    Returns {"url", "size", "content_type", "ranges", "local", "ttfb"} and
+    raises PreflightError for inputs that can't work. Server errors and
+    timeouts aren't conclusive, so they are left to the downloader's retries.
+    """
+    expected = expected or {}
+    if not url:
+        raise PreflightError(f"{kind} input is missing")
+
+    try:
+        local_path = resolve_local_path(url)
+    except (ValueError, FileNotFoundError) as e:
+        raise PreflightError(str(e))
+    if local_path:
+        size = os.path.getsize(local_path)
+        if size == 0:
+            raise PreflightError(f"{kind} input {url} is empty")
+        return {"url": url, "size": size, "content_type": None, "ranges": True, "local": True, "ttfb": 0.0}
+
+    import requests
+
+    start = time.monotonic()
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=PREFLIGHT_TIMEOUT)
+        status, headers = response.status_code, response.headers
+        length = headers.get("content-length")
+        size = int(length) if length and "content-encoding" not in headers else None
+        ranges = headers.get("accept-ranges", "").lower() == "bytes"
+        if status >= 400 or size is None:
+            # HEAD refused (presigned URLs, some CDNs) or unsized - GET is authoritative
+            status, headers, size, ranges = _ranged_get(url)
+    except (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+            requests.exceptions.InvalidSchema) as e:
+        raise PreflightError(f"{kind} URL is invalid: {e}")
+    except requests.exceptions.ConnectionError as e:
+        raise PreflightError(f"{kind} URL is unreachable: {e}")
+    except requests.exceptions.Timeout:
+        log.warning("Preflight timed out for %s - leaving it to the download", url)
+        return {"url": url, "size": expected.get("size"), "content_type": None, "ranges": False,
+                "local": False, "ttfb": None}
+    ttfb = time.monotonic() - start
+
+    if 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS:
+        raise PreflightError(f"{kind} URL returned HTTP {status}")
+    if status >= 400:
+        # Server errors, rate limits and timeouts are retried by the download
+        log.warning("Preflight got HTTP %d for %s - leaving it to the download", status, url)
+        return {"url": url, "size": expected.get("size"), "content_type": None, "ranges": False,
+                "local": False, "ttfb": None}
+
+    content_type = headers.get("content-type", "")
+    problem = _content_type_problem(content_type, kind)
+    if problem:
+        raise PreflightError(f"{kind} URL unusable: {problem}")
+    if size == 0:
+        raise PreflightError(f"{kind} URL is empty (Content-Length 0)")
+    if size and expected.get("size") and size != int(expected["size"]):
+        raise PreflightError(f"{kind} URL is {size} bytes, expected {expected['size']}")
+
+    return {"url": url, "size": size, "content_type": content_type or None, "ranges": ranges,
+            "local": False, "ttfb": ttfb}
+
+def job_inputs(params):
+    """(name, url, expected) for every input of a parsed job
+
+    Merges have "video" and "audio"; concat jobs have "clip1".."clipN" and
+    "audio" when music is requested.
+    """
+    if params.get("job_type") == "concat":
+        inputs = [(f"clip{index + 1}", clip["url"], clip["expected"]) for index, clip in enumerate(params["clips"])]
+        if params.get("audio_url"):
+            inputs.append(("audio", params["audio_url"], params.get("audio_expected")))
+        return inputs
+    return [(name, params.get(f"{name}_url"), params.get(f"{name}_expected")) for name in ("video", "audio")]
+
+def preflight_job(params):
+    """Check every input of a parsed job concurrently - {name: info} as named by job_inputs()
+
+    Raises PreflightError naming every input that failed.
+    """
+    start = time.monotonic()
+    inputs = job_inputs(params)
+    with ThreadPoolExecutor(max_workers=min(len(inputs), PREFLIGHT_WORKERS)) as pool:
+        futures = {name: pool.submit(check_input, url, expected, name) for name, url, expected in inputs}
+
+    results, errors = {}, []
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except PreflightError as e:
+            errors.append(str(e))
+    if errors:
+        raise PreflightError("; ".join(errors))
+
+    log.info("✈️  Preflight passed in %.2fs", time.monotonic() - start,
+             extra=kv(inputs=len(results), total_mb=sum(info["size"] or 0 for info in results.values()) >> 20))
+    return results
+
+def output_space(params, preflight, duration=None):
+    """Bytes a merge's outputs will take
+
+    A single output is about the size of the inputs. Renditions are sized by
+    type: a stream copy as the video plus the AAC track, a re-encode from its
+    bitrate, an audio rendition from the AAC bitrate and a thumbnail from a
+    fixed allowance. Without a known duration, it is guessed from the video's
+    size.
+    """
+    inputs = sum(info["size"] or 0 for info in preflight.values())
+    renditions = params.get("renditions")
+    if not renditions:
+        return inputs
+    video_size = preflight["video"]["size"] or 0
+    duration = duration or params.get("duration") or video_size * 8 / ASSUMED_VIDEO_BITS_PER_SECOND
+    audio_bytes = bitrate_to_bits(AUDIO_BITRATE) * duration / 8
+    total = 0
+    for rendition in renditions:
+        if rendition["type"] == "thumbnail":
+            total += THUMBNAIL_BYTES
+        elif rendition["type"] == "audio":
+            total += audio_bytes
+        elif rendition["codec"] == "copy":
+            total += video_size + audio_bytes
+        else:
+            total += bitrate_to_bits(rendition["bitrate"]) * duration / 8 + audio_bytes
+    return int(total)
+
+def required_disk_space(preflight, output_bytes=None):
+    """Scratch bytes a job needs - downloaded inputs plus its outputs (default: about the inputs' size)"""
+    downloads = sum(info["size"] or 0 for info in preflight.values() if not info["local"])
+    if output_bytes is None:
+        output_bytes = sum(info["size"] or 0 for info in preflight.values())
+    return downloads + output_bytes
+
+def available_disk_space(directory):
+    """Free bytes a new job may use - free space less the headroom and what admitted jobs hold"""
+    with _reserved_lock:
+        return shutil.disk_usage(directory).free - DISK_HEADROOM - _reserved
+
+def reserve_disk_space(directory, needed):
+    """Admit a job needing needed scratch bytes; returns the reservation for release_disk_space()
+
+    Jobs running at once can each pass a plain free-space check and then
+    fill the disk between them, so every admitted job holds its bytes until
+    it finishes. Space it has already written counts twice meanwhile, which
+    errs on the side of refusing a job. Raises PreflightError when the job
+    doesn't fit.
+    """
+    global _reserved
+    with _reserved_lock:
+        available = shutil.disk_usage(directory).free - DISK_HEADROOM - _reserved
+        if available < needed:
+            raise PreflightError(f"Not enough scratch space: job needs {needed / 1024 ** 3:.1f} GB, "
+                                 f"{max(available, 0) / 1024 ** 3:.1f} GB available in {directory} "
+                                 f"({_reserved / 1024 ** 3:.1f} GB held by running jobs)")
+        _reserved += needed
+    return needed
+
+def release_disk_space(reservation):
+    """Give back a reserve_disk_space() reservation once the job is done"""
+    global _reserved
+    with _reserved_lock:
+        _reserved -= reservation
@@ -0,0 +1,157 @@
+"""
+Fast media sanity checks run before launching the mux
+"""
+
+import os
+import subprocess
+
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+def check_iso_bmff_structure(path):
+    """Walk top-level MP4 boxes - catches truncation and a missing moov in milliseconds
+
+    Returns False if the file isn't an ISO BMFF container, True if it looks
+    complete, and raises ValueError if it is truncated or has no moov box.
+    """
+    import struct
+
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[4:8] != b"ftyp":
+            return False
+
+        offset = 0
+        boxes = set()
+        while offset < file_size:
+            f.seek(offset)
+            box_header = f.read(16)
+            if len(box_header) < 8:
+                raise ValueError(f"Truncated box header at offset {offset} in {path}")
+
+            box_size, box_type = struct.unpack(">I4s", box_header[:8])
+            if box_size == 1:
+                if len(box_header) < 16:
+                    raise ValueError(f"Truncated box header at offset {offset} in {path}")
+                box_size = struct.unpack(">Q", box_header[8:16])[0]
+            elif box_size == 0:
+                box_size = file_size - offset  # Box runs to end of file
+
+            if box_size < 8:
+                raise ValueError(f"Corrupt box size {box_size} at offset {offset} in {path}")
+            if offset + box_size > file_size:
+                raise ValueError(f"Truncated file: '{box_type.decode('latin-1')}' box needs "
+                                 f"{offset + box_size} bytes but file has {file_size} ({path})")
+
+            boxes.add(box_type)
+            offset += box_size
+
+    if b"moov" not in boxes:
+        raise ValueError(f"No moov box in {path} - file is incomplete or not a finished MP4")
+    return True
+
+def probe_duration(path, timeout=30):
+    """Read the container duration with ffprobe, None if ffprobe isn't available"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", path],
+            capture_output=True, text=True, timeout=timeout
+        )
+    except FileNotFoundError:
+        log.warning("ffprobe not found - skipping duration check")
+        return None
+
+    if result.returncode != 0:
+        raise ValueError(f"ffprobe could not read {path}: {result.stderr.strip()}")
+    try:
+        duration = float(result.stdout.strip())
+    except ValueError:
+        raise ValueError(f"No readable duration in {path}")
+    if duration <= 0:
+        raise ValueError(f"Invalid duration {duration} in {path}")
+    return duration
+
+def probe_video_stream(path, timeout=30):
+    """Height, width, codec and bitrate of the first video stream, None if it can't be read"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "stream=codec_name,width,height,bit_rate:format=bit_rate",
+             "-of", "default=noprint_wrappers=1", path],
+            capture_output=True, text=True, timeout=timeout
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+
+    fields = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("=")
+        # Stream bit_rate comes first; MP4s often only have the container's
+        if value and value != "N/A" and key not in fields:
+            fields[key] = value
+    if "height" not in fields:
+        return None
+    return {
+        "codec": fields.get("codec_name"),
+        "width": int(fields["width"]) if "width" in fields else None,
+        "height": int(fields["height"]),
+        "bit_rate": int(fields["bit_rate"]) if "bit_rate" in fields else None
+    }
+
+def check_media_file(path, name):
+    """Fast sanity check before launching the mux - returns the probed duration"""
+    if check_iso_bmff_structure(path):
+        log.debug("%s: MP4 structure complete (moov present)", name)
+    duration = probe_duration(path)
+    if duration is not None:
+        log.info("✅ %s checked", name, extra=kv(duration=round(duration, 1)))
+    return duration
+
+# Stream properties that must match for the concat demuxer to join clips without re-encoding
+CONCAT_VIDEO_KEYS = ("codec_name", "profile", "level", "width", "height", "pix_fmt", "sample_aspect_ratio",
+                     "r_frame_rate", "time_base")
+CONCAT_AUDIO_KEYS = ("codec_name", "profile", "sample_rate", "channels")
+
+def probe_clip(path, timeout=30):
+    """Duration and concat-relevant properties of a clip's first video and audio streams
+
+    Returns {"duration", "video", "audio", "bit_rate"}, where video/audio hold
+    the CONCAT_*_KEYS values (audio is None for silent clips). Raises
+    ValueError if the clip can't be read and FileNotFoundError without ffprobe.
+    """
+    import json
+
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries",
+         f"stream=codec_type,bit_rate,{','.join(sorted(set(CONCAT_VIDEO_KEYS + CONCAT_AUDIO_KEYS)))}"
+         ":format=duration,bit_rate", "-of", "json", path],
+        capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise ValueError(f"ffprobe could not read {path}: {result.stderr.strip()}")
+    info = json.loads(result.stdout)
+
+    streams = {}
+    for stream in info.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind in ("video", "audio") and kind not in streams:
+            keys = CONCAT_VIDEO_KEYS if kind == "video" else CONCAT_AUDIO_KEYS
+            streams[kind] = {key: str(stream[key]) if key in stream else None for key in keys}
+            if kind == "video":
+                streams["bit_rate"] = stream.get("bit_rate")
+    if "video" not in streams:
+        raise ValueError(f"No video stream in {path}")
+
+    duration = info.get("format", {}).get("duration")
+    bit_rate = streams.get("bit_rate") or info.get("format", {}).get("bit_rate")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "video": streams["video"],
+        "audio": streams.get("audio"),
+        "bit_rate": int(bit_rate) if bit_rate not in (None, "N/A") else None
+    }
@@ -0,0 +1,249 @@
+"""
+Local job scheduler - short jobs don't queue behind long merges
+
+Each job gets a cost estimate before it starts: input sizes (from the
+preflight's HEAD requests, stat for volume files), output duration, and
+whether any video is re-encoded, timed with the cost model's encode speeds.
+Cheap jobs run on the fast lane and everything else on the slow lane, and
+each lane has its own concurrency limit. A 10-second preview can therefore
+start while a 3-hour merge keeps the encoder busy.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+FAST_LANE_MAX_SECONDS = float(os.environ.get("SCHEDULER_FAST_LANE_MAX_SECONDS", 60))
+FAST_LANE_SLOTS = int(os.environ.get("SCHEDULER_FAST_SLOTS", 2))
+SLOW_LANE_SLOTS = int(os.environ.get("SCHEDULER_SLOW_SLOTS", 1))
+# Jobs accepted beyond the running slots, so RunPod keeps sending work while a lane is busy
+SCHEDULER_MAX_QUEUED = int(os.environ.get("SCHEDULER_MAX_QUEUED", 2))
+
+# Rough throughput figures behind the cost estimate
+DOWNLOAD_BYTES_PER_SECOND = float(os.environ.get("SCHEDULER_DOWNLOAD_MB_S", 100)) * 1024 ** 2
+COPY_BYTES_PER_SECOND = 400 * 1024 ** 2  # stream-copy mux, disk bound
+ASSUMED_VIDEO_BITS_PER_SECOND = 5_000_000  # guesses the duration from the size when none is requested
+UNKNOWN_JOB_SECONDS = 600  # jobs whose inputs couldn't be sized
+
+def _input_sizes(params):
+    """{input name: (size, is a volume file)} for every input, size None if unknown
+
+    Uses the job's preflight results or declared sizes when it has them,
+    otherwise checks each input here without failing - a bad input just
+    can't be sized.
+    """
+    from .preflight import PreflightError, check_input, job_inputs
+
+    preflight = params.get("preflight") or {}
+    sizes = {}
+    for name, url, expected in job_inputs(params):
+        expected = expected or {}
+        info = preflight.get(name)
+        if info is None and expected.get("size"):
+            info = {"size": expected["size"], "local": False}
+        if info is None:
+            try:
+                info = check_input(url, expected, name)
+            except PreflightError as e:
+                log.warning("Could not size %s input: %s", name, e)
+                info = {"size": None, "local": False}
+        sizes[name] = (info["size"], info["local"])
+    return sizes
+
+def estimate_job_cost(params, source=None):
+    """Estimated run time of a parsed job in seconds and the lane it belongs in
+
+    source is the video stream ({"height", "bit_rate", ...}) when it's known
+    without downloading, e.g. from the keyframe index.
+    """
+    sizes = _input_sizes(params)
+    known = all(size is not None for size, _ in sizes.values())
+    input_bytes = sum(size or 0 for size, _ in sizes.values())
+    # Every input but the music is video - a concat job's clips add up
+    video_sizes = [size for name, (size, _) in sizes.items() if name != "audio"]
+    video_size = sum(video_sizes) if None not in video_sizes else None
+
+    duration = params.get("duration")
+    if not duration and video_size:
+        duration = video_size * 8 / ASSUMED_VIDEO_BITS_PER_SECOND
+
+    # Encode speeds come from the cost model, learned from earlier jobs
+    from .costmodel import choose_video_encoder, predict_rendition_seconds
+    from .ffmpeg import check_gpu_availability
+
+    gpu_available = check_gpu_availability()
+    if params.get("renditions"):
+        encoder = "renditions"
+        encode_seconds = predict_rendition_seconds(params["renditions"], params.get("use_nvenc"), gpu_available,
+                                                   source and source["height"], duration)
+    else:
+        choice = choose_video_encoder(params, source, gpu_available, duration)
+        encoder = choice["codec"]
+        encode_seconds = choice["predicted_seconds"] if encoder != "copy" else None
+
+    seconds = download_seconds = ffmpeg_seconds = None
+    if known:
+        # Volume inputs are linked, not downloaded
+        download_seconds = sum(size for size, local in sizes.values() if not local) / DOWNLOAD_BYTES_PER_SECOND
+        ffmpeg_seconds = encode_seconds if encode_seconds is not None else input_bytes / COPY_BYTES_PER_SECOND
+        seconds = download_seconds + ffmpeg_seconds
+
+    return {
+        "seconds": round(seconds, 1) if seconds is not None else None,
+        "lane": "fast" if seconds is not None and seconds <= FAST_LANE_MAX_SECONDS else "slow",
+        "input_bytes": input_bytes,
+        "duration": round(duration, 1) if duration else None,
+        "encoder": encoder,
+        "download_seconds": round(download_seconds, 1) if download_seconds is not None else None,
+        "ffmpeg_seconds": round(ffmpeg_seconds, 1) if ffmpeg_seconds is not None else None
+    }
+
+class JobScheduler:
+    """Two lanes of jobs with separate concurrency limits and wait estimates"""
+
+    def __init__(self, fast_slots=FAST_LANE_SLOTS, slow_slots=SLOW_LANE_SLOTS, max_queued=SCHEDULER_MAX_QUEUED):
+        self.lanes = {
+            "fast": {"slots": fast_slots, "queued": [], "running": []},
+            "slow": {"slots": slow_slots, "queued": [], "running": []}
+        }
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _job_seconds(self, lane, ticket):
+        if ticket["cost"]["seconds"] is not None:
+            return ticket["cost"]["seconds"]
+        return FAST_LANE_MAX_SECONDS if lane == "fast" else UNKNOWN_JOB_SECONDS
+
+    def estimated_wait(self, lane):
+        """Seconds a job submitted now would queue before a slot frees up"""
+        with self._lock:
+            state = self.lanes[lane]
+            now = time.monotonic()
+            # Each slot is free at the time its running job is expected to finish
+            free_at = [max(self._job_seconds(lane, t) - (now - t["started"]), 0) for t in state["running"]]
+            free_at += [0.0] * (state["slots"] - len(free_at))
+            heapq.heapify(free_at)
+            for ticket in state["queued"]:
+                heapq.heappush(free_at, heapq.heappop(free_at) + self._job_seconds(lane, ticket))
+            return round(free_at[0], 1)
+
+    def status(self):
+        """Queue depth, running jobs and wait estimate per lane"""
+        status = {}
+        for lane, state in self.lanes.items():
+            wait = self.estimated_wait(lane)
+            with self._lock:
+                status[lane] = {
+                    "slots": state["slots"],
+                    "running": len(state["running"]),
+                    "queued": len(state["queued"]),
+                    "estimated_wait_s": wait
+                }
+        return status
+
+    def concurrency_modifier(self, current_concurrency):
+        """RunPod concurrency: every slot plus a small queue, so a cheap job can land while the slow lane is full"""
+        return sum(state["slots"] for state in self.lanes.values()) + self.max_queued
+
+    def _semaphore(self, lane):
+        # Created on first use so they belong to RunPod's running event loop
+        if lane not in self._semaphores:
+            self._semaphores[lane] = asyncio.Semaphore(self.lanes[lane]["slots"])
+        return self._semaphores[lane]
+
+    async def run(self, params, job):
+        """Classify the job, wait for a slot in its lane and run job() in a worker thread"""
+        if params:
+            cost = await asyncio.to_thread(estimate_job_cost, params)
+        else:
+            # Unparseable jobs fail straight away
+            cost = {"seconds": 0.0, "lane": "fast", "input_bytes": 0, "duration": None, "encoder": "copy"}
+        lane = cost["lane"]
+        estimated_wait = self.estimated_wait(lane)
+        ticket = {"cost": cost, "submitted": time.monotonic()}
+        with self._lock:
+            self.lanes[lane]["queued"].append(ticket)
+        log.info("🗂️  Scheduled on %s lane", lane, extra=kv(estimated_s=cost["seconds"], wait_s=estimated_wait))
+
+        async with self._semaphore(lane):
+            with self._lock:
+                self.lanes[lane]["queued"].remove(ticket)
+                ticket["started"] = time.monotonic()
+                self.lanes[lane]["running"].append(ticket)
+            try:
+                result = await asyncio.to_thread(job)
+            finally:
+                with self._lock:
+                    self.lanes[lane]["running"].remove(ticket)
+
+        if isinstance(result, dict):
+            result["scheduler"] = {
+                "lane": lane,
+                "estimated_cost_s": cost["seconds"],
+                "estimated_wait_s": estimated_wait,
+                "queue_wait_s": round(ticket["started"] - ticket["submitted"], 2)
+            }
+        return result
+
+def make_scheduled_handler(config=None, scheduler=None):
+    """Async RunPod handler that runs jobs through a JobScheduler
+
+    {"scheduler_status": true} returns the lane status instead of running a job,
+    and explain jobs (explain.py) are answered without taking a lane slot.
+    Jobs that don't parse or lack an input URL are answered straight away.
+    The rest are preflighted before they are queued, and the results are kept
+    in params for the cost estimate and the downloads. The final result,
+    lane details included, goes to the job's webhook if it has one.
+    """
+    # handler.py loads its feature modules per job; preflight (and download) wait for the first job too
+    from .handler import DEFAULT_CONFIG, handle_job, job_notifier, missing_input_error, parse_job
+
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    scheduler = scheduler or JobScheduler()
+
+    async def finish(event, params, result):
+        notifier = job_notifier(event, params)
+        if notifier:
+            await asyncio.to_thread(notifier.result, result)
+        return result
+
+    async def handler(event):
+        from .preflight import PreflightError, preflight_job
+
+        payload = event.get("input", event)
+        if payload.get("scheduler_status"):
+            return {"scheduler": scheduler.status()}
+        # Bad jobs fail here, before they wait for a lane slot
+        try:
+            params = parse_job(event, config)
+        except Exception as e:
+            log.warning("❌ Invalid job: %s", e)
+            return {"error": f"Processing failed: {e}"}
+        if missing_input_error(params):
+            return await finish(event, params, {"error": missing_input_error(params)})
+        try:
+            params["preflight"] = await asyncio.to_thread(preflight_job, params)
+            if params.get("explain"):
+                # Nothing is downloaded or encoded, so the plan doesn't wait for a slot
+                result = await asyncio.to_thread(handle_job, event, config, params)
+            else:
+                result = await scheduler.run(params, lambda: handle_job(event, config, params))
+        except PreflightError as e:
+            log.warning("❌ Preflight failed: %s", e)
+            result = {"error": f"Preflight failed: {e}"}
+        except Exception as e:
+            # handle_job reports its own failures; these come from preflight or the cost estimate
+            log.error("Scheduling error: %s", e, exc_info=log.isEnabledFor(logging.DEBUG))
+            result = {"error": f"Processing failed: {e}"}
+        return await finish(event, params, result)
+
+    handler.scheduler = scheduler
+    return handler
@@ -0,0 +1,36 @@
+"""
+Cold-start helpers - keep the path to runpod.serverless.start short
+"""
+
+import threading
+import time
+
+from .logs import get_logger
+
+log = get_logger(__name__)
+
+def warm_up():
+    """Import the download stack and probe FFmpeg/GPU while the first job is awaited"""
+    start_time = time.time()
+    try:
+        # Pulls in urllib3/ssl/certifi ahead of the first download
+        import requests  # noqa: F401
+
+        from .ffmpeg import check_gpu_availability, verify_ffmpeg_installation
+
+        log.debug("Verifying FFmpeg installation")
+        if verify_ffmpeg_installation():
+            log.info("🚀 Worker ready - FFmpeg verified!")
+        else:
+            log.warning("FFmpeg verification failed - worker will start anyway "
+                        "(FFmpeg should be available through Docker container)")
+        check_gpu_availability()
+    except Exception as e:
+        log.warning("Warm-up error: %s - starting worker anyway", e)
+    log.info("🔥 Warm-up finished in %.2fs", time.time() - start_time)
+
+def start_warm_up():
+    """Run warm_up() in a daemon thread so the handler registers immediately"""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,137 @@
+"""
+Completion webhooks - push the job result to the caller instead of making it poll
+
+A job with a webhook_url gets its final result POSTed there as JSON. When
+the job asks for it, throttled progress events are POSTed as well. With
+WEBHOOK_SECRET set, each request is signed: X-Merge-Signature is
+"sha256=" + the HMAC-SHA256 of "<X-Merge-Timestamp>.<body>", so receivers
+can check both origin and freshness (verify_signature()). The result is
+retried with exponential backoff on connection errors, 5xx and the
+retryable 4xx statuses. Progress events get one attempt in the background,
+so a slow receiver never holds up the job.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+
+from .download import RETRYABLE_CLIENT_ERRORS
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_ATTEMPTS = int(os.environ.get("WEBHOOK_ATTEMPTS", 5))
+WEBHOOK_BACKOFF = float(os.environ.get("WEBHOOK_BACKOFF_SECONDS", 1))  # doubles after each failure
+WEBHOOK_TIMEOUT = (3, 10)  # connect, read
+# Progress events closer together than this are dropped
+WEBHOOK_PROGRESS_INTERVAL = float(os.environ.get("WEBHOOK_PROGRESS_INTERVAL", 5))
+# Signatures older than this are rejected by verify_signature()
+SIGNATURE_TOLERANCE = 300
+
+def sign(secret, timestamp, body):
+    """X-Merge-Signature value for a body sent at timestamp"""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+def verify_signature(secret, body, timestamp, signature, tolerance=SIGNATURE_TOLERANCE, now=None):
+    """Receiver-side check of a webhook request's X-Merge-Timestamp and X-Merge-Signature headers"""
+    try:
+        age = (time.time() if now is None else now) - int(timestamp)
+    except (TypeError, ValueError):
+        return False
+    if abs(age) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), signature or "")
+
+def _post(url, body, event_type, delivery, secret):
+    """One delivery attempt; returns the HTTP status, raises requests exceptions"""
+    import requests
+
+    timestamp = str(int(time.time()))
+    headers = {"Content-Type": "application/json", "X-Merge-Event": event_type, "X-Merge-Delivery": delivery,
+               "X-Merge-Timestamp": timestamp}
+    if secret:
+        headers["X-Merge-Signature"] = sign(secret, timestamp, body)
+    response = requests.post(url, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT)
+    return response.status_code
+
+def deliver(url, payload, event_type, attempts=None, secret=None):
+    """POST payload as one webhook event, retrying with backoff; True once the receiver accepts it
+
+    Every attempt carries the same X-Merge-Delivery id, so a receiver can
+    drop the duplicates a lost response causes.
+    """
+    import requests
+
+    attempts = attempts or WEBHOOK_ATTEMPTS
+    secret = WEBHOOK_SECRET if secret is None else secret
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    delivery = uuid.uuid4().hex
+    delay = WEBHOOK_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            status = _post(url, body, event_type, delivery, secret)
+        except requests.exceptions.RequestException as e:
+            status, problem = None, str(e)
+        else:
+            if status < 300:
+                log.info("🔔 Webhook delivered", extra=kv(event=event_type, status=status, attempt=attempt))
+                return True
+            problem = f"HTTP {status}"
+            if 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS:
+                log.warning("Webhook rejected: %s", problem, extra=kv(event=event_type))
+                return False
+        if attempt < attempts:
+            log.warning("Webhook attempt %d failed: %s", attempt, problem, extra=kv(retry_in_s=delay))
+            time.sleep(delay)
+            delay *= 2
+        else:
+            log.error("❌ Webhook not delivered after %d attempts: %s", attempts, problem,
+                      extra=kv(event=event_type))
+    return False
+
+def result_event(job_id, result):
+    """(event type, payload) for a finished job's result"""
+    failed = not isinstance(result, dict) or "error" in result
+    payload = {
+        "id": job_id,
+        "event": "failed" if failed else "completed",
+        "status": "FAILED" if failed else "COMPLETED",  # Same values as RunPod's /status
+        "output": result
+    }
+    if failed and isinstance(result, dict):
+        payload["error"] = result["error"]
+    return payload["event"], payload
+
+class WebhookNotifier:
+    """Webhook events of one job - parsers.parse_webhook_options() gives its options"""
+
+    def __init__(self, options, job_id=None):
+        self.url = options["url"]
+        self.send_progress = options.get("progress", False)
+        self.job_id = job_id
+        self._last_progress = None
+        self._lock = threading.Lock()
+
+    def progress(self, progress):
+        """Send a progress event in the background unless one went out within the interval"""
+        if not self.send_progress:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._last_progress is not None and now - self._last_progress < WEBHOOK_PROGRESS_INTERVAL:
+                return
+            self._last_progress = now
+        payload = {"id": self.job_id, "event": "progress", "status": "IN_PROGRESS", "progress": progress}
+        threading.Thread(target=deliver, args=(self.url, payload, "progress"), kwargs={"attempts": 1},
+                         daemon=True).start()
+
+    def result(self, result):
+        """Send the final result, with retries; True if it was delivered"""
+        event_type, payload = result_event(self.job_id, result)
+        return deliver(self.url, payload, event_type)
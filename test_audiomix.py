@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for the block audio engine (gain, fades, looping, piped mux command)
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+from merge_worker import audiomix, planner
+
+RATE = 1000  # Low rate keeps the arrays small - the engine doesn't care
+
+class MemorySource:
+    """In-memory stand-in for an FFmpeg decoder pipe"""
+    opened = 0
+    open_now = 0
+
+    def __init__(self, samples):
+        type(self).opened += 1
+        type(self).open_now += 1
+        self.stream = io.BytesIO(samples.astype("<f4").tobytes())
+
+    def read(self, size):
+        return self.stream.read(size)
+
+    def close(self):
+        type(self).open_now -= 1
+
+def memory_sources(tracks):
+    """open_source for layers whose path names an entry of tracks"""
+    return lambda path, sample_rate, channels: MemorySource(tracks[path])
+
+def render(layers, duration, tracks, block_seconds=0.25):
+    blocks = audiomix.iter_mix_blocks(layers, duration, sample_rate=RATE, block_seconds=block_seconds,
+                                      open_source=memory_sources(tracks))
+    return np.concatenate([block.copy() for block in blocks])
+
+def test_gain_and_mixing():
+    """Layers are scaled by their gain, summed and clipped"""
+    print("🧪 Testing gain and mixing...")
+    tracks = {"music": np.full((2 * RATE, 2), 0.5), "ambience": np.full((2 * RATE, 2), 0.25)}
+    mix = render([audiomix.make_layer("music", gain=0.5), audiomix.make_layer("ambience", gain=2.0)], 2, tracks)
+    assert mix.shape == (2 * RATE, 2) and np.allclose(mix, 0.75)
+    loud = render([audiomix.make_layer("music", gain=4.0)], 1, tracks)
+    assert np.allclose(loud, 1.0)
+    print("✅ Gain and mixing passed")
+
+def test_fades_and_crossfade():
+    """Quarter-sine fades shape the edges and a crossfade keeps constant power"""
+    print("🧪 Testing fades and crossfade...")
+    tracks = {"a": np.ones((4 * RATE, 2)), "b": np.ones((4 * RATE, 2))}
+    mix = render([audiomix.make_layer("a", fade_in=1.0, fade_out=0.5)], 4, tracks)
+    assert mix[0, 0] == 0 and np.isclose(mix[RATE // 2, 0], np.sin(np.pi / 4), atol=1e-3)
+    assert np.allclose(mix[RATE:int(3.5 * RATE)], 1.0)
+    assert mix[-1, 0] < 0.01
+
+    first = audiomix.make_layer("a", duration=2.5)
+    second = audiomix.make_layer("b")
+    layers = audiomix.crossfade(first, second, 1.0)
+    assert second["start"] == 1.5
+    # Equal power: the squared gains of the two layers add up to one across the overlap
+    a_only = render([first], 4, tracks)
+    b_only = render([second], 4, tracks)
+    overlap = slice(int(1.5 * RATE), int(2.5 * RATE))
+    assert np.allclose(a_only[overlap, 0] ** 2 + b_only[overlap, 0] ** 2, 1.0, atol=1e-2)
+    # Summed before clipping - quiet inputs don't reach full scale
+    quiet = {"a": tracks["a"] * 0.5, "b": tracks["b"] * 0.5}
+    assert np.allclose(render(layers, 4, quiet), (a_only + b_only) * 0.5)
+    print("✅ Fades and crossfade passed")
+
+def test_looping_and_lazy_sources():
+    """Looped layers reopen their source; sources are only open while their layer plays"""
+    print("🧪 Testing looping...")
+    ramp = np.repeat(np.arange(RATE, dtype=np.float32)[:, None] / RATE, 2, axis=1)
+    MemorySource.opened = MemorySource.open_now = 0
+    mix = render([audiomix.make_layer("ramp", loop=True)], 3.5, {"ramp": ramp}, block_seconds=0.3)
+    assert np.allclose(mix[:RATE], ramp) and np.allclose(mix[2 * RATE:3 * RATE], ramp)
+    assert MemorySource.opened == 4 and MemorySource.open_now == 0
+
+    MemorySource.opened = 0
+    late = render([audiomix.make_layer("ramp", start=2.0, duration=0.5)], 3, {"ramp": ramp})
+    assert not late[:2 * RATE].any() and not late[int(2.5 * RATE):].any()
+    assert np.allclose(late[2 * RATE:int(2.5 * RATE)], ramp[:RATE // 2])
+    assert MemorySource.opened == 1 and MemorySource.open_now == 0
+    print("✅ Looping passed")
+
+def test_render_to_sink():
+    """render_mix streams exactly the output length as f32le"""
+    print("🧪 Testing streamed output...")
+    sink = io.BytesIO()
+    frames = audiomix.render_mix([audiomix.make_layer("tone", gain=0.5)], 2.0, sink, sample_rate=RATE,
+                                 open_source=memory_sources({"tone": np.ones((RATE, 2))}))
+    assert frames == 2 * RATE and len(sink.getvalue()) == frames * 2 * 4
+    print("✅ Streamed output passed")
+
+def test_piped_mux_command():
+    """The mux reads the rendered mix from stdin with no filter, and the filter path gets the same fades"""
+    print("🧪 Testing mux commands...")
+    timing = planner.plan_timing(600, 120, fade_in=3, fade_out=5)
+    piped = {"format": audiomix.PCM_FORMAT, "sample_rate": audiomix.SAMPLE_RATE, "channels": audiomix.CHANNELS}
+    cmd = planner.build_merge_command("video.mp4", "music.mp3", "out.mp4", 0.7, timing=timing, piped_audio=piped)
+    audio_input = cmd.index("pipe:0")
+    assert cmd[audio_input - 7:audio_input + 1] == ["-f", "f32le", "-ar", "48000", "-ac", "2", "-i", "pipe:0"]
+    assert "music.mp3" not in cmd and "-filter:a" not in cmd and "-shortest" not in cmd
+
+    cmd = planner.build_merge_command("video.mp4", "music.mp3", "out.mp4", 0.7, timing=timing)
+    assert cmd[cmd.index("-filter:a") + 1] == \
+        "volume=0.7,afade=t=in:curve=qsin:d=3.000,afade=t=out:curve=qsin:st=595.000:d=5.000"
+    print("✅ Mux commands passed")
+
+# Largest per-sample difference allowed between the block engine and the filter graph
+ENGINE_TOLERANCE = 1e-7
+
+def test_engines_agree():
+    """The block engine and the FFmpeg filter graph render the same looped, faded music"""
+    print("🧪 Testing engine agreement...")
+    if not shutil.which("ffmpeg"):
+        print("⏭️  ffmpeg not installed, skipping")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        music, raw = os.path.join(tmp, "music.wav"), os.path.join(tmp, "graph.f32")
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i",
+                        "sine=frequency=440:sample_rate=48000:duration=4", "-ac", "2", music], check=True)
+        timing = planner.plan_timing(10, 4, fade_in=1, fade_out=2)
+        assert timing["loop_audio"]
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-stream_loop", "-1",
+                        "-t", f"{timing['duration']:.3f}", "-i", music, "-filter:a", planner.music_filter(0.7, timing),
+                        "-ac", "2", "-ar", "48000", "-f", "f32le", raw], check=True)
+        sink = io.BytesIO()
+        audiomix.render_mix(audiomix.music_layers(music, 0.7, timing), timing["duration"], sink)
+
+        graph = np.fromfile(raw, dtype="<f4")
+        blocks = np.frombuffer(sink.getvalue(), dtype="<f4")
+        assert len(graph) == len(blocks) == 10 * 48000 * 2, (len(graph), len(blocks))
+        difference = float(np.abs(graph - blocks).max())
+        assert difference < ENGINE_TOLERANCE, difference
+    print(f"✅ Engine agreement passed (max difference {difference:.1e})")
+
+def main():
+    print("🧪 Block Audio Engine Tests")
+    print("=" * 40)
+    test_gain_and_mixing()
+    test_fades_and_crossfade()
+    test_looping_and_lazy_sources()
+    test_render_to_sink()
+    test_piped_mux_command()
+    test_engines_agree()
+    print("\n🎉 All audio engine tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Test script for concat jobs (parsing, compatibility planning, FFmpeg commands)
+"""
+
+import http.server
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from merge_worker import mediaindex, planner
+from merge_worker.handler import handle_job, parse_job
+from merge_worker.preflight import job_inputs
+from merge_worker.probe import probe_clip
+
+H264_1080 = {"codec_name": "h264", "profile": "High", "level": "40", "width": "1920", "height": "1080",
+             "pix_fmt": "yuv420p", "sample_aspect_ratio": "1:1", "r_frame_rate": "30/1", "time_base": "1/15360"}
+AAC = {"codec_name": "aac", "profile": "LC", "sample_rate": "48000", "channels": "2"}
+
+def clip(duration=60.0, video=None, audio=AAC):
+    return {"duration": duration, "video": {**H264_1080, **(video or {})}, "audio": audio, "bit_rate": 8_000_000}
+
+def test_parse_concat_job():
+    """A clips list makes a concat job; every clip and the music are preflighted"""
+    print("🧪 Testing concat parsing...")
+    params = parse_job({"input": {
+        "clips": ["https://example.com/1.mp4", {"url": "https://example.com/2.mp4", "size": 10},
+                  {"file_path": "/workspace/clips/3.mp4"}],
+        "audio_url": "https://example.com/music.mp3",
+        "audio_fade_out": 5
+    }})
+    assert params["job_type"] == "concat" and params["encoder"] == "copy"
+    assert [c["url"] for c in params["clips"]][2] == "/workspace/clips/3.mp4"
+    assert params["clips"][1]["expected"] == {"size": 10}
+    names = [name for name, _, _ in job_inputs(params)]
+    assert names == ["clip1", "clip2", "clip3", "audio"]
+
+    try:
+        parse_job({"input": {"clips": []}})
+    except ValueError as e:
+        assert "non-empty" in str(e)
+    else:
+        raise AssertionError("empty clip list accepted")
+    print("✅ Concat parsing passed")
+
+def test_plan_concat():
+    """The majority signature by running time wins; only clips that differ are conformed"""
+    print("🧪 Testing compatibility planning...")
+    probes = [clip(), clip(video={"width": "1280", "height": "720"}, duration=30), clip(),
+              clip(video={"time_base": "1/90000"}), clip(audio=None), clip(video={"level": "41"}, duration=5)]
+    plan = planner.plan_concat(probes)
+    assert plan["reference"]["video"] == H264_1080 and plan["reference"]["audio"] == AAC
+    assert plan["conform"] == [1, 3, 4, 5] and plan["duration"] == 275
+
+    # With music the clips' audio is dropped, so a silent clip needs no work
+    plan = planner.plan_concat(probes, keep_audio=False)
+    assert plan["conform"] == [1, 3, 5] and plan["reference"]["audio"] is None
+
+    # Mostly 720p by running time - the single long 1080p clip is the odd one out
+    mostly_720 = [clip(duration=10), clip(video={"width": "1280", "height": "720"}, duration=40),
+                  clip(video={"width": "1280", "height": "720"}, duration=40)]
+    assert planner.plan_concat(mostly_720)["conform"] == [0]
+    print("✅ Compatibility planning passed")
+
+def test_conform_commands():
+    """Conforming re-encodes only the streams that differ from the reference"""
+    print("🧪 Testing conform commands...")
+    reference = {"video": H264_1080, "audio": AAC}
+
+    cmd = planner.build_conform_command("in.mp4", "out.mp4", clip(video={"width": "1280", "height": "720"}),
+                                        reference, "libx264", "8000k")
+    assert cmd[cmd.index("-vf") + 1].startswith("scale=1920:1080:force_original_aspect_ratio=decrease")
+    assert cmd[cmd.index("-video_track_timescale") + 1] == "15360"
+    assert cmd[cmd.index("-profile:v") + 1] == "high" and cmd[cmd.index("-c:a") + 1] == "copy"
+    assert cmd[cmd.index("-level") + 1] == "4.0"
+
+    # An unknown level (-99) is left to the encoder
+    cmd = planner.build_conform_command("in.mp4", "out.mp4", clip(video={"width": "1280"}),
+                                        {"video": {**H264_1080, "level": "-99"}, "audio": None})
+    assert "-level" not in cmd
+
+    cmd = planner.build_conform_command("in.mp4", "out.mp4", clip(audio={**AAC, "sample_rate": "44100"}),
+                                        reference)
+    assert cmd[cmd.index("-c:v") + 1] == "copy" and cmd[cmd.index("-ar") + 1] == "48000"
+
+    cmd = planner.build_conform_command("in.mp4", "out.mp4", clip(audio=None), reference)
+    assert "anullsrc=r=48000:cl=stereo" in cmd and "-shortest" in cmd and cmd[cmd.index("-c:v") + 1] == "copy"
+
+    cmd = planner.build_conform_command("in.mp4", "out.mp4", clip(video={"pix_fmt": "yuv444p"}),
+                                        {"video": H264_1080, "audio": None})
+    pix_fmts = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-pix_fmt"]
+    assert "-an" in cmd and pix_fmts[-1] == "yuv420p"  # the reference's, not the clip's
+
+    try:
+        planner.build_conform_command("in.mp4", "out.mp4", clip(),
+                                      {"video": {**H264_1080, "codec_name": "vp9"}, "audio": None})
+    except ValueError as e:
+        assert "vp9" in str(e)
+    else:
+        raise AssertionError("re-encode to vp9 accepted")
+    print("✅ Conform commands passed")
+
+def test_concat_commands():
+    """Clips are joined by stream copy, with music muxed in the same pass"""
+    print("🧪 Testing concat commands...")
+    script = planner.concat_list(["/tmp/a.mp4", "/tmp/it's.mp4"])
+    assert script.splitlines() == ["ffconcat version 1.0", "file '/tmp/a.mp4'", "file '/tmp/it'\\''s.mp4'"]
+
+    cmd = planner.build_concat_command("clips.ffconcat", "out.mp4")
+    assert cmd[cmd.index("-f") + 1] == "concat" and cmd[-4:] == ["0:a:0?", "-c", "copy", "out.mp4"]
+
+    timing = planner.plan_timing(10800, 600, fade_out=5)
+    cmd = planner.build_concat_command("clips.ffconcat", "out.mp4", "music.mp3", 0.5, timing)
+    assert cmd[cmd.index("-i") - 1] == "10800.000"  # cut at the planned length
+    assert cmd[cmd.index("music.mp3") - 5:cmd.index("music.mp3")] == ["-stream_loop", "-1", "-t", "10800.000", "-i"]
+    assert cmd[cmd.index("-c:v") + 1] == "copy" and "1:a:0" in cmd
+    assert cmd[cmd.index("-filter:a") + 1].startswith("volume=0.5,afade=t=out")
+    print("✅ Concat commands passed")
+
+def make_clip(path, size, seconds, profile, level):
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=25:duration={seconds}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-profile:v", profile, "-level", level,
+                    "-pix_fmt", "yuv420p", "-video_track_timescale", "12800",
+                    "-c:a", "aac", "-ac", "2", "-shortest", str(path)], check=True)
+
+def test_joined_output():
+    """A clip conformed to the reference joins into a file with the reference's profile and level"""
+    print("🧪 Testing joined output...")
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("⏭️  ffmpeg/ffprobe not installed, skipping")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [Path(tmp, f"clip{index}.mp4") for index in range(3)]
+        make_clip(paths[0], "640x360", 4, "high", "4.0")
+        make_clip(paths[1], "640x360", 2, "main", "3.0")  # Same size, different profile and level
+        make_clip(paths[2], "640x360", 4, "high", "4.0")
+
+        probes = [probe_clip(str(path)) for path in paths]
+        plan = planner.plan_concat(probes)
+        reference = plan["reference"]["video"]
+        assert (reference["profile"], reference["level"]) == ("High", "40") and plan["conform"] == [1]
+
+        conformed = Path(tmp, "conformed.mp4")
+        subprocess.run(planner.build_conform_command(str(paths[1]), str(conformed), probes[1], plan["reference"],
+                                                     bitrate="1M"), check=True)
+        assert probe_clip(str(conformed))["video"] == reference
+
+        list_path, joined = Path(tmp, "clips.ffconcat"), Path(tmp, "joined.mp4")
+        list_path.write_text(planner.concat_list([str(paths[0]), str(conformed), str(paths[2])]))
+        subprocess.run(planner.build_concat_command(str(list_path), str(joined)), check=True)
+        output = probe_clip(str(joined))
+        assert (output["video"]["profile"], output["video"]["level"]) == ("High", "40")
+        assert abs(output["duration"] - 10) < 0.2, output["duration"]
+        # Every frame of the middle clip decodes after the join
+        result = subprocess.run(["ffprobe", "-v", "error", "-count_frames", "-select_streams", "v:0",
+                                 "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", str(joined)],
+                                capture_output=True, text=True, check=True)
+        assert int(result.stdout.strip()) == 250 and not result.stderr.strip(), result
+    print("✅ Joined output passed")
+
+def test_unknown_length_join():
+    """Clips without a duration (raw H.264) still join, with progress reported but no percentage"""
+    print("🧪 Testing unknown-length join...")
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("⏭️  ffmpeg/ffprobe not installed, skipping")
+        return
+    saved = mediaindex.MEDIA_INDEX_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("a.h264", "b.h264"):
+            subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi",
+                            "-i", "testsrc2=size=320x240:rate=25:duration=2", "-c:v", "libx264",
+                            "-preset", "veryfast", str(Path(tmp, name))], check=True)
+
+        class Handler(http.server.SimpleHTTPRequestHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=tmp, **kwargs)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            mediaindex.MEDIA_INDEX_DIR = Path(tmp) / "index"
+            workspace = Path(tmp) / "workspace"
+            # Progress goes to a closed port - delivery failures are only logged
+            result = handle_job({"input": {"clips": [f"{base}/a.h264", f"{base}/b.h264"], "output_filename": "j.mp4",
+                                           "cache": False, "webhook_url": "http://127.0.0.1:1/hook",
+                                           "webhook_progress": True}},
+                                {"workspace_dir": str(workspace), "parser_defaults": {}})
+            assert result.get("success"), result
+            assert (workspace / "j.mp4").stat().st_size > 0
+        finally:
+            mediaindex.MEDIA_INDEX_DIR = saved
+            server.shutdown()
+    print("✅ Unknown-length join passed")
+
+def main():
+    print("🧪 Concat Job Tests")
+    print("=" * 40)
+    test_parse_concat_job()
+    test_plan_concat()
+    test_conform_commands()
+    test_concat_commands()
+    test_joined_output()
+    test_unknown_length_join()
+    print("\n🎉 All concat tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the encoder cost model (speed store, encoder choice, progress parsing)
+"""
+
+import tempfile
+from pathlib import Path
+
+from merge_worker import costmodel, ffmpeg, planner
+
+SOURCE_1080P = {"codec": "h264", "width": 1920, "height": 1080, "bit_rate": 8_000_000}
+
+def test_progress_speed():
+    """The last reported speed= wins, N/A is ignored"""
+    print("🧪 Testing progress parsing...")
+    output = "frame=10\nspeed=N/A\nprogress=continue\nframe=900\nspeed=12.5x\nprogress=end\n"
+    assert ffmpeg.parse_progress_speed(output) == 12.5
+    assert ffmpeg.parse_progress_speed("progress=end\n") is None
+    print("✅ Progress parsing passed")
+
+def test_learned_speeds_change_choice():
+    """Recorded speeds replace the priors and can flip the chosen encoder"""
+    print("🧪 Testing learned encoder choice...")
+    old_path = costmodel.ENCODER_STATS_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        costmodel.ENCODER_STATS_PATH = Path(tmp) / "encoder_stats.json"
+        try:
+            params = {"encoder": "auto", "quality": "balanced", "video_bitrate": "4M", "use_nvenc": True}
+
+            # Source is above the bitrate ceiling, so copy is out; NVENC p4 beats libx264 medium
+            choice = costmodel.choose_video_encoder(params, SOURCE_1080P, gpu_available=True, duration=600)
+            assert (choice["codec"], choice["preset"]) == ("h264_nvenc", "p4")
+            assert choice["predicted_seconds"] == round(600 / costmodel.PRIOR_SPEEDS["h264_nvenc:p4"], 1)
+
+            # This GPU turns out to be slow at p4 and p7 - libx264 medium is faster here
+            for _ in range(3):
+                costmodel.record_speed("h264_nvenc", "p4", 1080, 0.5)
+                costmodel.record_speed("h264_nvenc", "p7", 1080, 0.3)
+            assert costmodel.predict_speed("h264_nvenc", "p4", 1080) < 1.5
+            choice = costmodel.choose_video_encoder(params, SOURCE_1080P, gpu_available=True, duration=600)
+            assert (choice["codec"], choice["preset"]) == ("libx264", "medium")
+
+            # Other resolutions still use the scaled prior
+            assert costmodel.predict_speed("h264_nvenc", "p4", 720) > costmodel.PRIOR_SPEEDS["h264_nvenc:p4"]
+        finally:
+            costmodel.ENCODER_STATS_PATH = old_path
+    print("✅ Learned encoder choice passed")
+
+def test_targets_and_defaults():
+    """Copy wins when the source fits, defaults keep the configured encoder"""
+    print("🧪 Testing encoder targets...")
+    fits = costmodel.choose_video_encoder({"quality": "high", "video_bitrate": "10M", "use_nvenc": True},
+                                          SOURCE_1080P, gpu_available=True)
+    assert fits["codec"] == "copy"
+
+    assert costmodel.choose_video_encoder({"use_nvenc": True}, gpu_available=True)["preset"] == "p1"
+    assert costmodel.choose_video_encoder({"use_nvenc": True}, gpu_available=False)["codec"] == "copy"
+    assert costmodel.choose_video_encoder({"encoder": "h264_nvenc", "quality": "high"})["codec"] == "libx264"
+
+    encoder = {"codec": "libx264", "preset": "medium", "bitrate": "4M"}
+    cmd = planner.build_merge_command("v.mp4", "a.mp3", "out.mp4", gpu_acceleration=True,
+                                      gpu_available=True, encoder=encoder)
+    assert "-hwaccel_output_format" not in cmd
+    assert cmd[cmd.index("-c:v") + 1] == "libx264" and cmd[cmd.index("-b:v") + 1] == "4M"
+    print("✅ Encoder targets passed")
+
+def main():
+    print("🧪 Cost Model Tests")
+    print("=" * 40)
+    test_progress_speed()
+    test_learned_speeds_change_choice()
+    test_targets_and_defaults()
+    print("\n🎉 All cost model tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script for CPU allocation (cgroup limits, leases, pinning, thread options)
+"""
+
+import os
+import tempfile
+
+from merge_worker import cpus, planner
+
+def test_cgroup_limit():
+    """cgroup v2 cpu.max and v1 CFS quotas are read as CPUs' worth of time"""
+    print("🧪 Testing cgroup limits...")
+    saved = cpus.CGROUP_V2_CPU_MAX, cpus.CGROUP_V1_DIRS
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            cpus.CGROUP_V2_CPU_MAX = os.path.join(directory, "cpu.max")
+            cpus.CGROUP_V1_DIRS = (directory,)
+            assert cpus.cgroup_cpu_limit() is None
+
+            with open(os.path.join(directory, "cpu.cfs_quota_us"), "w") as f:
+                f.write("150000\n")
+            with open(os.path.join(directory, "cpu.cfs_period_us"), "w") as f:
+                f.write("100000\n")
+            assert cpus.cgroup_cpu_limit() == 1.5
+
+            with open(cpus.CGROUP_V2_CPU_MAX, "w") as f:
+                f.write("max 100000\n")
+            assert cpus.cgroup_cpu_limit() is None  # v2 wins when present
+            with open(cpus.CGROUP_V2_CPU_MAX, "w") as f:
+                f.write("400000 100000\n")
+            assert cpus.cgroup_cpu_limit() == 4.0
+        finally:
+            cpus.CGROUP_V2_CPU_MAX, cpus.CGROUP_V1_DIRS = saved
+
+    assert cpus.CpuAllocator(cpus=range(16), limit=2.5).budget == 3
+    assert cpus.CpuAllocator(cpus=range(4), limit=8).budget == 4
+    print("✅ cgroup limits passed")
+
+def test_leases():
+    """A lone process gets every core; later ones share, preferring idle cores"""
+    print("🧪 Testing CPU leases...")
+    allocator = cpus.CpuAllocator(cpus=range(8), limit=0)
+    with allocator.lease() as first:
+        assert first == {"threads": 8, "cpus": list(range(8))}
+        with allocator.lease() as second:
+            assert second["threads"] == 4
+            with allocator.lease() as third:
+                # Cores 0-3 are held twice now, so the third process lands on 4-7
+                assert third == {"threads": 2, "cpus": [4, 5]}
+    assert allocator.status()["active"] == 0 and allocator.status()["leased_threads"] == 0
+
+    with allocator.lease(max_threads=2) as copy:
+        assert copy == {"threads": 2, "cpus": [0, 1]}
+        with allocator.lease() as encode:
+            # The copy leaves six cores idle - the encode takes those rather than a half share
+            assert encode == {"threads": 6, "cpus": [2, 3, 4, 5, 6, 7]}
+
+    # A batch started together splits the budget evenly, on disjoint cores
+    leases = [allocator.lease(expected=4) for _ in range(4)]
+    held = [lease.__enter__() for lease in leases]
+    assert [lease["cpus"] for lease in held] == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    for lease in reversed(leases):
+        lease.__exit__(None, None, None)
+
+    with cpus.CpuAllocator(cpus=[0], limit=0).lease(expected=3) as tiny:
+        assert tiny == {"threads": 1, "cpus": [0]}
+    print("✅ CPU leases passed")
+
+def test_pinning():
+    """pinned() changes only the calling thread's affinity, and restores it"""
+    print("🧪 Testing pinning...")
+    if not hasattr(os, "sched_setaffinity"):
+        print("⏭️  No sched_setaffinity on this platform, skipping")
+        return
+    before = os.sched_getaffinity(0)
+    target = {min(before)}
+    with cpus.pinned(target):
+        assert os.sched_getaffinity(0) == target
+    assert os.sched_getaffinity(0) == before
+    with cpus.pinned(None):
+        assert os.sched_getaffinity(0) == before
+    print("✅ Pinning passed")
+
+def test_thread_options():
+    """Commands carry the lease's thread budget; 0 keeps FFmpeg's own choice"""
+    print("🧪 Testing thread options...")
+    encoder = {"codec": "libx264", "preset": "veryfast", "bitrate": "5M"}
+    cmd = planner.build_merge_command("video.mp4", "music.mp3", "out.mp4", encoder=encoder)
+    assert cmd[cmd.index("-threads") + 1] == "0" and cmd.count("-threads") == 1 and "-filter_threads" not in cmd
+
+    cmd = planner.build_merge_command("video.mp4", "music.mp3", "out.mp4", encoder=encoder, threads=3)
+    assert [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-threads"] == ["3", "3"]
+    assert cmd.index("-threads") < cmd.index("-i")  # decoder
+    assert cmd.index("libx264") < len(cmd) - 1 - cmd[::-1].index("-threads")  # encoder
+    assert cmd[cmd.index("-filter_threads") + 1] == "3"
+
+    renditions = [
+        {"name": "hd", "type": "video", "codec": "libx264", "height": 1080, "bitrate": "5M", "preset": None,
+         "filename": "hd.mp4"},
+        {"name": "sd", "type": "video", "codec": "libx264", "height": 480, "bitrate": "1M", "preset": None,
+         "filename": "sd.mp4"},
+        {"name": "src", "type": "video", "codec": "copy", "height": None, "bitrate": None, "preset": None,
+         "filename": "src.mp4"},
+    ]
+    cmd = planner.build_rendition_command("video.mp4", "music.mp3", "/out", renditions, threads=8)
+    assert [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-threads"] == ["8", "4", "4"]
+    assert cmd[cmd.index("-filter_complex_threads") + 1] == "8"
+    print("✅ Thread options passed")
+
+def main():
+    print("🧪 CPU Allocation Tests")
+    print("=" * 40)
+    test_cgroup_limit()
+    test_leases()
+    test_pinning()
+    test_thread_options()
+    print("\n🎉 All CPU allocation tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -4,62 +4,8 @@ Test script to verify DigitalOcean format parsing
 """
 
 import json
-import uuid
-import re
 
-def parse_digitalocean_format(event):
-    """Parse DigitalOcean-style FFmpeg JSON into our format"""
-    
-    print("Parsing DigitalOcean format...")
-    
-    # Extract inputs
-    inputs = event.get("inputs", [])
-    if not inputs or len(inputs) < 2:
-        raise ValueError("DigitalOcean format requires at least 2 inputs (video and audio)")
-    
-    # Validate input structure
-    if not isinstance(inputs[0], dict) or "file_url" not in inputs[0]:
-        raise ValueError("First input must have 'file_url' field")
-    if not isinstance(inputs[1], dict) or "file_url" not in inputs[1]:
-        raise ValueError("Second input must have 'file_url' field")
-    
-    video_url = inputs[0]["file_url"]
-    audio_url = inputs[1]["file_url"]
-    
-    print(f"Video URL: {video_url}")
-    print(f"Audio URL: {audio_url}")
-    
-    # Extract volume from filters - exactly like DigitalOcean FFmpeg
-    volume = 1.0  # default to 1.0 (like DigitalOcean)
-    filters = event.get("filters", [])
-    
-    for filter_obj in filters:
-        if isinstance(filter_obj, dict) and "filter" in filter_obj:
-            filter_str = filter_obj["filter"]
-            print(f"Processing filter: {filter_str}")
-            
-            # Parse volume from filter like "[1:0]volume=1[audio]" or "[1:a]volume=0.7[audio]"
-            volume_match = re.search(r'volume=([0-9]*\.?[0-9]+)', filter_str)
-            if volume_match:
-                volume = float(volume_match.group(1))
-                print(f"Extracted volume: {volume}")
-                break
-    
-    # Generate output filename from id (exactly like DigitalOcean)
-    job_id = event.get("id", f"output_{uuid.uuid4().hex[:8]}")
-    output_filename = f"{job_id}.mp4"
-    
-    print(f"Job ID: {job_id}")
-    print(f"Output filename: {output_filename}")
-    print(f"Final volume: {volume}")
-    
-    return {
-        "video_url": video_url,
-        "audio_url": audio_url,
-        "volume": volume,
-        "output_filename": output_filename,
-        "job_id": job_id
-    }
+from merge_worker.parsers import parse_digitalocean_format
 
 def test_your_exact_input():
     """Test with your exact input format"""
@@ -176,5 +122,20 @@ def test_your_exact_input():
         print(f"❌ Error: {e}")
         return False
 
+def test_entry_point_defaults():
+    """Both workers share one parser and differ only in configured defaults"""
+    import worker
+    import worker_flexible
+
+    payload = {"inputs": [{"file_url": "https://example.com/v.mp4"}, {"file_url": "https://example.com/a.mp3"}]}
+    gpu = parse_digitalocean_format(payload, worker.WORKER_CONFIG["parser_defaults"])
+    flexible = parse_digitalocean_format(payload, worker_flexible.FLEXIBLE_CONFIG["parser_defaults"])
+
+    assert gpu["volume"] == 1.0 and gpu["use_nvenc"] is True
+    assert flexible["volume"] == 0.7 and flexible["use_nvenc"] is False
+    print("✅ Entry point defaults applied")
+    return True
+
 if __name__ == "__main__":
-    test_your_exact_input()
\ No newline at end of file
+    test_your_exact_input()
+    test_entry_point_defaults()
\ No newline at end of file
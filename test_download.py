@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the adaptive downloader (ranged stripes, tuning, fallback)
+"""
+
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+from merge_worker import download
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves one in-memory file, throttled per connection, optionally ignoring Range"""
+    protocol_version = "HTTP/1.1"
+    data = b""
+    rate = 0
+    honour_ranges = True
+
+    def do_GET(self):
+        start, end = 0, len(self.data)
+        ranged = self.honour_ranges and self.headers.get("Range", "").startswith("bytes=")
+        if ranged:
+            first, _, last = self.headers["Range"][len("bytes="):].partition("-")
+            start, end = int(first), min(int(last) + 1, len(self.data))
+        self.send_response(206 if ranged else 200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        begin = time.monotonic()
+        try:
+            for offset in range(start, end, 64 * 1024):
+                self.wfile.write(self.data[offset:min(offset + 64 * 1024, end)])
+                ahead = (offset + 64 * 1024 - start) / self.rate - (time.monotonic() - begin)
+                if ahead > 0:
+                    time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+def serve(data, rate, honour_ranges=True):
+    handler = type("Handler", (RangeHandler,), {"data": data, "rate": rate, "honour_ranges": honour_ranges})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/input.bin"
+
+def small_stripes():
+    """Shrink the striping thresholds so a few MB exercise the ranged path"""
+    saved = {name: getattr(download, name) for name in
+             ("STRIPE_MIN_SIZE", "MIN_SEGMENT_SIZE", "CONNECTION_SAMPLE_SECONDS")}
+    download.STRIPE_MIN_SIZE = 1024 * 1024
+    download.MIN_SEGMENT_SIZE = 256 * 1024
+    download.CONNECTION_SAMPLE_SECONDS = 0.1
+    return saved
+
+def test_tuner_plateau():
+    """The setting doubles while throughput improves and stops at the plateau"""
+    print("🧪 Testing throughput tuner...")
+    tuner = download.ThroughputTuner(1, 16, sample_seconds=0)
+    for rate in (10, 20, 40, 41):
+        tuner.record(rate, 1.0)
+    assert tuner.value == 8 and tuner.settled
+    tuner.record(1000, 1.0)
+    assert tuner.value == 8
+    print("✅ Throughput tuner passed")
+
+def test_striped_download():
+    """A throttled server is fetched over several connections with correct digests"""
+    print("🧪 Testing striped download...")
+    data = os.urandom(6 * 1024 * 1024 + 123)
+    saved = small_stripes()
+    server, url = serve(data, rate=4 * 1024 * 1024)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "out.bin")
+            info = download.download_file(url, target, expected={"md5": hashlib.md5(data).hexdigest()})
+            with open(target, "rb") as f:
+                assert f.read() == data
+            assert info["digests"]["sha256"] == hashlib.sha256(data).hexdigest()
+            assert info["digests"]["md5"] == hashlib.md5(data).hexdigest()
+            transfer = info["transfer"]
+            assert transfer["connections"] > 1, transfer
+            assert transfer["segment_size"] and transfer["ttfb_ms"] >= 0
+    finally:
+        server.shutdown()
+        for name, value in saved.items():
+            setattr(download, name, value)
+    print(f"✅ Striped download passed ({transfer['connections']} connections)")
+
+def test_ignored_ranges_fall_back():
+    """A server that answers ranges with 200 gets a single-connection download"""
+    print("🧪 Testing range fallback...")
+    data = os.urandom(2 * 1024 * 1024)
+    saved = small_stripes()
+    server, url = serve(data, rate=64 * 1024 * 1024, honour_ranges=False)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            info = download.download_file(url, os.path.join(tmp, "out.bin"))
+            assert info["digests"]["sha256"] == hashlib.sha256(data).hexdigest()
+            assert info["transfer"]["connections"] == 1
+    finally:
+        server.shutdown()
+        for name, value in saved.items():
+            setattr(download, name, value)
+    print("✅ Range fallback passed")
+
+def main():
+    print("🧪 Adaptive Download Tests")
+    print("=" * 40)
+    test_tuner_plateau()
+    test_striped_download()
+    test_ignored_ranges_fall_back()
+    print("\n🎉 All download tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,13 @@ Test script for the RunPod FFmpeg endpoint
 
 import requests
 import json
-import time
 import sys
 
-def test_endpoint(endpoint_url, api_key, video_url, audio_url):
+from merge_worker.client import submit_job, wait_for_job
+
+def test_endpoint(endpoint_url, api_key, video_url, audio_url, webhook_url=None):
     """Test the RunPod endpoint with sample files"""
     
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
     payload = {
         "input": {
             "video_url": video_url,
@@ -24,18 +20,21 @@ def test_endpoint(endpoint_url, api_key, video_url, audio_url):
             "output_filename": "test_output.mp4"
         }
     }
+    if webhook_url:
+        # The worker POSTs the result (and progress) there as well
+        payload["input"]["webhook_url"] = webhook_url
+        payload["input"]["webhook_progress"] = True
     
     print(f"Testing endpoint: {endpoint_url}")
     print(f"Video URL: {video_url}")
     print(f"Audio URL: {audio_url}")
+    if webhook_url:
+        print(f"Webhook URL: {webhook_url}")
     print("-" * 50)
     
     try:
         # Submit job
-        response = requests.post(endpoint_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = submit_job(endpoint_url, api_key, payload)
         job_id = result.get("id")
         
         print(f"Job submitted successfully!")
@@ -47,45 +46,31 @@ def test_endpoint(endpoint_url, api_key, video_url, audio_url):
             print(json.dumps(result.get("output", {}), indent=2))
             return True
         
-        # Poll for completion
-        status_url = f"{endpoint_url.replace('/run', '')}/{job_id}"
+        # Poll for completion - 1s, 2s, 4s ... up to 30s between polls
+        print("\nWaiting for completion...")
+        polls = []
+        
+        def show_status(status_result):
+            polls.append(status_result)
+            print(f"Poll {len(polls)}: Status = {status_result.get('status', 'Unknown')}")
         
-        print("\nPolling for completion...")
-        max_attempts = 60  # 10 minutes max
-        attempt = 0
+        status_result = wait_for_job(endpoint_url, api_key, job_id, timeout=600, on_status=show_status)
+        status = status_result.get("status")
         
-        while attempt < max_attempts:
-            time.sleep(10)  # Wait 10 seconds between polls
-            attempt += 1
-            
-            status_response = requests.get(status_url, headers=headers)
-            status_response.raise_for_status()
-            
-            status_result = status_response.json()
-            status = status_result.get("status", "Unknown")
-            
-            print(f"Attempt {attempt}: Status = {status}")
-            
-            if status == "COMPLETED":
-                print("\n✅ Job completed successfully!")
-                output = status_result.get("output", {})
-                print(json.dumps(output, indent=2))
-                return True
-                
-            elif status == "FAILED":
-                print("\n❌ Job failed!")
-                error = status_result.get("error", "Unknown error")
-                print(f"Error: {error}")
-                return False
-                
-            elif status in ["IN_PROGRESS", "IN_QUEUE"]:
-                continue
-            else:
-                print(f"\n⚠️ Unknown status: {status}")
-                
-        print("\n⏰ Job timed out after 10 minutes")
+        if status == "COMPLETED":
+            print("\n✅ Job completed successfully!")
+            output = status_result.get("output", {})
+            print(json.dumps(output, indent=2))
+            return True
+        
+        print(f"\n❌ Job {status.lower() if status else 'failed'}!")
+        error = status_result.get("error", "Unknown error")
+        print(f"Error: {error}")
         return False
         
+    except TimeoutError as e:
+        print(f"\n⏰ {e}")
+        return False
     except requests.exceptions.RequestException as e:
         print(f"\n❌ Request failed: {e}")
         return False
@@ -125,10 +110,12 @@ def main():
     if not audio_url:
         audio_url = DEFAULT_AUDIO
     
+    webhook_url = input("Enter a webhook URL for the result (or press Enter to skip): ").strip() or None
+    
     print("\n" + "=" * 50)
     
     # Run test
-    success = test_endpoint(endpoint_url, api_key, video_url, audio_url)
+    success = test_endpoint(endpoint_url, api_key, video_url, audio_url, webhook_url)
     
     if success:
         print("\n🎉 Test completed successfully!")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test script for explain mode - plans and estimates without downloading, against a local HTTP server
+"""
+
+import asyncio
+import http.server
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from merge_worker import mediaindex
+from merge_worker.handler import make_handler
+from merge_worker.parsers import parse_concat_format, parse_digitalocean_format, parse_simple_format
+from merge_worker.scheduler import make_scheduled_handler
+
+VIDEO_BYTES = 4 * 1024 * 1024
+DIGEST = "cd" * 32
+
+def serve(directory):
+    """Static file server over directory that records the method of every request"""
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        methods = []
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def send_head(self):
+            self.methods.append(self.command)
+            return super().send_head()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Handler, f"http://127.0.0.1:{server.server_address[1]}"
+
+def clip_probe(width, duration):
+    video = {"codec_name": "h264", "profile": "High", "level": "31", "width": str(width), "height": "720", "pix_fmt": "yuv420p",
+             "sample_aspect_ratio": "1:1", "r_frame_rate": "25/1", "time_base": "1/12800"}
+    return {"duration": duration, "bit_rate": 2_000_000, "video": video,
+            "audio": {"codec_name": "aac", "profile": "LC", "sample_rate": "48000", "channels": "2"}}
+
+def stored_index(probe):
+    return {"version": mediaindex.INDEX_VERSION, "size": VIDEO_BYTES, "duration": probe["duration"], "packets": 1,
+            "probe": probe, "keyframes": {"times": [0.0], "offsets": [48]}}
+
+def test_parse_explain():
+    """Every request format carries the explain flag, off by default"""
+    print("🧪 Testing explain parsing...")
+    assert parse_simple_format({"video_url": "v.mp4", "audio_url": "a.mp3", "explain": True})["explain"] is True
+    assert parse_simple_format({"video_url": "v.mp4", "audio_url": "a.mp3"})["explain"] is False
+    do_job = {"inputs": [{"file_url": "v.mp4"}, {"file_url": "a.mp3"}], "explain": True}
+    assert parse_digitalocean_format(do_job)["explain"] is True
+    assert parse_concat_format({"clips": ["a.mp4", "b.mp4"], "explain": True})["explain"] is True
+    print("✅ Explain parsing passed")
+
+def test_explain_merge():
+    """A merge is planned from HEAD requests alone - copy, re-encode and indexed inputs"""
+    print("🧪 Testing merge plans...")
+    saved = mediaindex.MEDIA_INDEX_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        Path(tmp, "video.mp4").write_bytes(os.urandom(VIDEO_BYTES))
+        Path(tmp, "audio.mp3").write_bytes(os.urandom(64 * 1024))
+        server, handler, base = serve(tmp)
+        workspace = Path(tmp) / "workspace"
+        try:
+            mediaindex.MEDIA_INDEX_DIR = Path(tmp) / "index"
+            run = make_handler({"workspace_dir": str(workspace)})
+            job = {"video_url": f"{base}/video.mp4", "audio_url": f"{base}/audio.mp3", "use_nvenc": False,
+                   "output_filename": "out.mp4", "explain": True}
+
+            plan = run({"input": job})
+            assert plan["explain"] and plan["job_type"] == "merge", plan
+            assert set(handler.methods) == {"HEAD"}  # Nothing was downloaded
+            assert not (workspace / "temp").exists() and not (workspace / "out.mp4").exists()
+            assert plan["video"] == {"mode": "copy"} and plan["audio"]["mode"] == "encode"
+            assert plan["duration"]["source"] == "size_estimate"
+            thumbnail, command = plan["commands"]  # The default thumbnail is grabbed before the merge
+            assert thumbnail[thumbnail.index("-ss") + 1] == "10.000" and thumbnail[-1].endswith("_out_thumb.jpg")
+            assert command[0] == "ffmpeg" and command[-1].endswith("_out.mp4")  # Per-job name, published after
+            assert plan["output"]["paths"] == [str(workspace / "out.mp4")]
+            assert command[command.index("-c:v") + 1] == "copy" and "-shortest" in command
+            assert plan["inputs"]["video"]["size"] == VIDEO_BYTES and not plan["inputs"]["video"]["indexed"]
+            assert plan["scratch"]["required_bytes"] > VIDEO_BYTES and plan["scratch"]["fits"] is None
+            assert plan["output"]["size_bytes"] > VIDEO_BYTES
+            assert plan["estimate"]["encoder"] == "copy" and plan["estimate"]["lane"] == "fast"
+            assert plan["estimate"]["download_seconds"] is not None
+
+            # A bitrate ceiling the unknown source can't be shown to meet means a re-encode
+            plan = run({"input": {**job, "video_bitrate": "2M", "duration": 60}})
+            assert plan["video"]["mode"] == "encode" and plan["video"]["codec"] == "libx264"
+            assert plan["duration"] == {"seconds": 60, "source": "requested"}
+            assert plan["output"]["size_bytes"] == (2_000_000 + 256_000) * 60 // 8
+            command = plan["commands"][1]
+            assert command[command.index("-b:v") + 1] == "2M" and "-shortest" not in command
+            assert plan["estimate"]["ffmpeg_seconds"] > 0
+
+            # An index from an earlier job gives the real duration, so the cut is exact
+            mediaindex.store_index(f"sha256:{DIGEST}", stored_index(clip_probe(1280, 42.0)))
+            plan = run({"input": {**job, "video_sha256": DIGEST, "duration": None}})
+            assert plan["inputs"]["video"]["indexed"] and plan["duration"] == {"seconds": 42.0, "source": "index"}
+            thumbnail, command = plan["commands"]
+            assert thumbnail[thumbnail.index("-ss") + 1] == "0.000"  # Snapped to the indexed keyframe
+            assert command[command.index("-t") + 1] == "42.000"
+
+            # A preview is cut from the finished output, ending within it
+            plan = run({"input": {**job, "thumbnail": False, "preview": True, "thumbnail_time": 40, "duration": 45}})
+            command, preview = plan["commands"]
+            assert preview[preview.index("-i") + 1] == command[-1]
+            assert preview[preview.index("-ss") + 1] == "35.000" and preview[-1].endswith("_out_preview.mp4")
+
+            plan = run({"input": {**job, "renditions": [{"name": "main"}, {"height": 360}]}})
+            assert plan["job_type"] == "renditions" and plan["video"]["mode"] == "encode"
+            assert plan["video"]["renditions"] == {"main": "copy", "360p": "auto"}
+            assert len(plan["output"]["paths"]) == 2
+
+            plan = run({"input": {**job, "audio_url": f"{base}/missing.mp3"}})
+            assert plan["error"].startswith("Preflight failed")
+        finally:
+            mediaindex.MEDIA_INDEX_DIR = saved
+            server.shutdown()
+    print("✅ Merge plans passed")
+
+def test_explain_concat():
+    """Conformed clips are only known once every clip is indexed"""
+    print("🧪 Testing concat plans...")
+    saved = mediaindex.MEDIA_INDEX_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("a.mp4", "b.mp4", "c.mp4"):
+            Path(tmp, name).write_bytes(os.urandom(1024 * 1024))
+        server, handler, base = serve(tmp)
+        try:
+            mediaindex.MEDIA_INDEX_DIR = Path(tmp) / "index"
+            run = make_handler({"workspace_dir": tmp})
+            clips = [{"url": f"{base}/{name}", "sha256": str(index) * 64}
+                     for index, name in enumerate(("a.mp4", "b.mp4", "c.mp4"))]
+            job = {"clips": clips, "output_filename": "joined.mp4", "explain": True}
+
+            plan = run({"input": job})
+            assert plan["job_type"] == "concat" and set(handler.methods) == {"HEAD"}
+            assert plan["video"] == {"mode": "copy", "conform": None} and plan["audio"] == {"mode": "copy"}
+            assert len(plan["commands"]) == 1 and plan["commands"][0][-1].endswith("_joined.mp4")
+
+            # The odd-sized middle clip is the one to re-encode
+            for clip, probe in zip(clips, (clip_probe(1280, 30.0), clip_probe(640, 5.0), clip_probe(1280, 30.0))):
+                mediaindex.store_index(f"sha256:{clip['sha256']}", stored_index(probe))
+            plan = run({"input": job})
+            assert plan["video"]["conform"] == [1] and plan["duration"] == {"seconds": 65.0, "source": "index"}
+            conform, join = plan["commands"]
+            assert "libx264" in conform and "conformed_0001.mp4" in plan["concat_list"]
+            assert join[join.index("-t") + 1] == "65.000"
+            assert plan["output"]["size_bytes"] == 3 * 1024 * 1024
+        finally:
+            mediaindex.MEDIA_INDEX_DIR = saved
+            server.shutdown()
+    print("✅ Concat plans passed")
+
+def test_scheduled_explain():
+    """The scheduled handler answers explain jobs without putting them on a lane"""
+    print("🧪 Testing scheduled explain...")
+    with tempfile.TemporaryDirectory() as tmp:
+        Path(tmp, "video.mp4").write_bytes(os.urandom(1024 * 1024))
+        Path(tmp, "audio.mp3").write_bytes(os.urandom(64 * 1024))
+        server, handler, base = serve(tmp)
+        try:
+            scheduled = make_scheduled_handler({"workspace_dir": tmp})
+            plan = asyncio.run(scheduled({"input": {"video_url": f"{base}/video.mp4",
+                                                    "audio_url": f"{base}/audio.mp3", "explain": True}}))
+            assert plan["explain"] and "scheduler" not in plan
+            assert plan["scratch"]["fits"] is True
+            assert set(handler.methods) == {"HEAD"}  # Preflighted once, by the scheduler
+            assert len(handler.methods) == 2
+        finally:
+            server.shutdown()
+    print("✅ Scheduled explain passed")
+
+def main():
+    print("🧪 Explain Mode Tests")
+    print("=" * 40)
+    test_parse_explain()
+    test_explain_merge()
+    test_explain_concat()
+    test_scheduled_explain()
+    print("\n🎉 All explain mode tests passed!")
+
+if __name__ == "__main__":
+    main()
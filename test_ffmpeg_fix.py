@@ -7,37 +7,26 @@ This simulates the worker's FFmpeg verification process
 import subprocess
 import sys
 
-def verify_ffmpeg_installation():
-    """Verify FFmpeg is installed and working, install if needed"""
-    print("🔍 Testing FFmpeg availability...")
-    
+from merge_worker.ffmpeg import verify_ffmpeg_installation
+
+def test_ffmpeg_functionality():
+    """Run a tiny lavfi encode to make sure FFmpeg actually works"""
+    print("🧪 Testing FFmpeg functionality...")
     try:
-        # Test if ffmpeg command exists and works
-        result = subprocess.run(["ffmpeg", "-version"], 
-                               capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            print("✅ FFmpeg is available and working")
-            version_line = result.stdout.split('\n')[0]
-            print(f"Version: {version_line}")
-            
-            # Test a simple FFmpeg command
-            print("🧪 Testing FFmpeg functionality...")
-            test_result = subprocess.run([
-                "ffmpeg", "-f", "lavfi", "-i", "testsrc=duration=1:size=320x240:rate=1",
-                "-f", "null", "-"
-            ], capture_output=True, text=True, timeout=30)
-            
-            if test_result.returncode == 0:
-                print("✅ FFmpeg functionality test passed")
-                return True
-            else:
-                print(f"❌ FFmpeg functionality test failed: {test_result.stderr}")
-                return False
-                
-    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
+        test_result = subprocess.run([
+            "ffmpeg", "-f", "lavfi", "-i", "testsrc=duration=1:size=320x240:rate=1",
+            "-f", "null", "-"
+        ], capture_output=True, text=True, timeout=30)
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
         print(f"❌ FFmpeg not found or not working: {e}")
         return False
 
+    if test_result.returncode == 0:
+        print("✅ FFmpeg functionality test passed")
+        return True
+    print(f"❌ FFmpeg functionality test failed: {test_result.stderr}")
+    return False
+
 def test_video_merge_command():
     """Test the exact FFmpeg command used in the worker"""
     print("\n🎬 Testing video merge command format...")
@@ -86,7 +75,8 @@ def main():
     print("=" * 40)
     
     # Test 1: Basic FFmpeg availability
-    ffmpeg_ok = verify_ffmpeg_installation()
+    print("🔍 Testing FFmpeg availability...")
+    ffmpeg_ok = verify_ffmpeg_installation() and test_ffmpeg_functionality()
     
     if not ffmpeg_ok:
         print("\n💀 FFmpeg is not available. This would cause the worker to fail.")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for input integrity checks (streaming digests, MP4 structure check)
+"""
+
+import hashlib
+import http.server
+import os
+import struct
+import tempfile
+import threading
+
+from merge_worker import download, parsers, probe
+
+def make_box(box_type, payload=b""):
+    """Build a single ISO BMFF box"""
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+def write_file(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_mp4_structure_check():
+    """Complete files pass, truncated files and files without moov fail"""
+    print("🧪 Testing MP4 structure check...")
+    ftyp = make_box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2")
+    moov = make_box(b"moov", b"\x00" * 64)
+    mdat = make_box(b"mdat", b"\x01" * 4096)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        complete = write_file(tmp, "complete.mp4", ftyp + mdat + moov)
+        assert probe.check_iso_bmff_structure(complete) is True
+
+        truncated = write_file(tmp, "truncated.mp4", (ftyp + moov + mdat)[:-100])
+        try:
+            probe.check_iso_bmff_structure(truncated)
+            raise AssertionError("truncated file passed the check")
+        except ValueError as e:
+            assert "Truncated" in str(e)
+
+        no_moov = write_file(tmp, "no_moov.mp4", ftyp + mdat)
+        try:
+            probe.check_iso_bmff_structure(no_moov)
+            raise AssertionError("file without moov passed the check")
+        except ValueError as e:
+            assert "moov" in str(e)
+
+        mp3 = write_file(tmp, "audio.mp3", b"ID3" + b"\x00" * 100)
+        assert probe.check_iso_bmff_structure(mp3) is False
+
+    print("✅ MP4 structure check passed")
+
+def test_download_digests():
+    """Digests computed in the download loop match hashing the file afterwards"""
+    print("🧪 Testing streaming digests...")
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        write_file(tmp, "source.bin", data)
+
+        class QuietHandler(http.server.SimpleHTTPRequestHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=tmp, **kwargs)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/source.bin"
+
+        try:
+            expected = {"md5": hashlib.md5(data).hexdigest(), "size": len(data)}
+            info = download.fetch_input(url, os.path.join(tmp, "out.bin"), expected=expected)
+            assert info["size"] == len(data)
+            assert info["digests"]["sha256"] == hashlib.sha256(data).hexdigest()
+            assert info["digests"]["md5"] == expected["md5"]
+
+            try:
+                download.fetch_input(url, os.path.join(tmp, "bad.bin"), expected={"sha256": "0" * 64})
+                raise AssertionError("digest mismatch was not detected")
+            except ValueError as e:
+                assert "sha256 mismatch" in str(e)
+        finally:
+            server.shutdown()
+
+    print("✅ Streaming digests passed")
+
+def test_parse_expected():
+    """Both request formats carry per-input expectations"""
+    print("🧪 Testing expectation parsing...")
+    assert parsers.parse_expected({"sha256": "ABC", "size": "10"}) == {"sha256": "abc", "size": 10}
+    assert parsers.parse_expected({"video_md5": "ff", "audio_md5": "ee"}, "video_") == {"md5": "ff"}
+    print("✅ Expectation parsing passed")
+
+def main():
+    print("🧪 Input Integrity Tests")
+    print("=" * 40)
+    test_parse_expected()
+    test_mp4_structure_check()
+    test_download_digests()
+    print("\n🎉 All integrity tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent keyframe index (packet parsing, lookups, storage)
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from merge_worker import mediaindex
+
+PACKETS = """pts_time=0.000000|dts_time=-0.066667|pos=48|flags=K__
+pts_time=0.133333|dts_time=-0.033333|pos=9120|flags=___
+pts_time=N/A|dts_time=N/A|pos=N/A|flags=___
+pts_time=2.000000|dts_time=1.933333|pos=51200|flags=K__
+pts_time=2.066667|dts_time=2.000000|pos=60000|flags=__D
+pts_time=4.000000|dts_time=3.933333|pos=102400|flags=K__
+pts_time=6.000000|dts_time=5.933333|pos=150000|flags=K_D
+"""
+
+def sample_index():
+    count, times, offsets = mediaindex.parse_packets(PACKETS)
+    return {"version": mediaindex.INDEX_VERSION, "size": 200000, "duration": 7.0, "packets": count,
+            "probe": {"duration": 7.0, "bit_rate": 4_000_000,
+                      "video": {"codec_name": "h264", "width": "1280", "height": "720"}, "audio": None},
+            "keyframes": {"times": times, "offsets": offsets}}
+
+def test_parse_packets():
+    """Every packet is counted; keyframes keep their timestamp and byte offset"""
+    print("🧪 Testing packet parsing...")
+    count, times, offsets = mediaindex.parse_packets(PACKETS + "\n")
+    assert count == 7
+    assert times == [0.0, 2.0, 4.0, 6.0] and offsets == [48, 51200, 102400, 150000]
+    print("✅ Packet parsing passed")
+
+def test_lookups():
+    """Lookups bisect the keyframe list"""
+    print("🧪 Testing lookups...")
+    index = sample_index()
+    assert mediaindex.keyframe_at(index, 3.9) == (2.0, 51200)
+    assert mediaindex.keyframe_at(index, 4.0) == (4.0, 102400)
+    assert mediaindex.keyframe_at(index, -1) == (0.0, 48)
+    assert mediaindex.keyframe_after(index, 4.0) == (6.0, 150000)
+    assert mediaindex.keyframe_after(index, 6.5) is None
+    assert mediaindex.byte_range(index, 2.5, 3.0) == (51200, 102400)
+    assert mediaindex.byte_range(index, 5.0, 6.5) == (102400, 200000)  # runs to the end of the file
+    assert mediaindex.split_points(index, 3) == [4.0]
+    assert mediaindex.split_points(index, 2) == [2.0, 4.0, 6.0]
+    assert mediaindex.video_stream(index) == {"codec": "h264", "width": 1280, "height": 720, "bit_rate": 4_000_000}
+    print("✅ Lookups passed")
+
+def test_storage():
+    """Indexes round-trip by content identity; stale versions are ignored and old entries pruned"""
+    print("🧪 Testing storage...")
+    saved = mediaindex.MEDIA_INDEX_DIR, mediaindex.MEDIA_INDEX_MAX_ENTRIES
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            mediaindex.MEDIA_INDEX_DIR = Path(directory)
+            digest = "ab" * 32
+            assert mediaindex.load_index(f"sha256:{digest}") is None
+            mediaindex.store_index(f"sha256:{digest}", sample_index())
+            assert (Path(directory) / f"{digest}.json.gz").exists()
+            assert mediaindex.load_index(f"sha256:{digest}") == sample_index()
+            assert mediaindex.load_index(None) is None
+
+            mediaindex.store_index("file:/workspace/a.mp4:10:1", {**sample_index(), "version": 0})
+            assert mediaindex.load_index("file:/workspace/a.mp4:10:1") is None
+
+            mediaindex.MEDIA_INDEX_MAX_ENTRIES = 2
+            os.utime(Path(directory) / f"{digest}.json.gz", (1, 1))
+            mediaindex.store_index("file:/workspace/b.mp4:10:1", sample_index())
+            assert mediaindex.load_index(f"sha256:{digest}") is None  # least recently used
+            assert len(list(Path(directory).glob("*.json.gz"))) == 2
+        finally:
+            mediaindex.MEDIA_INDEX_DIR, mediaindex.MEDIA_INDEX_MAX_ENTRIES = saved
+    print("✅ Storage passed")
+
+def test_build_index():
+    """A real file is indexed once; the second lookup comes from the store"""
+    print("🧪 Testing index builds...")
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("⏭️  ffmpeg/ffprobe not installed, skipping")
+        return
+    saved = mediaindex.MEDIA_INDEX_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            mediaindex.MEDIA_INDEX_DIR = Path(directory) / "index"
+            video = os.path.join(directory, "clip.mp4")
+            subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i",
+                            "testsrc2=size=320x240:rate=25:duration=6", "-c:v", "libx264", "-g", "50", video],
+                           check=True)
+            links = Path(directory) / "links"
+            links.mkdir()
+            future = mediaindex.start_indexing(video, "file:clip", links)
+            assert len(list(links.iterdir())) == 1  # The scan reads its own link...
+            index = future.result()
+            assert not list(links.iterdir())  # ...and removes it when done
+            assert index["keyframes"]["times"] == [0.0, 2.0, 4.0] and index["packets"] == 150
+            assert index["probe"]["video"]["width"] == "320"
+            with open(video, "rb") as f:
+                f.seek(mediaindex.keyframe_at(index, 2.5)[1])
+                assert f.read(4)  # Offsets point inside the file
+            assert mediaindex.index_input("/nonexistent.mp4", "file:clip") == index
+            assert mediaindex.index_input("/nonexistent.mp4", "file:other") is None
+        finally:
+            mediaindex.MEDIA_INDEX_DIR = saved
+    print("✅ Index builds passed")
+
+def test_indexing_limits():
+    """Large inputs need force, and a full queue skips the input instead of waiting"""
+    print("🧪 Testing indexing limits...")
+    saved = mediaindex.MEDIA_INDEX_MAX_BYTES, mediaindex.MEDIA_INDEX_MAX_PENDING, mediaindex.index_input
+    with tempfile.TemporaryDirectory() as directory:
+        video = os.path.join(directory, "large.mp4")
+        with open(video, "wb") as f:
+            f.write(b"\0" * 1024)
+        try:
+            release = threading.Event()
+            mediaindex.index_input = lambda path, identity: release.wait(5)
+            mediaindex.MEDIA_INDEX_MAX_BYTES = 512
+            assert mediaindex.start_indexing(video, "file:large") is None
+            mediaindex.MEDIA_INDEX_MAX_PENDING = 1
+            first = mediaindex.start_indexing(video, "file:large", force=True)
+            assert first is not None
+            assert mediaindex.start_indexing(video, "file:other", force=True) is None  # Queue full
+            release.set()
+            first.result()
+            assert os.listdir(directory) == ["large.mp4"]
+        finally:
+            mediaindex.MEDIA_INDEX_MAX_BYTES, mediaindex.MEDIA_INDEX_MAX_PENDING, mediaindex.index_input = saved
+    print("✅ Indexing limits passed")
+
+def main():
+    print("🧪 Media Index Tests")
+    print("=" * 40)
+    test_parse_packets()
+    test_lookups()
+    test_storage()
+    test_build_index()
+    test_indexing_limits()
+    print("\n🎉 All media index tests passed!")
+
+if __name__ == "__main__":
+    main()
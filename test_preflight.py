@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script for input preflight (status, content type, size, disk admission)
+"""
+
+import http.server
+import tempfile
+import threading
+import time
+
+from merge_worker import preflight
+from merge_worker.handler import handle_job
+from merge_worker.parsers import parse_renditions
+
+MEDIA = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 4096
+
+class PreflightHandler(http.server.BaseHTTPRequestHandler):
+    """/ok.mp4 serves media, /page.html an error page, /head-forbidden.mp4 refuses HEAD,
+    /busy.mp4 is rate limited, anything else 403s"""
+    protocol_version = "HTTP/1.1"
+    head_requests = 0
+
+    def _respond(self, body):
+        if self.path == "/page.html":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+        elif self.path in ("/ok.mp4", "/head-forbidden.mp4"):
+            if self.command == "HEAD" and self.path == "/head-forbidden.mp4":
+                # Presigned URLs are signed for GET only
+                self.send_response(403)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            ranged = self.headers.get("Range") == "bytes=0-0"
+            self.send_response(206 if ranged else 200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Accept-Ranges", "bytes")
+            if ranged:
+                self.send_header("Content-Range", f"bytes 0-0/{len(MEDIA)}")
+                self.send_header("Content-Length", "1")
+                self.end_headers()
+                if body:
+                    self.wfile.write(MEDIA[:1])
+                return
+        elif self.path == "/busy.mp4":
+            self.send_response(429)
+        else:
+            self.send_response(403)
+        data = MEDIA if self.path.endswith(".mp4") else b"<html>Access denied</html>"
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        type(self).head_requests += 1
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def log_message(self, *args):
+        pass
+
+def serve():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PreflightHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def expect_error(url, kind="video", expected=None, contains=""):
+    try:
+        preflight.check_input(url, expected, kind)
+    except preflight.PreflightError as e:
+        assert contains in str(e), e
+        return str(e)
+    raise AssertionError(f"{url} passed preflight")
+
+def test_checks():
+    """Good inputs are sized, bad ones are rejected with a reason"""
+    print("🧪 Testing input checks...")
+    server, base = serve()
+    try:
+        check_inputs(base)
+    finally:
+        server.shutdown()
+    print("✅ Input checks passed")
+
+def check_inputs(base):
+    info = preflight.check_input(f"{base}/ok.mp4")
+    assert info["size"] == len(MEDIA) and info["ranges"] and not info["local"], info
+    info = preflight.check_input(f"{base}/head-forbidden.mp4")
+    assert info["size"] == len(MEDIA) and info["ranges"], info
+
+    # Rate limiting is retried by the download, so it doesn't fail the job here
+    info = preflight.check_input(f"{base}/busy.mp4", {"size": 123})
+    assert info["size"] == 123 and not info["ranges"], info
+
+    expect_error(f"{base}/missing.mp4", contains="HTTP 403")
+    expect_error(f"{base}/page.html", contains="text/html")
+    expect_error(f"{base}/ok.mp4", expected={"size": 1}, contains="expected 1")
+    expect_error("ftp://example.com/video.mp4", contains="invalid")
+    expect_error("http://127.0.0.1:1/video.mp4", contains="unreachable")
+    expect_error("/workspace/__missing__/video.mp4")
+
+def test_job_fails_fast():
+    """A job with a bad input returns an error in under a second, without retries"""
+    print("🧪 Testing fast failure...")
+    server, base = serve()
+    try:
+        with tempfile.TemporaryDirectory() as workspace:
+            event = {"input": {"video_url": f"{base}/ok.mp4", "audio_url": f"{base}/denied.mp3"}}
+            start = time.monotonic()
+            result = handle_job(event, {"workspace_dir": workspace, "parser_defaults": {}})
+            elapsed = time.monotonic() - start
+    finally:
+        server.shutdown()
+    assert result["error"].startswith("Preflight failed") and "HTTP 403" in result["error"], result
+    assert elapsed < 1.0, elapsed
+    print(f"✅ Fast failure passed ({elapsed * 1000:.0f} ms)")
+
+def test_disk_admission():
+    """Jobs that can't fit on the scratch disk are refused up front, counting running jobs' reservations"""
+    print("🧪 Testing disk admission...")
+    sizes = {"video": {"size": 100, "local": False}, "audio": {"size": 10, "local": True}}
+    assert preflight.required_disk_space(sizes) == 100 + 110
+    assert preflight.required_disk_space(sizes, 500) == 100 + 500
+    with tempfile.TemporaryDirectory() as tmp:
+        preflight.release_disk_space(preflight.reserve_disk_space(tmp, 1))
+        try:
+            preflight.reserve_disk_space(tmp, 1 << 60)
+        except preflight.PreflightError as e:
+            assert "scratch space" in str(e)
+        else:
+            raise AssertionError("an exabyte fit on the scratch disk")
+
+        # Each of two jobs fits alone, but not both at once
+        half = int(preflight.available_disk_space(tmp) * 0.6)
+        first = preflight.reserve_disk_space(tmp, half)
+        try:
+            preflight.reserve_disk_space(tmp, half)
+        except preflight.PreflightError as e:
+            assert "held by running jobs" in str(e)
+        else:
+            raise AssertionError("two jobs were admitted into space for one")
+        preflight.release_disk_space(first)
+        preflight.release_disk_space(preflight.reserve_disk_space(tmp, half))
+    print("✅ Disk admission passed")
+
+def test_rendition_sizing():
+    """Renditions are sized by type and bitrate, not as full copies of every input"""
+    print("🧪 Testing rendition sizing...")
+    gb = 1024 ** 3
+    sizes = {"video": {"size": 15 * gb, "local": False}, "audio": {"size": 10 * 1024 ** 2, "local": False}}
+    renditions = parse_renditions([{"name": "main"}, {"height": 1080}, {"height": 720}, {"type": "audio"},
+                                   {"type": "thumbnail"}], "out")
+    three_hours = preflight.output_space({"renditions": renditions}, sizes, duration=3 * 3600)
+    audio = 256_000 * 3 * 3600 / 8
+    expected = (15 * gb + audio) + (5_000_000 * 3 * 3600 / 8 + audio) + (3_000_000 * 3 * 3600 / 8 + audio) \
+        + audio + preflight.THUMBNAIL_BYTES
+    assert abs(three_hours - expected) < 8, (three_hours, expected)
+    needed = preflight.required_disk_space(sizes, three_hours)
+    assert needed < 50 * gb, needed / gb  # Five full copies of the inputs were 91 GB
+    assert preflight.output_space({"renditions": None}, sizes) == 15 * gb + 10 * 1024 ** 2
+    print("✅ Rendition sizing passed")
+
+def main():
+    print("🧪 Input Preflight Tests")
+    print("=" * 40)
+    test_checks()
+    test_job_fails_fast()
+    test_disk_admission()
+    test_rendition_sizing()
+    print("\n🎉 All preflight tests passed!")
+
+if __name__ == "__main__":
+    main()
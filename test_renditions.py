@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-rendition outputs produced in a single FFmpeg pass
+"""
+
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from merge_worker import parsers, planner
+
+def make_outputs():
+    """Original stream copy, 1080p/720p re-encodes, audio-only and a thumbnail"""
+    return [
+        {"options": [{"option": "-map", "argument": "0:v"}, {"option": "-c:v", "argument": "copy"}]},
+        {"height": 1080},
+        {"height": 720, "codec": "libx264"},
+        {"type": "audio"},
+        {"type": "thumbnail", "height": 360, "time": 30}
+    ]
+
+def test_parse_renditions():
+    """Outputs become named renditions with derived filenames"""
+    print("🧪 Testing rendition parsing...")
+    renditions = parsers.parse_renditions(make_outputs(), "audio-layering")
+    assert [r["filename"] for r in renditions] == [
+        "audio-layering.mp4", "audio-layering_1080p.mp4", "audio-layering_720p.mp4",
+        "audio-layering_audio.m4a", "audio-layering_thumbnail.jpg"
+    ]
+    assert renditions[0]["codec"] == "copy"
+    assert renditions[1]["codec"] == "auto" and renditions[1]["bitrate"] == "5M"
+    assert renditions[2]["bitrate"] == "3M"
+
+    for bad in ([{"height": 720, "codec": "copy"}], [{"type": "gif"}], [{}, {"name": "x"}, {"name": "x"}]):
+        try:
+            parsers.parse_renditions(bad, "job")
+            raise AssertionError(f"invalid outputs accepted: {bad}")
+        except ValueError:
+            pass
+    print("✅ Rendition parsing passed")
+
+def test_single_pass_command():
+    """Every rendition comes from one command with the inputs listed once"""
+    print("🧪 Testing single-pass command...")
+    renditions = parsers.parse_renditions(make_outputs(), "job")
+    cmd = planner.build_rendition_command("video.mp4", "audio.mp3", "/out", renditions, 0.7,
+                                         gpu_acceleration=True, use_nvenc=True, gpu_available=True)
+
+    assert cmd.count("-i") == 2
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "[1:a:0]volume=0.7,asplit=4" in graph
+    assert "[0:v:0]split=3" in graph
+    assert "scale=-2:1080" in graph and "scale=-2:720" in graph
+    assert "select='gte(t,30.0)'" in graph
+    assert "h264_nvenc" in cmd and "libx264" in cmd
+    for name in ("job.mp4", "job_1080p.mp4", "job_720p.mp4", "job_audio.m4a", "job_thumbnail.jpg"):
+        assert f"/out/{name}" in cmd
+    print("✅ Single-pass command passed")
+
+def test_copy_only_skips_decode():
+    """Without re-encodes or thumbnails the video is never decoded"""
+    print("🧪 Testing copy-only renditions...")
+    renditions = parsers.parse_renditions([{}, {"type": "audio"}], "job")
+    cmd = planner.build_rendition_command("video.mp4", "audio.mp3", "/out", renditions,
+                                         gpu_acceleration=True, gpu_available=True)
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "[0:v" not in graph
+    assert "-hwaccel" not in cmd
+    print("✅ Copy-only renditions passed")
+
+def test_exact_duration_replaces_shortest():
+    """Probed durations give an explicit -t and loop only the short input"""
+    print("🧪 Testing duration planning...")
+    timing = planner.plan_timing(10800, 480)
+    assert timing == {"duration": 10800, "loop_video": False, "loop_audio": True, "fade_in": 0.0, "fade_out": 0.0}
+    assert planner.plan_timing(10800, 480, loop_audio=False)["loop_audio"] is False
+    assert planner.plan_timing(60, 900, requested_duration=600)["loop_video"] is True
+    assert planner.plan_timing(None, 480) is None
+
+    renditions = parsers.parse_renditions([{}, {"type": "audio"}], "job")
+    cmd = planner.build_rendition_command("video.mp4", "audio.mp3", "/out", renditions, timing=timing)
+    assert "-shortest" not in cmd
+    audio_input = cmd.index("audio.mp3")
+    assert cmd[audio_input - 5:audio_input] == ["-stream_loop", "-1", "-t", "10800.000", "-i"]
+
+    fallback = planner.build_merge_command("video.mp4", "audio.mp3", "/out/job.mp4")
+    assert "-shortest" in fallback
+    print("✅ Duration planning passed")
+
+def test_thumbnail_past_the_end():
+    """A thumbnail time beyond the output is clamped, so a frame is still written"""
+    print("🧪 Testing past-the-end thumbnail...")
+    renditions = parsers.parse_renditions([{}, {"type": "thumbnail", "height": 90, "time": 30}], "job")
+    timing = planner.plan_timing(4, 4)
+    cmd = planner.build_rendition_command("video.mp4", "audio.mp3", "/out", renditions, timing=timing)
+    assert "select='gte(t,3.0)'" in cmd[cmd.index("-filter_complex") + 1]
+
+    if not shutil.which("ffmpeg"):
+        print("⏭️  Skipped encode - ffmpeg not installed")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        video, audio = str(Path(tmp, "video.mp4")), str(Path(tmp, "audio.m4a"))
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=160x90:rate=10:duration=4",
+                        "-c:v", "libx264", "-pix_fmt", "yuv420p", video], check=True)
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "sine=duration=4", "-c:a", "aac", audio],
+                       check=True)
+        cmd = planner.build_rendition_command(video, audio, tmp, renditions, timing=timing)
+        subprocess.run(cmd, check=True, capture_output=True)
+        assert Path(tmp, "job_thumbnail.jpg").stat().st_size > 0
+    print("✅ Past-the-end thumbnail passed")
+
+def main():
+    print("🧪 Multi-Rendition Tests")
+    print("=" * 40)
+    test_parse_renditions()
+    test_single_pass_command()
+    test_copy_only_skips_decode()
+    test_exact_duration_replaces_shortest()
+    test_thumbnail_past_the_end()
+    print("\n🎉 All rendition tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for the output deduplication cache
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from merge_worker import cache, costmodel, download, ffmpeg, mediaindex
+from merge_worker.handler import handle_job
+from merge_worker.planner import partial_output_path
+
+def make_output(directory, name, size=1024):
+    path = Path(directory) / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+def test_cache_key_is_canonical():
+    """Output names and download tuning don't change the key, volume does"""
+    print("🧪 Testing cache key normalization...")
+    params = {"volume": 0.7, "gpu_acceleration": True, "use_nvenc": True,
+              "output_filename": "a.mp4", "gpu_optimized": True}
+    renamed = dict(params, output_filename="b.mp4", gpu_optimized=False)
+    louder = dict(params, volume=1.0)
+
+    key = cache.result_cache_key(params, "sha256:aa", "sha256:bb")
+    assert key == cache.result_cache_key(renamed, "sha256:aa", "sha256:bb")
+    assert key != cache.result_cache_key(louder, "sha256:aa", "sha256:bb")
+    assert key != cache.result_cache_key(params, "sha256:aa", "sha256:cc")
+    assert cache.result_cache_key(params, None, "sha256:bb") is None
+    print("✅ Cache key normalization passed")
+
+def test_store_and_hit():
+    """A stored result is restored to a new output path and counts hits"""
+    print("🧪 Testing cache store and hit...")
+    old_dir = cache.RESULT_CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        cache.RESULT_CACHE_DIR = Path(tmp) / "cache"
+        output = make_output(tmp, "first.mp4")
+        response = {"success": True, "output_path": str(output), "output_filename": output.name,
+                    "response": {"file_url": str(output)}}
+
+        assert cache.lookup_cached_result("k1", [Path(tmp) / "miss.mp4"]) is None
+        cache.store_cached_result("k1", [output], response)
+
+        second = Path(tmp) / "second.mp4"
+        hit = cache.lookup_cached_result("k1", [second])
+        assert hit["cache"]["hit"] is True and hit["cache"]["hits"] == 1
+        assert hit["output_path"] == str(second)
+        assert hit["output_filename"] == "second.mp4"
+        assert hit["response"]["file_url"] == str(second)
+        assert second.read_bytes() == output.read_bytes()
+
+        hit = cache.lookup_cached_result("k1", [Path(tmp) / "third.mp4"])
+        assert hit["cache"]["hits"] == 2
+        index = cache._load_cache_index()
+        assert index["stats"] == {"hits": 2, "misses": 1}
+        cache.RESULT_CACHE_DIR = old_dir
+    print("✅ Cache store and hit passed")
+
+def test_partial_outputs():
+    """Jobs sharing an output path each cache their own file, published afterwards"""
+    print("🧪 Testing partial outputs...")
+    old_dir = cache.RESULT_CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            cache.RESULT_CACHE_DIR = Path(tmp) / "cache"
+            output = Path(tmp) / "add-music-short.mp4"
+            first, second = partial_output_path(output, "job1"), partial_output_path(output, "job2")
+            assert first.parent == output.parent and first.suffix == ".mp4" and first != second
+            first.write_bytes(b"first job")
+            second.write_bytes(b"second job, still encoding")
+
+            # The second job publishes over the first one's output - the cache keeps the first job's bytes
+            cache.store_cached_result("k1", [output], {"output_path": str(output)}, sources=[first])
+            os.replace(first, output)
+            os.replace(second, output)
+            assert output.read_bytes() == b"second job, still encoding"
+            hit = cache.lookup_cached_result("k1", [Path(tmp) / "again.mp4"])
+            assert (Path(tmp) / "again.mp4").read_bytes() == b"first job"
+            assert hit["output_path"] == str(Path(tmp) / "again.mp4")
+        finally:
+            cache.RESULT_CACHE_DIR = old_dir
+    print("✅ Partial outputs passed")
+
+def test_eviction():
+    """Expired entries and entries beyond the size cap are evicted"""
+    print("🧪 Testing cache eviction...")
+    old_dir, old_ttl, old_max = cache.RESULT_CACHE_DIR, cache.RESULT_CACHE_TTL, cache.RESULT_CACHE_MAX_BYTES
+    with tempfile.TemporaryDirectory() as tmp:
+        cache.RESULT_CACHE_DIR = Path(tmp) / "cache"
+        try:
+            cache.RESULT_CACHE_MAX_BYTES = 2500
+            for name in ("a", "b", "c"):
+                output = make_output(tmp, f"{name}.mp4", size=1000)
+                cache.store_cached_result(name, [output], {"response": {}})
+                time.sleep(0.01)
+            entries = cache._load_cache_index()["entries"]
+            assert sorted(entries) == ["b", "c"], sorted(entries)
+            assert not (cache.RESULT_CACHE_DIR / "a").exists()
+
+            cache.RESULT_CACHE_TTL = 0
+            time.sleep(0.01)
+            assert cache.lookup_cached_result("c", [Path(tmp) / "out.mp4"]) is None
+            assert cache._load_cache_index()["entries"] == {}
+        finally:
+            cache.RESULT_CACHE_DIR = old_dir
+            cache.RESULT_CACHE_TTL, cache.RESULT_CACHE_MAX_BYTES = old_ttl, old_max
+    print("✅ Cache eviction passed")
+
+def test_missing_artifact_not_cached():
+    """A job whose thumbnail failed isn't cached; the next complete run is, and then hits"""
+    print("🧪 Testing results missing an artifact...")
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("⏭️  Skipped - ffmpeg/ffprobe not installed")
+        return
+    saved = cache.RESULT_CACHE_DIR, download.VOLUME_ROOTS, mediaindex.MEDIA_INDEX_DIR, ffmpeg.generate_thumbnail
+    saved_stats = costmodel.ENCODER_STATS_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            cache.RESULT_CACHE_DIR = Path(tmp) / "cache"
+            costmodel.ENCODER_STATS_PATH = Path(tmp) / "encoder_stats.json"
+            mediaindex.MEDIA_INDEX_DIR = Path(tmp) / "index"
+            download.VOLUME_ROOTS = (os.path.realpath(tmp),)
+            subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi",
+                            "-i", "testsrc=size=160x90:rate=10:duration=3", "-c:v", "libx264",
+                            "-pix_fmt", "yuv420p", str(Path(tmp, "video.mp4"))], check=True)
+            subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "sine=duration=3", "-c:a", "aac",
+                            str(Path(tmp, "music.m4a"))], check=True)
+            event = {"input": {"video_url": "video.mp4", "audio_url": "music.m4a", "output_filename": "out.mp4",
+                               "use_nvenc": False, "thumbnail_time": 1}}
+            config = {"workspace_dir": str(Path(tmp, "workspace")), "parser_defaults": {}}
+
+            def failing_thumbnail(*args, **kwargs):
+                raise subprocess.CalledProcessError(1, "ffmpeg", stderr="no frame")
+            ffmpeg.generate_thumbnail = failing_thumbnail
+            result = handle_job(event, config)
+            assert result["success"] and result["response"]["thumbnail_url"] == result["output_path"], result
+            assert cache._load_cache_index()["entries"] == {}
+
+            ffmpeg.generate_thumbnail = saved[3]
+            result = handle_job(event, config)
+            assert result["response"]["thumbnail_url"].endswith("out_thumb.jpg") and result["cache"]["hit"] is False
+            result = handle_job(event, config)
+            assert result["cache"]["hit"] is True and result["response"]["thumbnail_url"].endswith("out_thumb.jpg")
+        finally:
+            cache.RESULT_CACHE_DIR, download.VOLUME_ROOTS, mediaindex.MEDIA_INDEX_DIR, ffmpeg.generate_thumbnail = saved
+            costmodel.ENCODER_STATS_PATH = saved_stats
+    print("✅ Results missing an artifact passed")
+
+def main():
+    print("🧪 Result Cache Tests")
+    print("=" * 40)
+    test_cache_key_is_canonical()
+    test_store_and_hit()
+    test_partial_outputs()
+    test_eviction()
+    test_missing_artifact_not_cached()
+    print("\n🎉 All result cache tests passed!")
+
+if __name__ == "__main__":
+    main()
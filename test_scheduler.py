@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test script for the fast/slow lane job scheduler
+"""
+
+import asyncio
+import http.server
+import os
+import tempfile
+import threading
+
+from merge_worker import download, scheduler
+
+def job_params(video_url, audio_url, **extra):
+    return {"video_url": video_url, "audio_url": audio_url, "use_nvenc": False, **extra}
+
+def test_cost_estimate():
+    """HEAD sizes and declared sizes classify jobs, unknown sizes go to the slow lane"""
+    print("🧪 Testing cost estimate...")
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "clip.mp4"), "wb") as f:
+            f.write(os.urandom(256 * 1024))
+
+        class QuietHandler(http.server.SimpleHTTPRequestHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=tmp, **kwargs)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            cheap = scheduler.estimate_job_cost(job_params(f"{base}/clip.mp4", f"{base}/clip.mp4"))
+            assert cheap["input_bytes"] == 2 * 256 * 1024
+            assert cheap["lane"] == "fast" and cheap["encoder"] == "copy"
+
+            missing = scheduler.estimate_job_cost(job_params(f"{base}/clip.mp4", f"{base}/missing.mp3"))
+            assert missing["seconds"] is None and missing["lane"] == "slow"
+        finally:
+            server.shutdown()
+
+    # 3 hours of video declared up front - no request needed to know it's long
+    big = {"size": 20 * 1024 ** 3}
+    long_job = scheduler.estimate_job_cost(job_params("http://example.invalid/v.mp4", "http://example.invalid/a.mp3",
+                                                      video_expected=big, audio_expected={"size": 1024}))
+    assert long_job["lane"] == "slow" and long_job["seconds"] > scheduler.FAST_LANE_MAX_SECONDS
+    print("✅ Cost estimate passed")
+
+def test_fast_lane_bypasses_long_job():
+    """A cheap job finishes while a long one holds the only slow slot"""
+    print("🧪 Testing lane scheduling...")
+    jobs = scheduler.JobScheduler(fast_slots=1, slow_slots=1)
+    release = threading.Event()
+    finished = []
+
+    def long_job():
+        release.wait(5)
+        finished.append("long")
+        return {"success": True}
+
+    def short_job():
+        finished.append("short")
+        return {"success": True}
+
+    slow = {"seconds": 3600.0, "lane": "slow", "input_bytes": 0, "duration": 10800, "encoder": "libx264"}
+    fast = {"seconds": 1.0, "lane": "fast", "input_bytes": 0, "duration": 10, "encoder": "copy"}
+    original = scheduler.estimate_job_cost
+
+    async def scenario():
+        scheduler.estimate_job_cost = lambda params: slow if params["name"] == "long" else fast
+        long_task = asyncio.create_task(jobs.run({"name": "long"}, long_job))
+        await asyncio.sleep(0.1)
+        second_long = asyncio.create_task(jobs.run({"name": "long"}, long_job))
+        await asyncio.sleep(0.1)
+
+        status = jobs.status()
+        assert status["slow"]["running"] == 1 and status["slow"]["queued"] == 1
+        assert status["slow"]["estimated_wait_s"] > 3500
+        assert status["fast"]["estimated_wait_s"] == 0
+
+        short_result = await asyncio.wait_for(jobs.run({"name": "short"}, short_job), 2)
+        assert finished == ["short"]
+        assert short_result["scheduler"]["lane"] == "fast"
+        release.set()
+        results = await asyncio.gather(long_task, second_long)
+        assert results[1]["scheduler"]["queue_wait_s"] > 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        scheduler.estimate_job_cost = original
+    assert jobs.status()["slow"] == {"slots": 1, "running": 0, "queued": 0, "estimated_wait_s": 0.0}
+    assert jobs.concurrency_modifier(1) == 2 + jobs.max_queued
+    print("✅ Lane scheduling passed")
+
+def test_status_request():
+    """scheduler_status returns queue state without running a job"""
+    print("🧪 Testing status request...")
+    handler = scheduler.make_scheduled_handler({})
+    result = asyncio.run(handler({"input": {"scheduler_status": True}}))
+    assert set(result["scheduler"]) == {"fast", "slow"}
+    print("✅ Status request passed")
+
+def test_bad_jobs_skip_the_queue():
+    """Malformed jobs and scheduling failures come back as errors without taking a lane"""
+    print("🧪 Testing bad jobs...")
+    handler = scheduler.make_scheduled_handler({})
+    result = asyncio.run(handler({"input": {"audio_url": "https://example.com/a.mp3"}}))
+    assert result == {"error": "Both video_url and audio_url are required"}, result
+    result = asyncio.run(handler({"input": {"clips": []}}))
+    assert result["error"].startswith("Processing failed") and "non-empty" in result["error"], result
+    assert "scheduler" not in result  # Never placed on a lane
+
+    class BrokenScheduler(scheduler.JobScheduler):
+        async def run(self, params, job):
+            raise RuntimeError("estimate exploded")
+
+    handler = scheduler.make_scheduled_handler({}, BrokenScheduler())
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("v.mp4", "a.mp3"):
+            with open(os.path.join(tmp, name), "wb") as f:
+                f.write(b"\0" * 1024)
+        # Volume inputs preflight without a server
+        saved, download.VOLUME_ROOTS = download.VOLUME_ROOTS, (os.path.realpath(tmp),)
+        try:
+            result = asyncio.run(handler({"input": {"video_url": "v.mp4", "audio_url": "a.mp3"}}))
+        finally:
+            download.VOLUME_ROOTS = saved
+    assert result == {"error": "Processing failed: estimate exploded"}, result
+    print("✅ Bad jobs passed")
+
+def main():
+    print("🧪 Scheduler Tests")
+    print("=" * 40)
+    test_cost_estimate()
+    test_fast_lane_bypasses_long_job()
+    test_status_request()
+    test_bad_jobs_skip_the_queue()
+    print("\n🎉 All scheduler tests passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for volume inputs - path resolution and zero-copy materialization
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from merge_worker import download
+
+def volume_roots(*roots):
+    """Point VOLUME_ROOTS at temporary directories, returning the old value"""
+    saved = download.VOLUME_ROOTS
+    download.VOLUME_ROOTS = tuple(os.path.realpath(root) for root in roots)
+    return saved
+
+def expect_error(error_type, fragment, func, *args):
+    try:
+        func(*args)
+    except error_type as e:
+        assert fragment in str(e), e
+    else:
+        raise AssertionError(f"{func.__name__}{args} did not raise {error_type.__name__}")
+
+def test_resolve_local_path():
+    """file:// URLs, absolute and volume-relative paths resolve; remote URLs don't"""
+    print("🧪 Testing local path resolution...")
+    with tempfile.TemporaryDirectory() as volume, tempfile.TemporaryDirectory() as outside:
+        saved = volume_roots(volume)
+        try:
+            root = download.VOLUME_ROOTS[0]
+            Path(root, "masters").mkdir()
+            Path(root, "masters", "video.mp4").write_bytes(b"video")
+            Path(outside, "secret.mp4").write_bytes(b"secret")
+            expected = os.path.join(root, "masters", "video.mp4")
+
+            assert download.resolve_local_path(f"file://{expected}") == expected
+            assert download.resolve_local_path(expected) == expected
+            assert download.resolve_local_path("masters/video.mp4") == expected
+            assert download.resolve_local_path("https://example.com/video.mp4") is None
+            assert download.resolve_local_path("") is None
+
+            # A missing file on the volume
+            expect_error(FileNotFoundError, "not found on volume", download.resolve_local_path,
+                         f"file://{root}/masters/missing.mp4")
+            # Paths outside the volume roots, directly or through ..
+            expect_error(ValueError, "must live under", download.resolve_local_path,
+                         f"{outside}/secret.mp4")
+            expect_error(ValueError, "must live under", download.resolve_local_path,
+                         f"file://{outside}/secret.mp4")
+            expect_error(ValueError, "must live under", download.resolve_local_path,
+                         os.path.relpath(Path(outside, "secret.mp4"), root))
+            # A URL missing its scheme is looked up on the volume and says so
+            expect_error(FileNotFoundError, "no URL scheme", download.resolve_local_path,
+                         "example.com/video.mp4")
+            expect_error(FileNotFoundError, "no URL scheme", download.resolve_local_path,
+                         "https:/example.com/video.mp4")
+        finally:
+            download.VOLUME_ROOTS = saved
+    print("✅ Local path resolution passed")
+
+def test_materialize_hardlink():
+    """A volume file on the workspace's filesystem is hardlinked, not copied"""
+    print("🧪 Testing hardlink materialization...")
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = Path(tmp, "source.mp4"), Path(tmp, "target.mp4")
+        source.write_bytes(os.urandom(64 * 1024))
+        target.write_bytes(b"stale")  # Left over from an earlier attempt
+
+        assert download.materialize_local_file(str(source), str(target)) == "hardlink"
+        assert os.path.samefile(source, target) and source.stat().st_nlink == 2
+    print("✅ Hardlink materialization passed")
+
+def test_materialize_across_filesystems():
+    """Across filesystems the hardlink fails and the file is copied"""
+    print("🧪 Testing cross-filesystem materialization...")
+    if not os.path.isdir("/dev/shm"):
+        print("⏭️  Skipped - no /dev/shm")
+        return
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as volume, tempfile.TemporaryDirectory() as workspace:
+        if os.stat(volume).st_dev == os.stat(workspace).st_dev:
+            print("⏭️  Skipped - /dev/shm is on the same filesystem as the workspace")
+            return
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        source, target = Path(volume, "source.mp4"), Path(workspace, "target.mp4")
+        source.write_bytes(data)
+
+        method = download.materialize_local_file(str(source), str(target))
+        assert method in ("reflink", "kernel_copy", "copy"), method
+        assert target.read_bytes() == data and not os.path.samefile(source, target)
+        assert source.stat().st_nlink == 1
+    print(f"✅ Cross-filesystem materialization passed ({method})")
+
+def test_fetch_volume_input():
+    """fetch_input uses volume files in place and verifies them only when asked"""
+    print("🧪 Testing volume fetch...")
+    with tempfile.TemporaryDirectory() as volume, tempfile.TemporaryDirectory() as workspace:
+        saved = volume_roots(volume)
+        try:
+            Path(volume, "clip.mp4").write_bytes(b"x" * 1000)
+            target = os.path.join(workspace, "clip.mp4")
+
+            info = download.fetch_input("clip.mp4", target)
+            assert info["method"] == "hardlink" and info["size"] == 1000 and info["digests"] == {}
+            info = download.fetch_input("clip.mp4", target, expected={"sha256": "00" * 32})
+        except ValueError as e:
+            assert "sha256 mismatch" in str(e)
+        else:
+            raise AssertionError("a wrong sha256 was accepted")
+        finally:
+            download.VOLUME_ROOTS = saved
+    print("✅ Volume fetch passed")
+
+def main():
+    print("🧪 Volume Input Tests")
+    print("=" * 40)
+    test_resolve_local_path()
+    test_materialize_hardlink()
+    test_materialize_across_filesystems()
+    test_fetch_volume_input()
+    print("\n🎉 All volume input tests passed!")
+
+if __name__ == "__main__":
+    main()
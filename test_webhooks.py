@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Test script for completion webhooks and the polling client, against local HTTP servers
+"""
+
+import asyncio
+import http.server
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+from merge_worker import client, webhooks
+from merge_worker.ffmpeg import run_ffmpeg
+from merge_worker.handler import ffmpeg_progress, make_handler
+from merge_worker.parsers import parse_simple_format
+from merge_worker.scheduler import make_scheduled_handler
+
+SECRET = "test-secret"
+
+class Receiver(http.server.BaseHTTPRequestHandler):
+    """Records webhook POSTs, answering with the next scripted status; inputs are 404s"""
+    statuses = []
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.append({"headers": dict(self.headers), "body": body, "json": json.loads(body)})
+        self.send_response(self.statuses.pop(0) if self.statuses else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, *args):
+        pass
+
+def serve(handler):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def receiver(statuses=()):
+    handler = type("Handler", (Receiver,), {"statuses": list(statuses), "received": []})
+    server, url = serve(handler)
+    return server, handler, f"{url}/hook"
+
+def test_signatures():
+    """Signatures cover the timestamp and body, and stale ones are refused"""
+    print("🧪 Testing signatures...")
+    body = b'{"id":"job-1"}'
+    now = int(time.time())
+    signature = webhooks.sign(SECRET, str(now), body)
+    assert signature.startswith("sha256=")
+    assert webhooks.verify_signature(SECRET, body, str(now), signature)
+    assert not webhooks.verify_signature(SECRET, body + b" ", str(now), signature)
+    assert not webhooks.verify_signature("other", body, str(now), signature)
+    assert not webhooks.verify_signature(SECRET, body, str(now), signature, now=now + 600)
+    assert not webhooks.verify_signature(SECRET, body, "soon", signature)
+    print("✅ Signatures passed")
+
+def test_delivery_retries():
+    """Server errors are retried with the same delivery id; other 4xx are not"""
+    print("🧪 Testing delivery retries...")
+    saved = webhooks.WEBHOOK_BACKOFF
+    webhooks.WEBHOOK_BACKOFF = 0.01
+    try:
+        server, handler, url = receiver([500, 503, 200])
+        assert webhooks.deliver(url, {"id": "job-1"}, "completed", secret=SECRET)
+        deliveries = {r["headers"]["X-Merge-Delivery"] for r in handler.received}
+        assert len(handler.received) == 3 and len(deliveries) == 1
+        headers, body = handler.received[-1]["headers"], handler.received[-1]["body"]
+        assert headers["X-Merge-Event"] == "completed"
+        assert webhooks.verify_signature(SECRET, body, headers["X-Merge-Timestamp"], headers["X-Merge-Signature"])
+        server.shutdown()
+
+        server, handler, url = receiver([410])
+        assert not webhooks.deliver(url, {"id": "job-1"}, "completed", secret=SECRET)
+        assert len(handler.received) == 1
+        server.shutdown()
+
+        server, handler, url = receiver([429, 500, 500])
+        assert not webhooks.deliver(url, {"id": "job-1"}, "completed", attempts=3, secret="")
+        assert len(handler.received) == 3 and "X-Merge-Signature" not in handler.received[0]["headers"]
+        server.shutdown()
+    finally:
+        webhooks.WEBHOOK_BACKOFF = saved
+    print("✅ Delivery retries passed")
+
+def test_progress_throttling():
+    """Progress events go out at most once per interval, and only when asked for"""
+    print("🧪 Testing progress throttling...")
+    server, handler, url = receiver()
+    notifier = webhooks.WebhookNotifier({"url": url, "progress": True}, "job-2")
+    for stage in ("downloading", "encoding", "muxing"):
+        notifier.progress({"stage": stage})
+    quiet = webhooks.WebhookNotifier({"url": url, "progress": False}, "job-3")
+    quiet.progress({"stage": "encoding"})
+    time.sleep(0.3)
+    assert [r["json"]["progress"]["stage"] for r in handler.received] == ["downloading"]
+    assert handler.received[0]["json"]["status"] == "IN_PROGRESS"
+    server.shutdown()
+    print("✅ Progress throttling passed")
+
+def test_ffmpeg_progress():
+    """FFmpeg's -progress stream becomes webhook progress events with a position and percentage"""
+    print("🧪 Testing FFmpeg progress events...")
+    server, handler, url = receiver()
+    saved = webhooks.WEBHOOK_PROGRESS_INTERVAL
+    try:
+        webhooks.WEBHOOK_PROGRESS_INTERVAL = 0
+        params = {"webhook": {"url": url, "progress": True}}
+        forward = ffmpeg_progress({"id": "job-4"}, params, "encoding", duration=8.0)
+        forward({"out_seconds": 2.0, "speed": 40.0})
+        forward({"out_seconds": None, "speed": None})  # Before the first frame
+        time.sleep(0.3)
+        progress = sorted((r["json"]["progress"] for r in handler.received), key=lambda p: p["seconds"] or 0)
+        assert progress[1] == {"stage": "encoding", "seconds": 2.0, "percent": 25.0, "speed": 40.0}, progress
+        assert progress[0]["percent"] is None
+        # Joins of clips with an unknown length report a position without a percentage
+        handler.received.clear()
+        ffmpeg_progress({"id": "job-5"}, params, "joining", None)({"out_seconds": 3.0, "speed": 90.0})
+        time.sleep(0.3)
+        assert handler.received[0]["json"]["progress"]["percent"] is None
+        # Nothing to report to - no callback, so FFmpeg's output isn't parsed
+        assert ffmpeg_progress({}, {"webhook": {"url": url, "progress": False}}, "encoding") is None
+        assert ffmpeg_progress({}, {"webhook": None}, "encoding") is None
+
+        if not shutil.which("ffmpeg"):
+            print("⏭️  ffmpeg not installed, skipping the live run")
+            return
+        updates = []
+        with tempfile.TemporaryDirectory() as tmp:
+            speed = run_ffmpeg(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi",
+                                "-i", "testsrc2=size=320x240:rate=25:duration=8", "-c:v", "libx264",
+                                "-preset", "ultrafast", f"{tmp}/out.mp4"], on_progress=updates.append)
+        assert updates and speed is not None
+        assert abs(updates[-1]["out_seconds"] - 8) < 0.2, updates[-1]
+        assert [u["out_seconds"] or 0 for u in updates] == sorted(u["out_seconds"] or 0 for u in updates)
+    finally:
+        webhooks.WEBHOOK_PROGRESS_INTERVAL = saved
+        server.shutdown()
+    print("✅ FFmpeg progress events passed")
+
+def test_parse_webhook():
+    """webhook_url is validated and carried in the parsed job"""
+    print("🧪 Testing webhook parsing...")
+    params = parse_simple_format({"video_url": "v.mp4", "audio_url": "a.mp3",
+                                  "webhook_url": "https://example.com/hook", "webhook_progress": True})
+    assert params["webhook"] == {"url": "https://example.com/hook", "progress": True}
+    assert parse_simple_format({"video_url": "v.mp4", "audio_url": "a.mp3"})["webhook"] is None
+    try:
+        parse_simple_format({"video_url": "v.mp4", "audio_url": "a.mp3", "webhook_url": "ftp://example.com"})
+    except ValueError as e:
+        assert "webhook_url" in str(e)
+    else:
+        raise AssertionError("ftp webhook accepted")
+    print("✅ Webhook parsing passed")
+
+def test_handlers_send_results():
+    """Both handlers POST the job's final result, failures included"""
+    print("🧪 Testing handler webhooks...")
+    saved = webhooks.WEBHOOK_SECRET
+    webhooks.WEBHOOK_SECRET = SECRET
+    server, handler, url = receiver()
+    try:
+        with tempfile.TemporaryDirectory() as workspace:
+            config = {"workspace_dir": workspace, "parser_defaults": {}}
+            result = make_handler(config)({"id": "job-4", "input": {"audio_url": "a.mp3", "webhook_url": url}})
+            assert "error" in result
+            sent = handler.received[-1]
+            assert sent["json"] == {"id": "job-4", "event": "failed", "status": "FAILED", "output": result,
+                                    "error": result["error"]}
+            assert webhooks.verify_signature(SECRET, sent["body"], sent["headers"]["X-Merge-Timestamp"],
+                                             sent["headers"]["X-Merge-Signature"])
+
+            # Inputs that 404 fail the scheduler's preflight - the webhook still hears about it
+            inputs = url.replace("/hook", "")
+            scheduled = make_scheduled_handler(config)
+            result = asyncio.run(scheduled({"id": "job-5", "input": {
+                "video_url": f"{inputs}/video.mp4", "audio_url": f"{inputs}/audio.mp3", "webhook_url": url}}))
+            assert result["error"].startswith("Preflight failed")
+            assert handler.received[-1]["json"]["id"] == "job-5"
+            assert handler.received[-1]["json"]["event"] == "failed"
+    finally:
+        webhooks.WEBHOOK_SECRET = saved
+        server.shutdown()
+    print("✅ Handler webhooks passed")
+
+class StatusServer(http.server.BaseHTTPRequestHandler):
+    """Fake RunPod API: /run queues a job, /status walks through scripted statuses"""
+    statuses = []
+    polls = []
+
+    def do_POST(self):
+        self._json({"id": "job-6", "status": "IN_QUEUE"})
+
+    def do_GET(self):
+        self.polls.append((time.monotonic(), self.path, self.headers["Authorization"]))
+        self._json(self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0])
+
+    def _json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_polling_client():
+    """The client polls with growing intervals until the job finishes"""
+    print("🧪 Testing polling client...")
+    assert client.endpoint_base("https://api.runpod.ai/v2/abc/run") == "https://api.runpod.ai/v2/abc"
+    intervals = client.poll_intervals(1.0, maximum=8.0, jitter=0)
+    assert [next(intervals) for _ in range(6)] == [1.0, 2.0, 4.0, 8.0, 8.0, 8.0]
+
+    statuses = [{"status": "IN_QUEUE"}, {"status": "IN_PROGRESS"}, {"status": "IN_PROGRESS"},
+                {"status": "COMPLETED", "output": {"success": True}}]
+    handler = type("Handler", (StatusServer,), {"statuses": statuses, "polls": []})
+    server, url = serve(handler)
+    try:
+        seen = []
+        start = time.monotonic()
+        final = client.run_job(f"{url}/run", "key", {"input": {}}, initial_interval=0.05, on_status=seen.append)
+        assert final["output"] == {"success": True} and len(seen) == 4
+        assert handler.polls[0][1] == "/status/job-6" and handler.polls[0][2] == "Bearer key"
+        gaps = [later[0] - earlier[0] for earlier, later in zip(handler.polls, handler.polls[1:])]
+        assert handler.polls[0][0] - start < 0.5 and gaps[-1] > gaps[0]
+
+        handler.statuses[:] = [{"status": "IN_PROGRESS"}]
+        try:
+            client.wait_for_job(url, "key", "job-6", timeout=0.3, initial_interval=0.05)
+        except TimeoutError as e:
+            assert "IN_PROGRESS" in str(e)
+        else:
+            raise AssertionError("unfinished job did not time out")
+    finally:
+        server.shutdown()
+    print("✅ Polling client passed")
+
+def main():
+    print("🧪 Webhook Tests")
+    print("=" * 40)
+    test_signatures()
+    test_delivery_retries()
+    test_progress_throttling()
+    test_ffmpeg_progress()
+    test_parse_webhook()
+    test_handlers_send_results()
+    test_polling_client()
+    print("\n🎉 All webhook tests passed!")
+
+if __name__ == "__main__":
+    main()